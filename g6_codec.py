@@ -0,0 +1,217 @@
+"""
+Copyright 2019 Ruud van Deursen, Firmenich SA.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+File g6_codec.py defines a vectorized codec for graphs in graph6-format.
+Lines with the same vertex count are decoded and encoded together by
+bit unpacking and packing of byte buffers with NumPy.
+"""
+
+import numpy as np
+import unittest
+
+class G6Codec:
+    """
+    Class G6Codec decodes graph6-strings to edge arrays and encodes
+    edge arrays to graph6-strings. Graphs are given as tuples (n,edges)
+    with n the number of vertices and edges an (E,2) array of vertex
+    index pairs.
+    """
+    
+    def __init__(self):
+        """ Constructor of G6Codec """
+        super(G6Codec,self).__init__()
+        self.header = ">>graph6<<"
+        self.weights = np.array([32,16,8,4,2,1],dtype=np.uint8)
+        self.triangles = {}
+        
+    def Triangle(self,n):
+        """
+        Method returns the vertex pairs of the bits in a graph6-string,
+        i.e. the upper triangle of the adjacency matrix ordered by column.
+        Input:
+        n -- Number of vertices.
+        Return:
+        Array with shape (n(n-1)/2,2).
+        """
+        if n not in self.triangles:
+            j = np.repeat(np.arange(n,dtype=np.int64),np.arange(n))
+            i = np.arange(len(j),dtype=np.int64)-j*(j-1)//2
+            self.triangles[n] = np.stack([i,j],axis=1)
+        return self.triangles[n]
+        
+    def Size(self,n):
+        """
+        Method encodes the number of vertices.
+        Input:
+        n -- Number of vertices.
+        Return:
+        String with the size header of the graph6-string.
+        """
+        if n < 63:
+            return chr(n+63)
+        if n < 258048:
+            return "~"+"".join([chr(((n>>shift)&63)+63) for shift in [12,6,0]])
+        return "~~"+"".join([chr(((n>>shift)&63)+63) for shift in [30,24,18,12,6,0]])
+        
+    def ReadSize(self,g6):
+        """
+        Method decodes the number of vertices.
+        Input:
+        g6 -- graph6-string.
+        Return:
+        Tuple (n,offset) with the number of vertices and the length
+        of the size header, or None if the header is malformed.
+        """
+        width = 6 if g6.startswith("~~") else 3 if g6.startswith("~") else 0
+        offset = 0 if width == 0 else 1 if width == 3 else 2
+        digits = [ord(char)-63 for char in g6[offset:offset+max(width,1)]]
+        if len(digits) != max(width,1) or any(d < 0 or d > 63 for d in digits):
+            return None
+        n = 0
+        for d in digits:
+            n = (n<<6)|d
+        return n,offset+max(width,1)
+        
+    def Decode(self,g6):
+        """
+        Method decodes a graph6-string.
+        Input:
+        g6 -- graph6-string.
+        Return:
+        Tuple (n,edges), or None if the string is malformed.
+        """
+        return self.DecodeMany([g6])[0]
+        
+    def DecodeMany(self,lines):
+        """
+        Method decodes graph6-strings in bulk. Lines with equal headers
+        and lengths are unpacked together into a bit matrix.
+        Input:
+        lines -- List with graph6-strings.
+        Return:
+        List with tuples (n,edges), or None for malformed strings.
+        """
+        # Group the lines by size header and length
+        decoded = [None]*len(lines)
+        groups = {}
+        for idx,line in enumerate(lines):
+            line = line.strip()
+            if line.startswith(self.header):
+                line = line[len(self.header):]
+            size = self.ReadSize(line)
+            if size is not None:
+                groups.setdefault((size,len(line)),[]).append((idx,line))
+                
+        # Unpack the bits of every group
+        for ((n,offset),length),members in groups.items():
+            m = n*(n-1)//2
+            if length != offset+(m+5)//6:
+                continue
+            try:
+                buffer = "".join([line for _,line in members]).encode("ascii")
+            except UnicodeEncodeError:
+                continue
+            data = np.frombuffer(buffer,dtype=np.uint8).reshape(len(members),length)[:,offset:].astype(np.int16)-63
+            valid = np.all((data >= 0) & (data <= 63),axis=1)
+            bits = np.unpackbits(np.clip(data,0,63).astype(np.uint8)[:,:,None],axis=2)[:,:,2:].reshape(len(members),-1)[:,:m]
+            rows,cols = np.nonzero(bits)
+            edges = np.split(self.Triangle(n)[cols],np.cumsum(np.bincount(rows,minlength=len(members)))[:-1])
+            for (idx,_),ok,E in zip(members,valid,edges):
+                if ok:
+                    decoded[idx] = (n,E)
+        return decoded
+        
+    def Encode(self,n,edges):
+        """
+        Method encodes a graph as graph6-string.
+        Input:
+        n     -- Number of vertices.
+        edges -- List or array with edges as vertex index pairs.
+        Return:
+        graph6-string.
+        """
+        return self.EncodeMany([(n,edges)])[0]
+        
+    def EncodeMany(self,graphs):
+        """
+        Method encodes graphs in bulk. Graphs with the same number of
+        vertices are packed together from a bit matrix.
+        Input:
+        graphs -- List with tuples (n,edges).
+        Return:
+        List with graph6-strings.
+        """
+        encoded = [None]*len(graphs)
+        groups = {}
+        for idx,(n,edges) in enumerate(graphs):
+            groups.setdefault(n,[]).append((idx,np.asarray(edges,dtype=np.int64).reshape(-1,2)))
+        for n,members in groups.items():
+            # Set the bit of every edge
+            nbytes = (n*(n-1)//2+5)//6
+            E = np.concatenate([edges for _,edges in members])
+            rows = np.repeat(np.arange(len(members)),[len(edges) for _,edges in members])
+            i,j = np.minimum(E[:,0],E[:,1]),np.maximum(E[:,0],E[:,1])
+            bits = np.zeros((len(members),nbytes*6),dtype=np.uint8)
+            bits[rows,j*(j-1)//2+i] = 1
+            
+            # Pack six bits per character
+            data = (bits.reshape(len(members),nbytes,6)@self.weights+63).astype(np.uint8)
+            header = self.Size(n)
+            for (idx,_),row in zip(members,data):
+                encoded[idx] = header+row.tobytes().decode("ascii")
+        return encoded
+        
+"""
+Statically constructed instance of the class.
+"""
+g6codec = G6Codec()
+
+class G6CodecTest(unittest.TestCase):
+    """
+    Unit tests for the graph6 codec, using networkx as reference.
+    """
+    
+    def Graphs(self):
+        import networkx as nx
+        return [nx.path_graph(2),nx.cycle_graph(5),nx.petersen_graph(),nx.complete_graph(7),
+                nx.gnp_random_graph(20,0.3,seed=1),nx.gnp_random_graph(70,0.1,seed=2),nx.empty_graph(3)]
+        
+    def test_Decode(self):
+        import networkx as nx
+        graphs = self.Graphs()
+        lines = [nx.to_graph6_bytes(G,header=False).decode().strip() for G in graphs]
+        for G,(n,edges) in zip(graphs,g6codec.DecodeMany(lines)):
+            self.assertEqual(n,G.number_of_nodes())
+            self.assertEqual(set(map(tuple,edges.tolist())),set([(min(e),max(e)) for e in G.edges()]))
+        self.assertEqual(g6codec.Decode(">>graph6<<%s"%(lines[2]))[0],10)
+            
+    def test_Encode(self):
+        import networkx as nx
+        graphs = self.Graphs()
+        encoded = g6codec.EncodeMany([(G.number_of_nodes(),list(G.edges())) for G in graphs])
+        for G,g6 in zip(graphs,encoded):
+            self.assertEqual(g6,nx.to_graph6_bytes(G,header=False).decode().strip())
+        self.assertEqual(g6codec.Size(100000),"~WY_")
+        self.assertEqual(g6codec.ReadSize("~WY_"),(100000,4))
+            
+    def test_Malformed(self):
+        decoded = g6codec.DecodeMany(["Bw","B","B~~","","~"])
+        self.assertEqual(decoded[0][1].tolist(),[[0,1],[0,2],[1,2]])
+        self.assertEqual(decoded[1:],[None,None,None,None])
+        self.assertIsNone(g6codec.Decode("B "))
+
+if __name__ == "__main__":
+    unittest.main()
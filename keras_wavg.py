@@ -19,10 +19,12 @@ layers. The method defines a trainable weight
 with a single weight per layer. The output
 is then simply the dot-product between the
 vector with the trainable weights and the 
-list of layers.
+list of layers. The layer FoldedAverage computes
+the same merge for inference, with the layer
+normalizations folded into a scale per input.
 """
 
-from keras.layers import Layer,Concatenate,Reshape,Flatten
+from keras.layers import Layer
 from keras import backend as K
 
 class WeightedAverage(Layer):
@@ -69,12 +71,12 @@ class WeightedAverage(Layer):
         Return:
         Layer with output values.
         """
-        # Concatenate, Reshape, take the inner product and flatten to a single layer
-        # (this is way easier than writing some sort of lambda thing)
-        C = Concatenate()(x)
-        R = Reshape(target_shape=(self.output_dim,self.num))(C)
+        # Concatenate, reshape, take the inner product and flatten to a single layer.
+        # Backend operations avoid constructing new layers on every call.
+        C = K.concatenate(x,axis=-1)
+        R = K.reshape(C,(-1,self.output_dim,self.num))
         inner = K.dot(R,self.kernel)
-        return Flatten()(inner) # We need to flatten to inner product to get correct dimensions
+        return K.reshape(inner,(-1,self.output_dim)) # Flatten the inner product to get correct dimensions
 
     def compute_output_shape(self, input_shape):
         """
@@ -84,3 +86,64 @@ class WeightedAverage(Layer):
         Output shape of the layer.
         """
         return (None,self.output_dim)
+
+class FoldedAverage(Layer):
+    """
+    Class FoldedAverage defines the average or weighted average of a list of
+    layers for inference. The concatenated inputs are multiplied by a scale,
+    folding the gammas of the layer normalizations and the weights of the
+    average, and summed to the width of a single input. See lgi_numpy_engine.FoldHead.
+    """
+    
+    def __init__(self, merge=1, **kwargs):
+        """
+        Constructor of FoldedAverage.
+        Input:
+        merge  -- Merge mode 1 for the average, summing the inputs position
+                  by position, or 2 for WeightedAverage, reshaping the
+                  concatenation to (output_dim,num) (default = 1).
+        kwargs -- Arguments.
+        """
+        self.merge = merge
+        super(FoldedAverage, self).__init__(**kwargs)
+        
+    def build(self, input_shape):
+        """
+        Method defines the scale of the concatenated inputs.
+        Input:
+        input_shape -- Input shape of the object.
+        """
+        self.output_dim = input_shape[0][1]
+        self.num = len(input_shape)
+        self.scale = self.add_weight(name='scale',
+                                     shape=(self.num*self.output_dim,),
+                                     initializer='ones',
+                                     trainable=False)
+        super(FoldedAverage, self).build(input_shape)
+        
+    def call(self, x):
+        """
+        Method computes the output tensor.
+        Input:
+        x -- List with input tensors.
+        Return:
+        Layer with output values.
+        """
+        C = K.concatenate(x,axis=-1)*self.scale
+        if self.merge == 1:
+            return K.sum(K.reshape(C,(-1,self.num,self.output_dim)),axis=1)
+        return K.sum(K.reshape(C,(-1,self.output_dim,self.num)),axis=-1)
+        
+    def compute_output_shape(self, input_shape):
+        """
+        Method computes the output shape, which equals
+        the shape of the input layers.
+        Return:
+        Output shape of the layer.
+        """
+        return (None,self.output_dim)
+        
+    def get_config(self):
+        config = super(FoldedAverage, self).get_config()
+        config["merge"] = self.merge
+        return config
@@ -18,20 +18,32 @@ class LayerNormalization(Layer):
     in a layer on a single training case
     """
     
-    def __init__(self, eps=1e-6, **kwargs):
+    def __init__(self, eps=1e-6, affine=True, **kwargs):
+        """
+        Constructor of LayerNormalization.
+        Input:
+        eps    -- Constant added to the standard deviation (default = 1e-6).
+        affine -- Flag to learn gamma and beta (default = True). Without, the
+                  layer only normalizes, e.g. when gamma and beta are folded
+                  into the next layer for inference.
+        """
         self.eps = eps
+        self.affine = affine
         super(LayerNormalization, self).__init__(**kwargs)
     
     def build(self, input_shape):
-        self.gamma = self.add_weight(name='gamma', shape=input_shape[-1:],
-                                     initializer=Ones(), trainable=True)
-        self.beta = self.add_weight(name='beta', shape=input_shape[-1:],
-                                    initializer=Zeros(), trainable=True)
+        if self.affine:
+            self.gamma = self.add_weight(name='gamma', shape=input_shape[-1:],
+                                         initializer=Ones(), trainable=True)
+            self.beta = self.add_weight(name='beta', shape=input_shape[-1:],
+                                        initializer=Zeros(), trainable=True)
         super(LayerNormalization, self).build(input_shape)
     
     def call(self, x):
         mean = K.mean(x, axis=-1, keepdims=True)
         std = K.std(x, axis=-1, keepdims=True)
+        if not self.affine:
+            return (x - mean) / (std + self.eps)
         return self.gamma * (x - mean) / (std + self.eps) + self.beta
     
     def compute_output_shape(self, input_shape):
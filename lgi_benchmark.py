@@ -0,0 +1,416 @@
+"""
+Copyright 2019 Ruud van Deursen, Firmenich SA.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+File lgi_benchmark.py defines benchmarks for the hot paths
+of the package on CPU. Run as script to print the results, e.g.
+
+python lgi_benchmark.py datasets/Graphs_can.lgi
+python lgi_benchmark.py --baseline baseline.json --save
+python lgi_benchmark.py --baseline baseline.json
+
+The last call compares the results with the saved baseline and
+exits with an error for every regression beyond the tolerance.
+"""
+
+from lgi_generative_model_utils import DataUtils
+from lgi_reader import lgireader
+from lgi_valid_graph import ValidGraph
+from lgi_translator import LGI,g6_to_lgi,lgi_to_g6
+from datetime import datetime
+import argparse
+import json
+import numpy
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+"""
+Frameworks the light entry points should not import.
+"""
+heavy_modules = ["keras","tensorflow","matplotlib","IPython","rdkit","networkx","scipy"]
+
+"""
+Entry points guarded by the import benchmark.
+"""
+light_modules = ["lgi_valid_graph","lgi_translator","lgi_translator_runner","lgi_generator","lgi_numpy_engine"]
+
+def Elapsed(start):
+    """
+    Method computes the elapsed time.
+    Input:
+    start -- Start time.
+    Return:
+    Elapsed seconds since start.
+    """
+    diff = datetime.now()-start
+    return diff.days*24*60*60 + diff.seconds + 1e-6*diff.microseconds
+
+def EncodeReference(Utils,text):
+    """
+    Method encodes a text with the character-by-character loops
+    used by DataUtils.Encode before vectorization. Used as reference.
+    Input:
+    Utils -- DataUtils.
+    text  -- Text to be translated.
+    Return:
+    X,y and maxlen.
+    """
+    maxlen,step = Utils.maxlen,Utils.step
+    maxword = numpy.max([len(x) for x in text.split("\n")])
+    maxlen = numpy.min([maxword,maxlen])
+    sentences = []
+    next_chars = []
+    for i in range(0, len(text) - maxlen, step):
+        sentences.append(text[i: i + maxlen])
+        next_chars.append(text[i + maxlen])
+    X = numpy.zeros((len(sentences), maxlen, len(Utils.chars)), dtype=bool)
+    y = numpy.zeros((len(sentences), len(Utils.chars)), dtype=bool)
+    for i,sentence in enumerate(sentences):
+        for t,char in enumerate(sentence):
+            X[i,t,Utils.char_indices[char]] = True
+        y[i,Utils.char_indices[next_chars[i]]] = True
+    return X,y,maxlen
+
+def BenchmarkEncode(filename,maxlen=42,step=3,naug=10,reference=True,maxbytes=2<<30):
+    """
+    Method benchmarks DataUtils.Encode on a file and on a corpus
+    with naug copies of every entry, the size of a naug-times
+    augmented corpus.
+    Input:
+    filename  -- File with lgi-strings.
+    maxlen    -- Maximum length (default = 42).
+    step      -- Step size (default = 3).
+    naug      -- Size factor of the augmented corpus (default = 10).
+    reference -- Flag to time the reference loops on the original corpus
+                 and check that the output is identical (default = True).
+    maxbytes  -- Largest one-hot tensor to encode (default = 2 GiB).
+                 Larger one-hot encodings are skipped.
+    Return:
+    List with a dictionary per measurement.
+    """
+    with open(filename) as f:
+        data = [line.strip() for line in f]
+    results = []
+    for factor in [1,naug]:
+        Utils = DataUtils(maxlen=maxlen,step=step)
+        text = Utils.Prepare([lgi for lgi in data for _ in range(factor)],shuffle=False)
+        nwindows = (len(text)-maxlen+step-1)//step
+        for indices in [True,False]:
+            if not indices and nwindows*maxlen*Utils.NumChars() > maxbytes:
+                continue
+            Utils.maxlen = maxlen
+            start = datetime.now()
+            X,y,_ = Utils.Encode(text,indices=indices)
+            seconds = Elapsed(start)
+            results.append({"name":"Encode","corpus":"%sx"%(factor),"indices":indices,
+                            "windows":len(X),"seconds":seconds,"windows_per_second":len(X)/seconds})
+            if reference and factor == 1 and not indices:
+                Utils.maxlen = maxlen
+                start = datetime.now()
+                Xr,yr,_ = EncodeReference(Utils,text)
+                seconds = Elapsed(start)
+                results.append({"name":"EncodeReference","corpus":"%sx"%(factor),"indices":False,
+                                "windows":len(Xr),"seconds":seconds,"windows_per_second":len(Xr)/seconds,
+                                "identical":bool((X == Xr).all() and (y == yr).all())})
+            del X,y
+    return results
+
+def BenchmarkImports(modules=light_modules,repeat=3):
+    """
+    Method measures the import time of modules, each in a fresh
+    interpreter, and lists the heavy frameworks they load.
+    numpy is measured as reference.
+    Input:
+    modules -- List with module names (default = light_modules).
+    repeat  -- Number of measurements per module, keeping the fastest (default = 3).
+    Return:
+    List with a dictionary per module.
+    """
+    code = "import json,sys,time\nstart = time.perf_counter()\nimport %s\n" \
+           "print(json.dumps([time.perf_counter()-start,[m for m in %r if m in sys.modules]]))"
+    results = []
+    for module in ["numpy"]+list(modules):
+        times = []
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable,"-c",code%(module,heavy_modules)],capture_output=True,text=True,check=True).stdout
+            seconds,heavy = json.loads(output.strip().split("\n")[-1])
+            times.append(seconds)
+        results.append({"name":"Import","module":module,"seconds":min(times),"heavy":",".join(heavy) or "-"})
+    return results
+
+def Measure(name,method,items,repeat=3,**info):
+    """
+    Method times a method, keeping the fastest of repeat calls, and
+    measures the peak memory allocated by one more call with tracemalloc.
+    Input:
+    name   -- Name of the benchmark.
+    method -- Method without arguments.
+    items  -- Number of items processed per call.
+    repeat -- Number of timed calls (default = 3).
+    info   -- Additional fields of the result.
+    Return:
+    Dictionary with the result.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        method()
+        times.append(time.perf_counter()-start)
+    tracemalloc.start()
+    try:
+        method()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    seconds = min(times)
+    result = {"name":name}
+    result.update(info)
+    result.update({"items":items,"seconds":seconds,"items_per_second":items/seconds,"peak_mb":peak/2.**20})
+    return result
+    
+def Load(filename,limit=None):
+    """
+    Method reads the first lgi-strings of a file.
+    Input:
+    filename -- File with lgi-strings.
+    limit    -- Maximum number of strings (default = None, all).
+    Return:
+    List with lgi-strings.
+    """
+    with open(filename) as f:
+        data = [line.strip() for line in f if line.strip()]
+    return data[:limit] if limit is not None else data
+
+def BenchmarkCore(filename,limit=10000,nwrite=2000,maxlen=42,repeat=3):
+    """
+    Method benchmarks reading, validation, writing, the g6-translation
+    and the preparation of the training set.
+    Input:
+    filename -- File with lgi-strings.
+    limit    -- Number of strings (default = 10,000).
+    nwrite   -- Number of graphs to write with the native writer (default = 2,000).
+    maxlen   -- Maximum length of the training windows (default = 42).
+    repeat   -- Number of timed calls (default = 3).
+    Return:
+    List with a dictionary per measurement.
+    """
+    data = Load(filename,limit)
+    validator = ValidGraph()
+    writer = LGI(seed=0)
+    graphs = [G for G in map(lgireader.Parse,data[:nwrite]) if G is not None]
+    g6 = [g for g in lgi_to_g6.TranslateMany(data) if g is not None]
+    Utils = DataUtils(maxlen=maxlen)
+    text = Utils.Prepare(list(data),shuffle=False)
+    results = [Measure("LGIReader.Read",lambda: [lgireader.Parse(lgi) for lgi in data],len(data),repeat),
+               Measure("ValidGraph.IsValid",lambda: [validator.IsValid(lgi) for lgi in data],len(data),repeat),
+               Measure("LGI.Write",lambda: [writer.Write(*G) for G in graphs],len(graphs),repeat,canonical=True),
+               Measure("LGI.Write",lambda: [writer.Write(*G,canonical=False) for G in graphs],len(graphs),repeat,canonical=False),
+               Measure("LgiToG6.TranslateMany",lambda: lgi_to_g6.TranslateMany(data),len(data),repeat),
+               Measure("G6ToLgi.TranslateMany",lambda: g6_to_lgi.TranslateMany(g6[:nwrite]),len(g6[:nwrite]),repeat),
+               Measure("DataUtils.Prepare",lambda: DataUtils(maxlen=maxlen).Prepare(list(data),shuffle=False),len(data),repeat)]
+    for indices in [True,False]:
+        nwindows = len(Utils.Encode(text,indices=True)[0])
+        results.append(Measure("DataUtils.Encode",lambda: Utils.Encode(text,indices=indices),nwindows,repeat,indices=indices))
+    return results
+    
+def BenchmarkPredict(filename,limit=10000,ncollect=200,batch_size=32,units=32,maxlen=42,repeat=3,keras=True):
+    """
+    Method benchmarks Generator.Predict end-to-end with tiny randomly
+    initialized models: the NumPy engine, and a Keras model with LSTM
+    layers if Keras is installed. The sanity check is ValidGraph.IsValid.
+    Constrained decoding with LGIGrammar keeps the random models from
+    rejecting almost every string, and the output bias set to the log
+    of the character frequencies of the corpus gives strings of
+    realistic length.
+    Input:
+    filename   -- File with lgi-strings for the seeds.
+    limit      -- Number of strings (default = 10,000).
+    ncollect   -- Number of strings to generate (default = 200).
+    batch_size -- Number of sequences generated in parallel (default = 32).
+    units      -- Number of units of the recurrent layers (default = 32).
+    maxlen     -- Maximum length of the windows (default = 42).
+    repeat     -- Number of timed calls (default = 3).
+    keras      -- Flag to include the Keras model (default = True).
+    Return:
+    List with a dictionary per measurement.
+    """
+    from lgi_generator import Generator
+    from lgi_numpy_engine import RandomModel
+    from lgi_sampler import Sampler
+    from lgi_grammar import LGIGrammar
+    Utils = DataUtils(maxlen=maxlen)
+    text = Utils.Prepare(Load(filename,limit),shuffle=False)
+    counts = numpy.bincount([Utils.char_indices[c] for c in text],minlength=Utils.NumChars())
+    bias = numpy.log((counts+1.)/(counts.sum()+Utils.NumChars()))
+    models = [("numpy",False,RandomModel(Utils.NumChars(),units=units,bias=bias,seed=0))]
+    models.append(("numpy-stateful",True,models[0][2].Clone(stateful=True)))
+    if keras:
+        try:
+            from keras.layers import LSTM
+            from lgi_generative_model_alt import BaseModel
+            model = BaseModel(Utils,Unit=LSTM,Layers=[units,units],Bidirectional=[False,False],minimodels=2,merge=2).Init()
+            output = model.get_layer("Output")
+            output.set_weights([output.get_weights()[0],bias])
+            models.append(("keras",False,model))
+        except ImportError:
+            print("Keras is not installed, skipping the Keras model")
+    results = []
+    for engine,stateful,model in models:
+        gen = Generator(model,Utils,sanitycheck=ValidGraph().IsValid,batch_size=batch_size,stateful=stateful,
+                        sampler=Sampler(rng=numpy.random.default_rng(0)),grammar=LGIGrammar(Utils.chars))
+        result = Measure("Generator.Predict",lambda: gen.Predict(ncollect=ncollect,sanitycheck=None),ncollect,repeat,engine=engine)
+        mols,report = gen.Predict(ncollect=ncollect,sanitycheck=None,report=True)
+        result.update({"chars_per_second":report["chars_per_second"],"rejection_rate":report["rejection_rate"],
+                       "model_calls_per_accepted":report["model_calls_per_accepted"]})
+        results.append(result)
+    return results
+    
+def Key(result):
+    """
+    Method identifies a measurement by its name and fields other than the measured values.
+    Input:
+    result -- Dictionary with a result.
+    Return:
+    String key.
+    """
+    measured = ["items","seconds","peak_mb","windows","identical","rejection_rate","model_calls_per_accepted"]
+    return json.dumps(dict([(k,v) for k,v in result.items() if k not in measured and not k.endswith("_per_second")]),sort_keys=True)
+
+def Save(results,filename):
+    """
+    Method stores results as baseline.
+    Input:
+    results  -- List with a dictionary per measurement.
+    filename -- JSON-file for the baseline.
+    """
+    with open(filename,"w") as f:
+        json.dump({"python":platform.python_version(),"machine":platform.machine(),"numpy":numpy.__version__,
+                   "time":datetime.now().isoformat(timespec="seconds"),"results":results},f,indent=1)
+    
+def Compare(results,baseline,tolerance=.25,slack=1.):
+    """
+    Method compares results with a baseline. A measurement regresses if its
+    throughput drops or its peak memory grows by more than the tolerance.
+    A measurement of the baseline missing from the results is reported too,
+    e.g. after a renamed benchmark or an engine that failed to load.
+    Input:
+    results   -- List with a dictionary per measurement.
+    baseline  -- Dictionary stored by Save, or the name of its JSON-file.
+    tolerance -- Relative tolerance (default = 0.25).
+    slack     -- Absolute slack on the peak memory in MiB (default = 1).
+    Return:
+    List with a message per regression.
+    """
+    if isinstance(baseline,str):
+        with open(baseline) as f:
+            baseline = json.load(f)
+    reference = dict([(Key(result),result) for result in baseline["results"]])
+    measured = set(map(Key,results))
+    regressions = ["%s: missing from the results"%(key) for key in reference if key not in measured]
+    for result in results:
+        base = reference.get(Key(result))
+        if base is None:
+            continue
+        for key in [key for key in result if key.endswith("_per_second") and key in base]:
+            if result[key] < (1.-tolerance)*base[key]:
+                regressions.append("%s: %s dropped from %.4g to %.4g"%(Key(result),key,base[key],result[key]))
+        if "peak_mb" in base and result.get("peak_mb",0.) > (1.+tolerance)*base["peak_mb"]+slack:
+            regressions.append("%s: peak_mb grew from %.4g to %.4g"%(Key(result),base["peak_mb"],result["peak_mb"]))
+    return regressions
+
+def Print(results):
+    """
+    Method prints benchmark results.
+    Input:
+    results -- List with a dictionary per measurement.
+    """
+    for result in results:
+        print("  ".join(["%s=%s"%(key,("%.4g"%(value) if isinstance(value,float) else value)) for key,value in result.items()]))
+
+import unittest
+class ImportTest(unittest.TestCase):
+    """ Test class guarding the startup of the entry points """
+    
+    def test_Light(self):
+        """ Method checks that the entry points do not load the heavy frameworks """
+        for result in BenchmarkImports(repeat=1):
+            self.assertEqual(result["heavy"],"-",result["module"])
+            
+class BenchmarkTest(unittest.TestCase):
+    """ Test class running the benchmarks on a small sample """
+    
+    def setUp(self):
+        self.filename = os.path.join(os.path.dirname(os.path.abspath(__file__)),"datasets","Graphs_can.lgi")
+        if not os.path.exists(self.filename):
+            self.skipTest("Dataset %s not found"%(self.filename))
+            
+    def test_Core(self):
+        """ Method checks that every core benchmark reports a throughput and a distinct key """
+        results = BenchmarkCore(self.filename,limit=200,nwrite=50,repeat=1)
+        self.assertEqual(len(results),9)
+        self.assertTrue(all(result["items_per_second"] > 0 and result["peak_mb"] > 0 for result in results))
+        self.assertEqual(len(set(map(Key,results))),len(results))
+        
+    def test_Predict(self):
+        """ Method checks the generation benchmark of the NumPy engines """
+        results = BenchmarkPredict(self.filename,limit=200,ncollect=4,batch_size=4,units=8,maxlen=12,repeat=1,keras=False)
+        self.assertListEqual([result["engine"] for result in results],["numpy","numpy-stateful"])
+        self.assertTrue(all(result["chars_per_second"] > 0 for result in results))
+        
+    def test_Compare(self):
+        """ Method checks that slower, larger and missing measurements are reported """
+        baseline = {"results":[{"name":"A","items_per_second":100.,"peak_mb":10.},{"name":"B","items_per_second":100.,"peak_mb":10.},
+                               {"name":"D","items_per_second":100.,"peak_mb":10.}]}
+        results = [{"name":"A","items_per_second":90.,"peak_mb":11.},{"name":"B","items_per_second":50.,"peak_mb":20.},
+                   {"name":"C","items_per_second":1.,"peak_mb":1.}]
+        regressions = Compare(results,baseline)
+        self.assertEqual(len(regressions),3)
+        self.assertTrue('"D"' in regressions[0] and "missing" in regressions[0])
+        self.assertTrue(all('"B"' in regression for regression in regressions[1:]))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of Graph-GEN")
+    parser.add_argument("filename",nargs="?",default="datasets/Graphs_can.lgi",help="File with lgi-strings")
+    parser.add_argument("--naug",type=int,default=10,help="Size factor of the augmented corpus")
+    parser.add_argument("--imports",action="store_true",help="Benchmark the import time of the entry points only")
+    parser.add_argument("--encode",action="store_true",help="Benchmark the encoding of the augmented corpus only")
+    parser.add_argument("--limit",type=int,default=10000,help="Number of strings read from the file")
+    parser.add_argument("--repeat",type=int,default=3,help="Number of timed calls per benchmark")
+    parser.add_argument("--baseline",default=None,help="JSON-file with the baseline")
+    parser.add_argument("--save",action="store_true",help="Save the results as baseline instead of comparing")
+    parser.add_argument("--tolerance",type=float,default=.25,help="Relative tolerance of the comparison")
+    args = parser.parse_args()
+    if args.imports:
+        Print(BenchmarkImports())
+    elif args.encode:
+        Print(BenchmarkEncode(args.filename,naug=args.naug))
+    else:
+        results = BenchmarkCore(args.filename,limit=args.limit,repeat=args.repeat)
+        results += BenchmarkPredict(args.filename,limit=args.limit,repeat=args.repeat)
+        Print(results)
+        if args.baseline is not None and args.save:
+            Save(results,args.baseline)
+            print("Baseline written to %s"%(args.baseline))
+        elif args.baseline is not None:
+            regressions = Compare(results,args.baseline,tolerance=args.tolerance)
+            for regression in regressions:
+                print("REGRESSION %s"%(regression))
+            if len(regressions) > 0:
+                sys.exit("%s regressions against %s"%(len(regressions),args.baseline))
+            print("No regressions against %s"%(args.baseline))
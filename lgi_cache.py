@@ -0,0 +1,176 @@
+"""
+Copyright 2019 Ruud van Deursen, Firmenich SA.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+File lgi_cache.py defines a bounded cache mapping lgi-strings
+to their validity and optionally their parsed graph. The cache
+is used in front of the LGIReader and ValidGraph to avoid parsing
+duplicate strings twice, and can be saved to and loaded from disk.
+"""
+
+from collections import OrderedDict
+import pickle
+
+class LGICache:
+    """
+    Class LGICache defines a least-recently-used cache with
+    a maximum number of entries and counters for hits, misses
+    and evictions.
+    """
+    
+    def __init__(self,maxsize=1000000,graphs=False):
+        """
+        Constructor of LGICache.
+        Input:
+        maxsize -- Maximum number of cached strings (default = 1,000,000).
+        graphs  -- Flag to cache the parsed graphs in compact form
+                   next to the validity (default = False).
+        """
+        super(LGICache,self).__init__()
+        self.maxsize = maxsize
+        self.graphs = graphs
+        self.entries = OrderedDict()
+        self.hits,self.misses,self.evictions = 0,0,0
+        
+    def Get(self,lgi,graph=False):
+        """
+        Method looks up an lgi-string.
+        Input:
+        lgi   -- lgi-string.
+        graph -- Flag to look up the parsed graph (default = False).
+                 A valid string cached without its graph counts as a miss.
+        Return:
+        Tuple (valid,graph) for a cached string, or None if the
+        string is not cached. Graph is None if graphs are not cached.
+        """
+        entry = self.entries.get(lgi)
+        if entry is None or graph and entry[0] and entry[1] is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(lgi)
+        valid,packed = entry
+        return valid,self.Unpack(packed)
+    
+    def Put(self,lgi,valid,graph=None):
+        """
+        Method stores the validity and parsed graph of an lgi-string.
+        Input:
+        lgi   -- lgi-string.
+        valid -- Validity of the string.
+        graph -- Parsed graph as tuple (degrees,edges) (default = None).
+                 Stored only if the cache keeps graphs.
+        """
+        packed = self.Pack(graph) if self.graphs else None
+        self.entries[lgi] = (valid,packed)
+        self.entries.move_to_end(lgi)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+            
+    def Pack(self,graph):
+        """
+        Method packs a graph to a compact byte representation.
+        Input:
+        graph -- Tuple (degrees,edges) or None.
+        Return:
+        Tuple with the degrees and flattened edges as bytes, or None
+        if the graph is None or has more than 256 vertices.
+        """
+        if graph is None or len(graph[0]) > 256:
+            return None
+        degrees,edges = graph
+        return bytes(degrees),bytes([v for edge in edges for v in edge])
+    
+    def Unpack(self,packed):
+        """
+        Method unpacks a graph packed with Pack.
+        Input:
+        packed -- Packed graph or None.
+        Return:
+        Tuple (degrees,edges) or None.
+        """
+        if packed is None:
+            return None
+        degrees,flat = packed
+        return list(degrees),list(zip(flat[0::2],flat[1::2]))
+            
+    def Counters(self):
+        """
+        Return:
+        Dictionary with the size and the number of hits, misses and evictions.
+        """
+        return {"size":len(self.entries),"hits":self.hits,"misses":self.misses,"evictions":self.evictions}
+        
+    def Save(self,filename):
+        """
+        Method saves the cached entries to a file.
+        Input:
+        filename -- Name of the file.
+        Return:
+        Instance of LGICache.
+        """
+        with open(filename,"wb") as f:
+            pickle.dump((self.maxsize,self.graphs,list(self.entries.items())),f,protocol=pickle.HIGHEST_PROTOCOL)
+        return self
+    
+    def Load(self,filename):
+        """
+        Method loads the entries saved with Save. The size and the
+        graph flag of the saved cache are restored and the counters reset.
+        Input:
+        filename -- Name of the file.
+        Return:
+        Updated instance of LGICache.
+        """
+        with open(filename,"rb") as f:
+            self.maxsize,self.graphs,entries = pickle.load(f)
+        self.entries = OrderedDict(entries)
+        self.hits,self.misses,self.evictions = 0,0,0
+        return self
+
+    
+import unittest
+class LGICacheTest(unittest.TestCase):
+    """
+    Test class evaluating the cache.
+    """
+    
+    def test_Eviction(self):
+        """ Method tests the least-recently-used eviction and the counters """
+        cache = LGICache(maxsize=2)
+        cache.Put("AA",True)
+        cache.Put("A",False)
+        self.assertEqual((True,None),cache.Get("AA"))
+        cache.Put("B1BB1",True)
+        self.assertIsNone(cache.Get("A"))
+        self.assertEqual({"size":2,"hits":1,"misses":1,"evictions":1},cache.Counters())
+        
+    def test_Graphs(self):
+        """ Method tests the compact graph storage and the storage on disk """
+        import os,tempfile
+        cache = LGICache(graphs=True)
+        graph = ([2,2,2],[(0,1),(1,2),(0,2)])
+        cache.Put("B1BB1",True,graph)
+        self.assertEqual((True,graph),cache.Get("B1BB1"))
+        filename = os.path.join(tempfile.mkdtemp(),"cache.pkl")
+        cache.Save(filename)
+        loaded = LGICache().Load(filename)
+        self.assertTrue(loaded.graphs)
+        self.assertEqual((True,graph),loaded.Get("B1BB1"))
+        
+# Runner for tests
+if __name__ == "__main__":
+    unittest.main()
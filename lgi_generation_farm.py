@@ -0,0 +1,209 @@
+"""
+Copyright 2019 Ruud van Deursen, Firmenich SA.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+File lgi_generation_farm.py defines a driver generating graphs with
+many CPU processes. Every worker loads the model through the factory
+and BaseModel.InitGenerator, draws from its own random stream and
+writes shards of generated strings, while the coordinator counts the
+generated strings and stops the workers at the target.
+"""
+
+from lgi_sampler import Sampler
+import multiprocessing
+import numpy as np
+import os
+import queue
+import traceback
+import tqdm
+import unittest
+
+"""
+Environment variables limiting the threads of every worker.
+"""
+thread_variables = ["OMP_NUM_THREADS","MKL_NUM_THREADS","OPENBLAS_NUM_THREADS",
+                    "TF_NUM_INTRAOP_THREADS","TF_NUM_INTEROP_THREADS"]
+
+def FarmWorker(idx,factory,weightsfile,seed,sanitycheck,batch_size,tasks,results,stop):
+    """
+    Method runs a worker process. The worker takes shards from the
+    task queue until it receives None or the stop event is set.
+    Input:
+    idx         -- Index of the worker.
+    factory     -- Picklable callable returning a BaseModel.
+    weightsfile -- File with the weights of the model.
+    seed        -- numpy.random.SeedSequence of the worker.
+    sanitycheck -- Picklable method to check generated strings, or None accepting all.
+    batch_size  -- Number of sequences generated in parallel.
+    tasks       -- Queue with tuples (filename,size).
+    results     -- Queue receiving tuples (idx,filename,count), with filename
+                   None when the worker is done and count -1 on errors.
+    stop        -- Event stopping the worker.
+    """
+    try:
+        gen = factory().InitGenerator(weightsfile,sanitycheck=sanitycheck or (lambda x: True),batch_size=batch_size)
+        gen.sampler = Sampler(gen.sampler.temperature,gen.sampler.topk,np.random.default_rng(seed))
+        while not stop.is_set():
+            task = tasks.get()
+            if task is None:
+                break
+            filename,size = task
+            graphs = gen.Predict(ncollect=size,sanitycheck=None)
+            
+            # Write to a temporary file, so that shards are complete
+            with open("%s.tmp"%(filename),"w") as f:
+                f.write("".join(["%s\n"%(lgi) for lgi in graphs]))
+            os.replace("%s.tmp"%(filename),filename)
+            results.put((idx,filename,len(graphs)))
+        results.put((idx,None,0))
+    except BaseException:
+        results.put((idx,traceback.format_exc(),-1))
+
+class GenerationFarm:
+    """
+    Class GenerationFarm generates graphs with a pool of worker processes.
+    The processes are started with the spawn method, so that every worker
+    initializes its own backend session.
+    """
+    
+    def __init__(self,factory,weightsfile=None,nworkers=None,seed=None,sanitycheck=None,batch_size=1,threads=1):
+        """
+        Constructor of GenerationFarm.
+        Input:
+        factory     -- Picklable callable returning a BaseModel, e.g. a module-level
+                       function constructing DataUtils and BaseModel as for training.
+        weightsfile -- File with the weights of the model (default = None).
+        nworkers    -- Number of worker processes (default = None, using all cores).
+        seed        -- Seed of the root numpy.random.SeedSequence (default = None).
+                       Every worker draws from an independent child sequence.
+        sanitycheck -- Picklable method to check generated strings
+                       (default = None, accepting all).
+        batch_size  -- Number of sequences generated in parallel per worker (default = 1).
+        threads     -- Number of threads per worker (default = 1).
+        """
+        super(GenerationFarm,self).__init__()
+        self.factory = factory
+        self.weightsfile = weightsfile
+        self.nworkers = nworkers if nworkers is not None else multiprocessing.cpu_count()
+        self.seeds = np.random.SeedSequence(seed).spawn(self.nworkers)
+        self.sanitycheck = sanitycheck
+        self.batch_size = batch_size
+        self.threads = threads
+        self.context = multiprocessing.get_context("spawn")
+        
+    def Run(self,target,outdir="generated",prefix="generated",shardsize=10000,verbose=True):
+        """
+        Method generates the target number of strings in shards.
+        Input:
+        target    -- Number of strings to generate.
+        outdir    -- Directory for the shards (default = 'generated').
+        prefix    -- Prefix of the shard files (default = 'generated').
+        shardsize -- Number of strings per shard (default = 10,000).
+        verbose   -- Flag for verbose mode, showing the progress (default = True).
+        Return:
+        List with the shard files in order.
+        """
+        os.makedirs(outdir,exist_ok=True)
+        ctx = self.context
+        tasks,results,stop = ctx.Queue(),ctx.Queue(),ctx.Event()
+        
+        # Define the shards, followed by a stop signal per worker
+        shards = []
+        for start in range(0,int(target),shardsize):
+            filename = os.path.join(outdir,"%s_%09d_%09d.lgi"%(prefix,start,min(start+shardsize,target)))
+            shards.append(filename)
+            tasks.put((filename,min(shardsize,target-start)))
+        for _ in range(self.nworkers):
+            tasks.put(None)
+            
+        # Start the workers with limited threads
+        saved = dict([(key,os.environ.get(key)) for key in thread_variables])
+        os.environ.update(dict([(key,str(self.threads)) for key in thread_variables]))
+        try:
+            workers = [ctx.Process(target=FarmWorker,args=(idx,self.factory,self.weightsfile,self.seeds[idx],self.sanitycheck,
+                                                           self.batch_size,tasks,results,stop),daemon=True)
+                       for idx in range(self.nworkers)]
+            for worker in workers:
+                worker.start()
+        finally:
+            for key,value in saved.items():
+                if value is None:
+                    os.environ.pop(key,None)
+                else:
+                    os.environ[key] = value
+                    
+        # Count the generated strings until all workers are done
+        self.count,active = 0,self.nworkers
+        progress = tqdm.tqdm(total=int(target),unit=" graphs",disable=not verbose)
+        try:
+            while active > 0:
+                try:
+                    idx,filename,count = results.get(timeout=1.0)
+                except queue.Empty:
+                    if not any(worker.is_alive() for worker in workers):
+                        raise RuntimeError("Generation workers exited unexpectedly")
+                    continue
+                if count < 0:
+                    raise RuntimeError("Generation worker %s failed:\n%s"%(idx,filename))
+                if filename is None:
+                    active -= 1
+                    continue
+                self.count += count
+                progress.update(count)
+                if self.count >= target:
+                    stop.set()
+        finally:
+            stop.set()
+            progress.close()
+            for worker in workers:
+                worker.join(timeout=10)
+                if worker.is_alive():
+                    worker.terminate()
+        return [filename for filename in shards if os.path.exists(filename)]
+
+class GenerationFarmTest(unittest.TestCase):
+    """
+    Unit tests for the generation farm, using a fake model setup.
+    """
+    
+    class FakeSetup:
+        """ Model setup returning a generator of random paths """
+        
+        def InitGenerator(self,weightsfile,sanitycheck,batch_size):
+            return GenerationFarmTest.FakeGenerator()
+            
+    class FakeGenerator:
+        """ Generator writing paths of random length """
+        
+        def __init__(self):
+            self.sampler = Sampler()
+            
+        def Predict(self,ncollect,sanitycheck):
+            return ["A%sA"%("B"*self.sampler.rng.integers(0,1000)) for _ in range(ncollect)]
+    
+    def test_Run(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as outdir:
+            farm = GenerationFarm(GenerationFarmTest.FakeSetup,nworkers=2,seed=0)
+            shards = farm.Run(25,outdir=outdir,shardsize=10,verbose=False)
+            self.assertEqual(len(shards),3)
+            lines = [line for shard in shards for line in open(shard).read().split()]
+            self.assertEqual(len(lines),25)
+            self.assertEqual(farm.count,25)
+            self.assertGreater(len(set(lines)),20)
+            self.assertFalse(any(name.endswith(".tmp") for name in os.listdir(outdir)))
+
+if __name__ == "__main__":
+    unittest.main()
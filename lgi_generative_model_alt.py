@@ -19,18 +19,20 @@ normalization after every encoding layer
 """
 
 # Keras inputs
-from __future__ import print_function
 from keras import backend as K
 from keras.models import Model
-from keras.layers import Input,CuDNNLSTM,CuDNNGRU,Dense, Activation, Dropout,concatenate,average
+from keras.layers import Input,CuDNNLSTM,CuDNNGRU,Dense, Activation, Dropout,Lambda,concatenate,average
 from keras.layers.wrappers import Bidirectional
 from layernormalization import LayerNormalization
 from keras.optimizers import Adam,SGD
 from keras.utils.data_utils import get_file
+from keras.utils import Sequence
 from keras.callbacks import ModelCheckpoint, EarlyStopping, ReduceLROnPlateau
 from traininglossplot import TrainingLossPlot,Timer
-from lgi_generator import Generator,OnlineGenerator
-from keras_wavg import WeightedAverage # Weighted average (learnable)
+from lgi_metrics import MetricsLogger,MetricsPlot
+from lgi_generator import Generator
+from lgi_online_generator import OnlineGenerator
+from keras_wavg import WeightedAverage,FoldedAverage # Weighted average (learnable)
 
 # Miscellaneous inputs
 import numpy as np
@@ -47,25 +49,37 @@ class Trainer:
     the LSTM-SMILES generator.
     """
     
-    def __init__(self,model,Utils,sanitycheck=None,minimum=.95,patience=10,verbose=False):
+    def __init__(self,model,Utils,sanitycheck=None,minimum=.95,patience=10,verbose=False,loss="categorical_crossentropy",indices=False,
+                 asynchronous=False,maxlag=1,sequential=False):
         """
         Constructor of ErtlLSTMTraininer defining
         the model to train.
         Input:
-        model -- Model to be trained.
-        Utils -- Utils
+        model   -- Model to be trained.
+        Utils   -- Utils
         ...
+        loss    -- Loss function (default = 'categorical_crossentropy').
+        indices -- Flag for a model reading character indices (default = False).
+        asynchronous -- Flag to check the validity in a background thread while
+                        the training continues (default = False). See OnlineGenerator.
+        maxlag       -- Maximum number of weight snapshots waiting for the background
+                        thread (default = 1).
+        sequential   -- Flag to stop the generation of every epoch as soon as a
+                        sequential test decides on the rate (default = False).
         """
         self.model = model
         if sanitycheck is not None:
-            self.gen = Generator(model,Utils,sanitycheck=sanitycheck)
+            self.gen = Generator(model,Utils,sanitycheck=sanitycheck,indices=indices)
         else:
             self.gen = None
             
-        self.model.compile(loss="categorical_crossentropy",optimizer=Adam(lr=0.003),metrics=[])
+        self.model.compile(loss=loss,optimizer=Adam(lr=0.003),metrics=[])
         self.verbose = verbose
         self.minimum = minimum
         self.patience = patience
+        self.asynchronous = asynchronous
+        self.maxlag = maxlag
+        self.sequential = sequential
         self.interactive = True
 
     def SetInteractive(self,interactive):
@@ -79,12 +93,15 @@ class Trainer:
         self.interactive=interactive
         return self        
         
-    def Fit(self,X,y,filepath,logfile,num_epochs=100,batch_size=256,ncollect=180,npop=None,mycallbacks=list(),verbose=0):
+    def Fit(self,X,y,filepath,logfile,num_epochs=100,batch_size=256,ncollect=180,npop=None,mycallbacks=list(),verbose=0,metricsfile=None,
+            asynchronous=None,maxlag=None,sequential=None):
         """
         Method fits the dataset.
         Input:
-        X              -- Vector with X
-        y              -- Vector with y
+        X              -- Vector with X, or a keras Sequence generating the
+                          batches (e.g. WindowSequence). A Sequence is prefetched
+                          in a background thread while the model trains.
+        y              -- Vector with y (ignored for a Sequence).
         filepath       -- File path for the model files.
         logfile        -- File to save the log to.
         num_epochs     -- Number of epochs to train at each iteration (default = 100).
@@ -96,6 +113,18 @@ class Trainer:
         mycallbacks    -- Custom callback functions, will be added to the list
                           of default callback functions.
         verbose        -- Flag for verbose.
+        metricsfile    -- File to append the metrics of every epoch to, in JSONL
+                          or CSV format (default = None, not written).
+                          In interactive mode the log is plotted instead of
+                          redrawing the loss every epoch. See lgi_metrics.
+        asynchronous   -- Flag to check the validity in a background thread
+                          (default = None, using the setting of the trainer).
+        maxlag         -- Maximum number of weight snapshots waiting for the
+                          background thread (default = None, using the setting
+                          of the trainer).
+        sequential     -- Flag to accept or reject the rate of an epoch with a
+                          sequential test (default = None, using the setting of
+                          the trainer). See SampleSize.SequentialTest.
         """ 
         # Define a set of callback method to save models, stop early and monitor progress
         checkpoint = ModelCheckpoint(filepath, monitor='loss', verbose=1, save_best_only=True, mode='min')
@@ -110,21 +139,36 @@ class Trainer:
                                             patience=self.patience,
                                             verbose=verbose,
                                             restore_best_weights=True,
-                                            filename=logfile)
+                                            filename=logfile,
+                                            asynchronous=self.asynchronous if asynchronous is None else asynchronous,
+                                            maxlag=self.maxlag if maxlag is None else maxlag,
+                                            sequential=self.sequential if sequential is None else sequential)
             callbacks_list.append(earlystopping)
-            if self.interactive:
+            if metricsfile is not None:
+                callbacks_list.append(MetricsLogger(metricsfile,online=earlystopping))
+            if self.interactive and metricsfile is not None:
+                callbacks_list.append(MetricsPlot(metricsfile))
+            elif self.interactive:
                 monitoring = TrainingLossPlot(num_epochs=num_epochs,other=[earlystopping])
                 callbacks_list.append(monitoring)
         else:
             # Follow regular loss
             earlystopping = EarlyStopping(monitor='loss', min_delta=0, patience=5, verbose=1, mode='auto', baseline=None, restore_best_weights=True)
             callbacks_list.append(earlystopping)
-            if self.interactive:
+            if metricsfile is not None:
+                callbacks_list.append(MetricsLogger(metricsfile))
+            if self.interactive and metricsfile is not None:
+                callbacks_list.append(MetricsPlot(metricsfile))
+            elif self.interactive:
                 monitoring = TrainingLossPlot(num_epochs=num_epochs)
                 callbacks_list.append(monitoring)
                 
         # Fit
-        history = self.model.fit(X, y, batch_size=batch_size, epochs=num_epochs, callbacks=callbacks_list,shuffle=True, verbose=verbose)
+        if isinstance(X,Sequence):
+            history = self.model.fit_generator(X, epochs=num_epochs, callbacks=callbacks_list, shuffle=False, verbose=verbose,
+                                               workers=1, use_multiprocessing=False, max_queue_size=2)
+        else:
+            history = self.model.fit(X, y, batch_size=batch_size, epochs=num_epochs, callbacks=callbacks_list,shuffle=True, verbose=verbose)
             
         # Done
         return self.model,history
@@ -138,7 +182,7 @@ class BaseModel:
     method and architecture between LSTMModel and GRUModel. 
     """
     
-    def __init__(self,Utils,Unit=CuDNNLSTM,Layers=[256,256],Bidirectional=[True,False],Dropout=0.3,Optimizer=Adam(lr=0.002),Loss="categorical_crossentropy",minimodels=4,split=0,merge=0):
+    def __init__(self,Utils,Unit=CuDNNLSTM,Layers=[256,256],Bidirectional=[True,False],Dropout=0.3,Optimizer=Adam(lr=0.002),Loss="categorical_crossentropy",minimodels=4,split=0,merge=0,encoding=0):
         """
         Constructor of ErtlLSTMModel.
         Input:
@@ -159,6 +203,11 @@ class BaseModel:
                          0: Concatenated
                          1: Average
                          2: Learnable weighted average
+        encoding      -- Input encoding of the model (default = 0).
+                         Choose from:
+                         0: One-hot tensors
+                         1: Character indices, expanded to one-hot inside the model.
+                            Use with DataUtils.Encode(text,indices=True).
         """
         super(BaseModel,self).__init__()
         
@@ -177,17 +226,22 @@ class BaseModel:
         self.num_models = minimodels
         self.merge = merge
         self.split = split
+        self.encoding = encoding
         
-    def Init(self,weightsfile=None,verbose=False):
+    def Build(self,batch_size=None,stateful=False,inference=False):
         """
-        Method initializes the model based on the specified
-        parameters.
+        Method builds the model based on the specified parameters.
         Input:
-        weightsfile  -- File with weights (default is None).
-        sanitycheck  -- Validation check.
-        verbose      -- Flag for verbose mode, printing architecture (default = False).
+        batch_size   -- Fixed batch size of a stateful model (default = None).
+        stateful     -- Flag to build a stateful model reading a single
+                        character per call and carrying the hidden/cell
+                        state of the recurrent layers to the next call
+                        (default = False).
+        inference    -- Flag to build the inference-only head, without dropout,
+                        with parameter-free normalizations and an average with
+                        a folded scale (default = False). See InitInference.
         Return:
-        Initialized model based on the specified parameters.
+        Model based on the specified parameters.
         """
         # Load the variables
         num_chars,maxlen = self.Utils.NumChars(),self.Utils.MaxLen()
@@ -197,7 +251,28 @@ class BaseModel:
         # Build the model using the specified unit
         # Example units are for instance CuDNNLSTM or CuDNNGRU
         # The unit has been introduced as variable to facilitate flexible modifications.
-        comment_seq = Input(shape=[maxlen,num_chars],name="Input")
+        if stateful:
+            # The backward pass of a bidirectional layer needs the full window
+            if self.bilstm[0] or self.bilstm[1]:
+                raise ValueError("Stateful models require unidirectional layers")
+                
+        if self.encoding == 1:
+            # Read character indices and expand them to one-hot inside the model
+            if stateful:
+                comment_seq = Input(batch_shape=[batch_size,1],dtype="int32",name="Input")
+            else:
+                comment_seq = Input(shape=[maxlen],dtype="int32",name="Input")
+            encoded = Lambda(lambda x: K.one_hot(x,num_chars),name="OneHot")(comment_seq)
+        elif stateful:
+            comment_seq = encoded = Input(batch_shape=[batch_size,1,num_chars],name="Input")
+        else:
+            comment_seq = encoded = Input(shape=[maxlen,num_chars],name="Input")
+
+        # Define the normalization of the minimodels
+        def normalize(output_i,idx):
+            if inference:
+                return LayerNormalization(affine=False,name="Normalize_%s"%(idx))(output_i)
+            return LayerNormalization(name="LayerNormm_%s"%(idx))(output_i)
 
         # Define image
         minimodels = []
@@ -205,22 +280,22 @@ class BaseModel:
             # Apply scheme 1: Multiple embedding and multiple encoding            
             for idx in range(self.num_models):
                 if self.bilstm[0]:
-                    output_i = Bidirectional(self.Unit(l1,return_sequences=True),name="Embedding")(comment_seq)
+                    output_i = Bidirectional(self.Unit(l1,return_sequences=True),name="Embedding_%s"%(idx))(encoded)
                 else:
-                    output_i = self.Unit(l1,return_sequences=True,name="Embedding")(comment_seq)
+                    output_i = self.Unit(l1,return_sequences=True,stateful=stateful,name="Embedding_%s"%(idx))(encoded)
                 if self.bilstm[1]:
                     output_i = Bidirectional(self.Unit(l2),name="Latent_%s"%(idx))(output_i)
                 else:
-                    output_i = self.Unit(l2,name="Latent_%s"%(idx))(output_i)
-                output_i = LayerNormalization(name="LayerNormm_%s"%(idx))(output_i)
+                    output_i = self.Unit(l2,stateful=stateful,name="Latent_%s"%(idx))(output_i)
+                output_i = normalize(output_i,idx)
                 minimodels.append(output_i)    
                 
         else:
             # Apply scheme 0: One embedding and multiple encoding
             if self.bilstm[0]:
-                output = Bidirectional(self.Unit(l1,return_sequences=True),name="Embedding")(comment_seq)
+                output = Bidirectional(self.Unit(l1,return_sequences=True),name="Embedding")(encoded)
             else:
-                output = self.Unit(l1,return_sequences=True,name="Embedding")(comment_seq)
+                output = self.Unit(l1,return_sequences=True,stateful=stateful,name="Embedding")(encoded)
 
             # Create multiple encoding models
             minimodels = []
@@ -228,13 +303,16 @@ class BaseModel:
                 if self.bilstm[1]:
                     output_i = Bidirectional(self.Unit(l2),name="Latent_%s"%(idx))(output)
                 else:
-                    output_i = self.Unit(l2,name="Latent_%s"%(idx))(output)
-                output_i = LayerNormalization(name="LayerNormm_%s"%(idx))(output_i)
+                    output_i = self.Unit(l2,stateful=stateful,name="Latent_%s"%(idx))(output)
+                output_i = normalize(output_i,idx)
                 minimodels.append(output_i)            
             
         # Combine to a single model using the selected mode
         if len(minimodels)==1:
             output = minimodels[0]
+        elif inference and self.merge in [1,2]:
+            # The gammas are folded into the scale of the average
+            output = FoldedAverage(merge=self.merge,name="FoldedAvg")(minimodels)
         elif self.merge == 1:
             output = average(minimodels)
         elif self.merge == 2:
@@ -244,12 +322,27 @@ class BaseModel:
             output = concatenate(minimodels)
             
         # Apply a dropout and compute the probabilities
-        output = Dropout(self.Dropout)(output)
+        if not inference:
+            output = Dropout(self.Dropout)(output)
         output = Dense(num_chars,name="Output")(output)
         output = Activation("softmax")(output)
         
+        # Done
+        return Model([comment_seq],output)
+        
+    def Init(self,weightsfile=None,verbose=False):
+        """
+        Method initializes the model based on the specified
+        parameters.
+        Input:
+        weightsfile  -- File with weights (default is None).
+        sanitycheck  -- Validation check.
+        verbose      -- Flag for verbose mode, printing architecture (default = False).
+        Return:
+        Initialized model based on the specified parameters.
+        """
         # Compile the model using the specified methods
-        self.model = Model([comment_seq],output)       
+        self.model = self.Build()
         if verbose:
             self.model.summary()        
         
@@ -260,12 +353,78 @@ class BaseModel:
         # Done
         return self.model
     
+    def InitStateful(self,batch_size=1,verbose=False):
+        """
+        Method initializes a stateful inference twin of the
+        trained model. The twin reads one character per call and
+        keeps the hidden/cell state of every recurrent layer, so
+        that the cost per generated character no longer depends
+        on maxlen. The weights are copied from the trained model.
+        Note that the twin carries the state beyond the maxlen
+        window the model was trained on.
+        Input:
+        batch_size   -- Number of sequences generated in parallel (default = 1).
+        verbose      -- Flag for verbose mode, printing architecture (default = False).
+        Return:
+        Stateful model sharing the weights of the trained model.
+        """
+        if self.model is None:
+            self.Init()
+        twin = self.Build(batch_size=batch_size,stateful=True)
+        if verbose:
+            twin.summary()
+        twin.set_weights(self.model.get_weights())
+        return twin
+    
+    def InitInference(self,weightsfile=None,batch_size=None,stateful=False,verbose=False):
+        """
+        Method builds an inference-only twin of the trained model. The
+        twin has no dropout. The gamma and beta of the layer normalizations
+        and the weights of the merge are folded into the scale of a
+        FoldedAverage and the output layer, which keeps its size. The
+        probabilities equal those of the trained model up to rounding.
+        See lgi_numpy_engine.FoldHead.
+        Input:
+        weightsfile  -- File with weights (default = None).
+        batch_size   -- Fixed batch size of a stateful model (default = None).
+        stateful     -- Flag to read a single character per call (default = False).
+                        Requires unidirectional layers.
+        verbose      -- Flag for verbose mode, printing architecture (default = False).
+        Return:
+        Inference model with the folded weights of the trained model.
+        """
+        from lgi_numpy_engine import FoldHead
+        if self.model is None:
+            self.Init(weightsfile=weightsfile)
+        elif weightsfile is not None:
+            self.model.load_weights(weightsfile)
+        twin = self.Build(batch_size=batch_size,stateful=stateful,inference=True)
+        if verbose:
+            twin.summary()
+            
+        # Copy the recurrent layers and fold the head into the average and the output layer
+        for layer in twin.layers:
+            if layer.name not in ["Output","FoldedAvg"] and len(layer.weights) > 0:
+                layer.set_weights(self.model.get_layer(layer.name).get_weights())
+        n = self.num_models
+        gammas,betas = zip(*[self.model.get_layer("LayerNormm_%s"%(idx)).get_weights() for idx in range(n)])
+        weights = self.model.get_layer("WeightedAvg").get_weights()[0] if n > 1 and self.merge == 2 else None
+        kernel,bias = self.model.get_layer("Output").get_weights()
+        scale,kernel,bias = FoldHead(gammas,betas,kernel,bias,self.merge,weights)
+        if scale is not None:
+            twin.get_layer("FoldedAvg").set_weights([scale])
+        twin.get_layer("Output").set_weights([kernel,bias])
+        return twin
+    
     def InitTrainer(self,
                     weightsfile=None,
                     sanitycheck=None,
                     minimum = 0.95,
                     patience=10,
-                    verbose=False):
+                    verbose=False,
+                    asynchronous=False,
+                    maxlag=1,
+                    sequential=False):
         """
         Method initializes a model and immediately
         generates a training instance for the model.
@@ -280,21 +439,69 @@ class BaseModel:
                         The minimum value defines the minimum 
                         percentage that should be reached.
         verbose      -- Flag for verbose mode (default = False).
+        asynchronous -- Flag to check the validity in a background thread while
+                        the training continues (default = False).
+        maxlag       -- Maximum number of weight snapshots waiting for the background
+                        thread (default = 1).
+        sequential   -- Flag to accept or reject the rate of an epoch with a
+                        sequential test (default = False).
         Return:
         Initialized model based on the specified parameters.
         """        
-        return Trainer(self.Init(weightsfile),self.Utils,sanitycheck,minimum,patience,verbose)
+        if self.encoding == 1:
+            loss = "sparse_categorical_crossentropy"
+        else:
+            loss = "categorical_crossentropy"
+        return Trainer(self.Init(weightsfile),self.Utils,sanitycheck,minimum,patience,verbose,loss=loss,indices=self.encoding==1,
+                       asynchronous=asynchronous,maxlag=maxlag,sequential=sequential)
     
+    def Export(self,weightsfile=None,stateful=False,fold=False):
+        """
+        Method exports the weights of the model to a NumPy
+        implementation of the forward pass, running on CPU
+        without TensorFlow. See lgi_numpy_engine.
+        Input:
+        weightsfile  -- File with weights for the network (default = None).
+        stateful     -- Flag to read a single character per step (default = False).
+                        Requires unidirectional layers.
+        fold         -- Flag to fold the head into the output layer (default = False).
+                        See NumpyModel.Fold.
+        Return:
+        Instance of NumpyModel.
+        """
+        from lgi_numpy_engine import Export
+        if self.model is None:
+            self.Init(weightsfile=weightsfile)
+        elif weightsfile is not None:
+            self.model.load_weights(weightsfile)
+        model = Export(self).Clone(stateful=stateful)
+        return model.Fold() if fold else model
+        
     def InitGenerator(self,weightsfile=None,
-                      sanitycheck=lambda x: True):
+                      sanitycheck=lambda x: True,
+                      batch_size=1,
+                      stateful=False,
+                      numpy=False,
+                      inference=False):
         """
         Method generates an instance to generate SMILES.
         Input:
         weightsfile  -- File with weights for the network.
         regsmiles    --
+        batch_size   -- Number of sequences generated in parallel (default = 1).
+        stateful     -- Flag to generate with a stateful twin of the model,
+                        reading a single character per step (default = False).
+                        Requires unidirectional layers.
+        numpy        -- Flag to generate with the NumPy forward pass (default = False).
+        inference    -- Flag to generate with the inference-only twin of the model
+                        (default = False). See InitInference.
         Return:
         Instance to generate SMILES using the trained model.
         """
+        if numpy:
+            model = self.Export(weightsfile=weightsfile,stateful=stateful,fold=inference)
+            return Generator(model,self.Utils,sanitycheck,batch_size=batch_size,stateful=stateful,indices=self.encoding==1)
+            
         # Get the instance from the cache and load the weights if specified
         if self.model is not None:
             model = self.model
@@ -306,26 +513,110 @@ class BaseModel:
             model = self.Init(weightsfile=weightsfile)
             
         # Construct the generator
-        return Generator(model,self.Utils,sanitycheck)
+        if inference:
+            model = self.InitInference(batch_size=batch_size if stateful else None,stateful=stateful)
+        elif stateful:
+            model = self.InitStateful(batch_size=batch_size)
+        return Generator(model,self.Utils,sanitycheck,batch_size=batch_size,stateful=stateful,indices=self.encoding==1)
         
         
 # Import unittest
 import unittest
 class BaseModelTest(unittest.TestCase):
-    """ """
+    """ Test class building a small unidirectional model without CuDNN """
+    
+    Unit,bilstm = "LSTM",[False,False]
     
     def setUp(self):
-        pass
+        import keras.layers
+        from lgi_generative_model_utils import DataUtils
+        self.Utils = DataUtils(maxlen=12,step=3)
+        self.Utils.Prepare(["ABBBBA","ABBC(A)A","B1BBBBB1","AC1BC(A)B1"]*10)
+        self.base = BaseModel(self.Utils,Unit=getattr(keras.layers,self.Unit),Layers=[8,8],Bidirectional=self.bilstm,minimodels=2,merge=2)
+        self.model = self.base.Init()
+        self.X = self.Utils.Encode(self.Utils.Text())[0][:16]
+        
+    def test_Build(self):
+        """ Method checks the shape and normalization of the output """
+        self.assertEqual(self.model.output_shape,(None,self.Utils.NumChars()))
+        np.testing.assert_allclose(self.model.predict(self.X).sum(axis=1),1.,rtol=1e-5)
+        
+    def test_Export(self):
+        """ Method checks that the NumPy forward pass reproduces Keras """
+        np.testing.assert_allclose(self.base.Export().predict(self.X),self.model.predict(self.X),rtol=1e-4,atol=1e-6)
+        np.testing.assert_allclose(self.base.Export(fold=True).predict(self.X),self.model.predict(self.X),rtol=1e-4,atol=1e-6)
+        
+    def test_Inference(self):
+        """ Method checks that the inference-only model reproduces the trained model """
+        for layer in self.model.layers:
+            if layer.name.startswith("LayerNormm"):
+                layer.set_weights([np.random.normal(1,.1,w.shape) for w in layer.get_weights()])
+        twin = self.base.InitInference()
+        self.assertFalse(any(layer.name.startswith("LayerNormm") or layer.name == "WeightedAvg" for layer in twin.layers))
+        self.assertEqual(twin.get_layer("Output").get_weights()[0].shape,self.model.get_layer("Output").get_weights()[0].shape)
+        np.testing.assert_allclose(twin.predict(self.X),self.model.predict(self.X),rtol=1e-4,atol=1e-6)
+        
+    def test_Predict(self):
+        """ Method checks generation with the Keras and the NumPy model """
+        self.assertEqual(len(self.base.InitGenerator(batch_size=4).Predict(ncollect=3)),3)
+        self.assertEqual(len(self.base.InitGenerator(batch_size=4,numpy=True).Predict(ncollect=3)),3)
 
-class BiLSTMModelTest(unittest.TestCase):
-    """ """
+class BiLSTMModelTest(BaseModelTest):
+    """ Test class building a small bidirectional LSTM model """
     
-    def setUp(self):
-        pass
+    Unit,bilstm = "LSTM",[True,True]
 
-class BiGRUModelTest(unittest.TestCase):
-    """ """
+class BiGRUModelTest(BaseModelTest):
+    """ Test class building a small bidirectional GRU model """
     
-    def setUp(self):
-        pass
+    Unit,bilstm = "GRU",[True,False]
+
+class TrainerTest(unittest.TestCase):
+    """ Test class passing the options of the validity checks through Fit """
     
+    class FakeModel:
+        """ Model running the callbacks with a rate of valid strings per epoch """
+        values = [0.1,0.3,0.999,0.999,0.999,0.999]
+        
+        def __init__(self):
+            self.weights = [np.zeros(1)]
+            self.stop_training = False
+            
+        def get_weights(self):
+            return [w.copy() for w in self.weights]
+            
+        def set_weights(self,weights):
+            self.weights = [w.copy() for w in weights]
+            
+        def compile(self,**kwargs):
+            pass
+            
+        def save(self,*args,**kwargs):
+            pass
+            
+        def fit(self,X,y,epochs=1,callbacks=[],**kwargs):
+            for callback in callbacks:
+                callback.set_model(self)
+                callback.on_train_begin()
+            for epoch,value in enumerate(self.values[:epochs]):
+                if self.stop_training:
+                    break
+                self.weights = [np.array([value])]
+                for callback in callbacks:
+                    callback.on_epoch_begin(epoch)
+                    callback.on_epoch_end(epoch,{"loss":1.0})
+            for callback in callbacks:
+                callback.on_train_end()
+                
+    def test_Fit(self):
+        """ Method checks that Fit runs the sequential test of the online generator """
+        import os,tempfile
+        from lgi_online_generator import OnlineGeneratorTest
+        model = self.FakeModel()
+        trainer = Trainer(model,None,sanitycheck=lambda x: True,minimum=.95,patience=2).SetInteractive(False)
+        trainer.gen = OnlineGeneratorTest.FakeGenerator(model)
+        with tempfile.TemporaryDirectory() as outdir:
+            trainer.Fit(None,None,os.path.join(outdir,"model.h5"),os.path.join(outdir,"log.csv"),num_epochs=6,sequential=True)
+        self.assertEqual(len(trainer.gen.samples),4)
+        self.assertLess(max(trainer.gen.samples[:2]),20)
+        self.assertLessEqual(max(trainer.gen.samples),180)
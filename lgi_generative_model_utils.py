@@ -23,6 +23,11 @@ the feature vector and labels to train from.
 
 import numpy
 from numpy import random
+from numpy.lib.stride_tricks import as_strided
+import hashlib
+import json
+import os
+import shutil
 
 #######################################
 # Section with a class defining utils #
@@ -107,16 +112,21 @@ class DataUtils:
         self.data = data
         return self.text
     
-    def Encode(self,text):
+    def Encode(self,text,indices=False):
         """
         Method encodes a list of Strings to vectors for the LSTM.
         Input:
-        text   -- Text to be translated.
-        maxlen -- Maximum sentence length (default = 40).
-                  This length will be set to the longest observed
-                  length, if the longest observed length is lower
-                  than maxlen.
-        step   -- Step (default = 3).
+        text    -- Text to be translated.
+        maxlen  -- Maximum sentence length (default = 40).
+                   This length will be set to the longest observed
+                   length, if the longest observed length is lower
+                   than maxlen.
+        step    -- Step (default = 3).
+        indices -- Flag to encode characters as indices (default = False).
+                   If set, X contains uint8 character indices with shape
+                   (N,maxlen) and y the uint8 index of the next character
+                   with shape (N,), instead of boolean one-hot tensors.
+                   Use with BaseModel(encoding=1).
         """
         # Update maxlen based on the longest observed word
         # This is important, otherwise no sentences will be presented
@@ -126,24 +136,138 @@ class DataUtils:
         maxlen = numpy.min([maxword,maxlen])
         self.maxlen = maxlen
         
-        # Translate the sentences to little pieces.
-        sentences = []
-        next_chars = []
-        for i in range(0, len(text) - maxlen, step):
-            sentences.append(text[i: i + maxlen])
-            next_chars.append(text[i + maxlen])
-
-        # Vectorize the sentences in boolean format
-        X = numpy.zeros((len(sentences), maxlen, len(self.chars)), dtype=numpy.bool)
-        y = numpy.zeros((len(sentences), len(self.chars)), dtype=numpy.bool)
-        for i,sentence in enumerate(sentences):
-            for t,char in enumerate(sentence):
-                X[i,t,self.char_indices[char]] = True
-            y[i,self.char_indices[next_chars[i]]] = True
+        # Cut all windows as a strided view on the character indices
+        codes = self.Indices(text)
+        offsets = numpy.arange(0, max(len(text) - maxlen, 0), step)
+        num = len(offsets)
+        windows = as_strided(codes, shape=(num, maxlen), strides=(step*codes.strides[0], codes.strides[0]))
+        next_chars = codes[offsets + maxlen]
+
+        # Vectorize the sentences as character indices
+        if indices:
+            return windows.copy(),next_chars,maxlen
+
+        # Vectorize the sentences in boolean format, filling blocks of
+        # windows to bound the memory of the index arrays
+        X = numpy.zeros((num, maxlen, len(self.chars)), dtype=bool)
+        y = numpy.zeros((num, len(self.chars)), dtype=bool)
+        positions = numpy.arange(maxlen)
+        for start in range(0, num, 65536):
+            end = min(start + 65536, num)
+            rows = numpy.arange(start, end)
+            X[rows[:,None], positions, windows[start:end]] = True
+            y[rows, next_chars[start:end]] = True
 
         # Done: Return X,Y and maxlen
         return X,y,maxlen
         
+    def Indices(self,text):
+        """
+        Method translates a text to an array with character indices.
+        Input:
+        text -- Text to be translated.
+        Return:
+        Array with uint8 character indices with the length of the text.
+        """
+        unknown = set(text).difference(self.char_indices)
+        if len(unknown) > 0:
+            raise KeyError(sorted(unknown)[0])
+        table = numpy.zeros(256, dtype=numpy.uint8)
+        for char,idx in self.char_indices.items():
+            table[ord(char)] = idx
+        return table[numpy.frombuffer(text.encode("ascii"), dtype=numpy.uint8)]
+        
+    def CacheKey(self,filename,augment_key=None,naug=0,shuffle=True,indices=False):
+        """
+        Method computes the key of an encoded training set from the
+        content of the input file and the encoding settings.
+        Input:
+        filename    -- File with the input Strings.
+        augment_key -- Name identifying the augmentation method and its
+                       version (default = None, not augmented).
+        naug        -- Number of augmentations (default = 0).
+        shuffle     -- Flag to shuffle data (default = True).
+        indices     -- Flag to encode characters as indices (default = False).
+        Return:
+        Hexadecimal key.
+        """
+        digest = hashlib.sha256()
+        with open(filename,"rb") as f:
+            for block in iter(lambda: f.read(1<<20),b""):
+                digest.update(block)
+        if naug <= 0 or augment_key is None:
+            augment_key,naug = None,0
+        settings = [digest.hexdigest(),int(self.maxlen),int(self.step),self.okchars,augment_key,naug,bool(shuffle),bool(indices)]
+        return hashlib.sha256(json.dumps(settings).encode("utf-8")).hexdigest()[:24]
+    
+    def PrepareEncoded(self,filename,cachedir="encoded",usecache=True,augment=None,naug=0,shuffle=True,indices=False,augment_key=None):
+        """
+        Method prepares and encodes a file with Strings, using an
+        on-disk cache. The cache stores X and y as .npy-files, which
+        are memory-mapped on reload, together with the text corpus.
+        The cache is keyed by the file content, maxlen, step, the
+        characters and the augmentation settings; changing any of
+        them creates a new entry. The code of the augmentation method
+        cannot be keyed reliably, so an augmented set is only cached
+        with an explicit augment_key, which must change with the method.
+        Note that a cached entry keeps the shuffled order of its first
+        preparation.
+        Input:
+        filename -- File with the input Strings.
+        cachedir -- Directory of the cache (default = 'encoded').
+        usecache -- Flag to use the cache (default = True).
+                    If set to False, the file is prepared and encoded in memory.
+        augment  -- Augmentation method (default = None, see Prepare).
+        naug     -- Number of augmentations (default = 0, see Prepare).
+        shuffle  -- Flag to shuffle data (default = True).
+        indices  -- Flag to encode characters as indices (default = False, see Encode).
+        augment_key -- Name identifying the augmentation method and its version,
+                       e.g. 'randomize-v1' (default = None). Required to cache
+                       an augmented set.
+        Return:
+        X,y and maxlen like Encode.
+        Raises:
+        ValueError if an augmented set is cached without augment_key.
+        """
+        if not usecache:
+            text = self.Prepare(filename,augment=augment,naug=naug,shuffle=shuffle)
+            return self.Encode(text,indices=indices)
+        
+        if augment is not None and naug > 0 and augment_key is None:
+            raise ValueError("An augmented training set is only cached with an augment_key")
+        
+        # Encode and store in a temporary directory on a cache miss
+        path = os.path.join(cachedir,self.CacheKey(filename,augment_key if augment is not None else None,naug,shuffle,indices))
+        if not os.path.exists(os.path.join(path,"meta.json")):
+            text = self.Prepare(filename,augment=augment,naug=naug,shuffle=shuffle)
+            X,y,maxlen = self.Encode(text,indices=indices)
+            tmp = "%s.%s.tmp"%(path,os.getpid())
+            os.makedirs(tmp,exist_ok=True)
+            numpy.save(os.path.join(tmp,"X.npy"),X)
+            numpy.save(os.path.join(tmp,"y.npy"),y)
+            with open(os.path.join(tmp,"text.txt"),"w") as f:
+                f.write(text)
+            with open(os.path.join(tmp,"meta.json"),"w") as f:
+                json.dump({"maxlen":int(maxlen),"evaluated":self.evaluated,"kept":self.kept,"maxg6":self.maxg6},f)
+            del X,y
+            try:
+                os.rename(tmp,path)
+            except OSError:
+                # Raise unless stored concurrently by another process
+                shutil.rmtree(tmp,ignore_errors=True)
+                if not os.path.exists(os.path.join(path,"meta.json")):
+                    raise
+            
+        # Load the cached values with memory-mapped tensors
+        with open(os.path.join(path,"meta.json")) as f:
+            meta = json.load(f)
+        with open(os.path.join(path,"text.txt")) as f:
+            self.text = f.read()
+        self.maxlen,self.evaluated,self.kept,self.maxg6 = meta["maxlen"],meta["evaluated"],meta["kept"],meta["maxg6"]
+        X = numpy.load(os.path.join(path,"X.npy"),mmap_mode="r")
+        y = numpy.load(os.path.join(path,"y.npy"),mmap_mode="r")
+        return X,y,self.maxlen
+        
     def NumChars(self):
         """
         Return:
@@ -181,5 +305,55 @@ class DataUtils:
 # Section with main method to run tests cmd #
 #############################################
 import unittest
+class DataUtilsTest(unittest.TestCase):
+    """ Test class evaluating the encoded training set """
+    
+    def setUp(self):
+        self.Utils = DataUtils(maxlen=10,step=3)
+        self.text = self.Utils.Prepare(["ABBBBA","ABBC(A)A","B1BBBBB1","AC1BC(A)B1"]*5)
+        
+    def test_EncodeIndices(self):
+        """ Method tests that the index encoding matches the one-hot encoding """
+        X,y,maxlen = self.Utils.Encode(self.text)
+        Xi,yi,maxleni = self.Utils.Encode(self.text,indices=True)
+        self.assertEqual(maxlen,maxleni)
+        self.assertEqual((len(X),maxlen),Xi.shape)
+        self.assertEqual(numpy.uint8,Xi.dtype)
+        self.assertTrue((X.argmax(axis=2) == Xi).all())
+        self.assertTrue((y.argmax(axis=1) == yi).all())
+        
+    def test_PrepareEncoded(self):
+        """ Method tests that cached encodings are reloaded memory-mapped and keyed by settings """
+        import tempfile
+        tmp = tempfile.mkdtemp()
+        filename = os.path.join(tmp,"graphs.lgi")
+        with open(filename,"w") as f:
+            f.write("ABBBBA\nABBC(A)A\nB1BBBBB1\nAC1BC(A)B1\n"*5)
+        cachedir = os.path.join(tmp,"cache")
+        X,y,maxlen = DataUtils(maxlen=10,step=3).PrepareEncoded(filename,cachedir=cachedir)
+        Utils = DataUtils(maxlen=10,step=3)
+        Xc,yc,maxlenc = Utils.PrepareEncoded(filename,cachedir=cachedir)
+        self.assertIsInstance(Xc,numpy.memmap)
+        self.assertTrue((X == Xc).all() and (y == yc).all() and maxlen == maxlenc)
+        self.assertEqual(len(Utils.Text()),Utils.LenText())
+        self.assertEqual(1,len(os.listdir(cachedir)))
+        DataUtils(maxlen=10,step=2).PrepareEncoded(filename,cachedir=cachedir)
+        self.assertEqual(2,len(os.listdir(cachedir)))
+        
+        # A failed store raises and leaves no temporary directory
+        Utils = DataUtils(maxlen=10,step=4)
+        path = os.path.join(cachedir,Utils.CacheKey(filename,None,0,True,False))
+        os.makedirs(path)
+        open(os.path.join(path,"partial"),"w").close()
+        self.assertRaises(OSError,Utils.PrepareEncoded,filename,cachedir=cachedir)
+        self.assertEqual(3,len(os.listdir(cachedir)))
+        
+        # Augmented sets are keyed by the augment_key
+        augment = lambda smi,naug: [smi]*naug
+        self.assertRaises(ValueError,DataUtils(maxlen=10,step=3).PrepareEncoded,filename,cachedir=cachedir,augment=augment,naug=2)
+        for key in ["copy-v1","copy-v2","copy-v1"]:
+            DataUtils(maxlen=10,step=3).PrepareEncoded(filename,cachedir=cachedir,augment=augment,naug=2,augment_key=key)
+        self.assertEqual(5,len(os.listdir(cachedir)))
+        
 if __name__ == "__main__":
     unittest.main(argv=['first-arg-is-ignored'],  verbosity=2, exit=False)
@@ -13,178 +13,116 @@ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
 """
 
 
+
 """
-File lgi_generator defines a class to generate graphs in LGI-format
+File lgi_generator defines a class to generate graphs in LGI-format.
+The Keras callback OnlineGenerator is defined in lgi_online_generator
+and imported on first access, so that generating graphs does not
+load Keras, TensorFlow or matplotlib.
 """
 
-# Keras inputs
-from __future__ import print_function
-from keras import backend as K
-from keras.models import Sequential
-from keras.layers import Dense, Activation, Dropout
-from keras.layers import CuDNNLSTM, CuDNNGRU # Import for both model types
-from keras.optimizers import Adam,SGD
-from keras.utils.data_utils import get_file
-from keras.callbacks import Callback
-from traininglossplot import TrainingLossPlot,Timer
-from samplesize import SampleSize
+# Generator inputs
+from lgi_sampler import Sampler
+from lgi_grammar import LGIGrammar
 
 # Miscellaneous inputs
 import numpy as np
 import random
 import sys
+import time
 from datetime import datetime
 from numpy import random,zeros,array
 
-
-# Define a special function for early-stopping
-# This method will stop the training when a better percentage
-# has been reached.
-class OnlineGenerator(Callback):
+def __getattr__(name):
     """
-    The class OnlineGenerator is a special Callback function
-    to keep track of the number of valid generated molecules.
-    The Callback has been derived from EarlyStopping and stops
-    as soon as a threshold is repeatedly exceeded.
+    Method imports OnlineGenerator on first access.
+    Input:
+    name -- Name of the attribute.
+    Return:
+    Attribute of the module.
     """
+    if name == "OnlineGenerator":
+        from lgi_online_generator import OnlineGenerator
+        return OnlineGenerator
+    raise AttributeError("module %r has no attribute %r"%(__name__,name))
 
-    def __init__(self,
-                 gen,
-                 min_value=.95,
-                 ncollect=300,
-                 npop=None,
-                 patience=0,
-                 verbose=0,
-                 baseline=None,
-                 targetdist=None,
-                 distmethod=None,
-                 warmup=3,
-                 restore_best_weights=True,
-                 filename=None):
-        """
-        Constructor of OnlineGenerator.
+# Section with a profile of the generation
+class GeneratorProfile:
+    """
+    Class GeneratorProfile collects the cumulative time and number of
+    calls per stage of the generation, and counters such as generated
+    characters, accepted and rejected strings and consumed seeds.
+    """
+    
+    def __init__(self):
+        """
+        Constructor of GeneratorProfile.
+        """
+        super(GeneratorProfile,self).__init__()
+        self.Reset()
+        
+    def Reset(self):
+        """
+        Method clears all stages and counters and restarts the clock.
+        """
+        self.seconds = dict()
+        self.calls = dict()
+        self.counts = dict()
+        self.start = time.perf_counter()
+        
+    def Add(self,stage,seconds):
+        """
+        Method adds the time of a call to a stage.
         Input:
-        gen                  -- Generator.
-        min_value            -- Minimum value to reach and repeatedly hold (default = 0.95).
-        patience             -- Patience until stop.
-        verbose              -- Value for verbose mode (default = 0).
-        baseline             -- Value for baseline (default = None).
-        targetdist           -- Target distribution (default = None).
-                                If set to None, the distribution of online generated
-                                entries is not compared to the reference distribution.
-        distmethod           -- Distribution method (default = None).
-                                If set to None, the distribution of online generated
-                                entries is not compared to the reference distribution.
-        restore_best_weights -- Value to restore best weights (default = True).
-        filename             -- File name to store the output data to (default is None).
-                                If set to None, nothing is stored.
-        """
-        super(OnlineGenerator, self).__init__()
-        self.gen = gen
-        self.ncollect = ncollect
-        self.targetdist = targetdist
-        self.method = distmethod
-        self.baseline = baseline
-        self.patience = patience
-        self.pct,self.epoch = 0,0
-        self.mode = 'max'
-        self.verbose = verbose
-        self.history = {}
-        self.wait = 0
-        self.stopped_epoch = 0
-        self.restore_best_weights = restore_best_weights
-        self.best_weights = None
-        self.monitor_op = np.greater
-        self.filename = filename
+        stage   -- Name of the stage.
+        seconds -- Seconds spent in the call.
+        """
+        self.seconds[stage] = self.seconds.get(stage,0.)+seconds
+        self.calls[stage] = self.calls.get(stage,0)+1
         
-        # Define minvalue with statistical window
-        self.minvalue = min_value
-        self.lowervalue,self.uppervalue = SampleSize.ComputeInterval(min_value,ncollect,npopulation=npop)
-
-    def on_train_begin(self, logs=None):
-        # Allow instances to be re-used
-        self.wait = 0
-        self.stopped_epoch = 0
-        self.loss_hist = list()
-        self.pct_hist = list()
-        if self.baseline is not None:
-            self.best = self.baseline
-        else:
-            self.best = np.Inf if self.monitor_op == np.less else -np.Inf
-
-    def generate(self):
-        self.epoch += 1
-        self.pct,self.H = self.gen.PercentValid(ncollect=self.ncollect,verbose=self.verbose) 
-        self.pct_hist.append(self.pct)
-        self.history[self.epoch] = (self.pct,self.H)
-        if self.verbose:
-            print("Updating score after epoch %s: %.1f%%"%(self.epoch,100.0*self.pct))
-
-        # Check the output valid
-        current = self.pct
-        if current is None:
-            return
-
-        # Update the best weights
-        if current > self.best:
-            self.best = current
-            self.best_weights = self.model.get_weights()
-
-        # Continue until the lower confidence bound is repeatedly exceeded
-        if self.minvalue is not None and current < self.lowervalue:
-            self.wait = 0
-            if self.restore_best_weights:
-                self.best_weights = self.model.get_weights()
-            print("Min value of %.4f not yet reached: %.4f"%(self.minvalue,current))
-            return
-        else:
-            # Count and stop after 5 rounds.
-            self.wait += 1
-            print("Above min value of %.4f for %s consecutive epochs"%(self.minvalue,self.wait))
-            if self.wait >= self.patience:
-                self.stopped_epoch = self.epoch
-                self.model.stop_training = True
-                if self.restore_best_weights:
-                    if self.verbose > 0:
-                        print('Restoring model weights from the end of '
-                              'the best epoch')
-                    self.model.set_weights(self.best_weights)        
-            
-    def on_epoch_end(self, batch, logs={}):
-        self.generate()
-        self.loss_hist.append(logs["loss"])
-        print("l",self.loss_hist)
-        print("p",self.pct_hist)
-
-    def on_train_end(self, logs={}):
-        #self.generate()
-        self.collected_logs = logs
-        if self.stopped_epoch > 0 and self.verbose > 0:
-            print('Epoch %05d: early stopping' % (self.stopped_epoch + 1))
-            lower,upper = self.epoch-self.patience,self.epoch-self.patience+2
-            print("Recommended model at epoch = [%s,%s]"%(lower,upper))
-        else:
-            print("No stable results observed for target %.3f [%.3f,%.3f]"%(self.minvalue,self.lowervalue,self.uppervalue))
-            
-        if self.filename is not None:
-            with open(self.filename,"w") as f:
-                f.write("epoch,loss,pct_valid\n")
-                e = 0
-                for loss,pct in zip(self.loss_hist,self.pct_hist):
-                    e += 1
-                    f.write("%s,%.4f,%.1f\n"%(e,loss,100.0*pct))
-            print("Loss/Valid written to %s"%(self.filename))
+    def Count(self,name,n=1):
+        """
+        Method increments a counter.
+        Input:
+        name -- Name of the counter.
+        n    -- Increment (default = 1).
+        """
+        self.counts[name] = self.counts.get(name,0)+n
+        
+    def Merge(self,other):
+        """
+        Method adds the stages and counters of another profile.
+        Input:
+        other -- Instance of GeneratorProfile.
+        """
+        for stage,seconds in other.seconds.items():
+            self.seconds[stage] = self.seconds.get(stage,0.)+seconds
+            self.calls[stage] = self.calls.get(stage,0)+other.calls[stage]
+        for name,n in other.counts.items():
+            self.Count(name,n)
             
-    def get_monitor_value(self, logs={}):
-        monitor_value = self.pct
-        if monitor_value is None:
-            warnings.warn(
-                'Early stopping conditioned on metric `%s` '
-                'which is not available. Available metrics are: %s' %
-                (self.monitor, ','.join(list(logs.keys()))), RuntimeWarning
-            )
-        return monitor_value
-
+    def Report(self):
+        """
+        Method summarizes the profile since the last reset.
+        Return:
+        Dictionary with the wall time, the stages with seconds, calls and
+        share of the wall time, the counters and the derived rates
+        chars_per_second, rejection_rate and model_calls_per_accepted.
+        """
+        wall = time.perf_counter()-self.start
+        counts = self.counts
+        accepted,rejected = counts.get("accepted",0),counts.get("rejected",0)
+        model_calls = self.calls.get("predict",0)
+        report = {"seconds":wall,
+                  "stages":dict([(stage,{"seconds":seconds,"calls":self.calls[stage],"share":seconds/wall if wall > 0 else 0.})
+                                 for stage,seconds in self.seconds.items()]),
+                  "model_calls":model_calls,
+                  "chars_per_second":counts.get("chars",0)/wall if wall > 0 else 0.,
+                  "rejection_rate":rejected/(accepted+rejected) if accepted+rejected > 0 else 0.,
+                  "model_calls_per_accepted":model_calls/accepted if accepted > 0 else None}
+        for name in ["chars","strings","accepted","rejected","duplicates","valid","seeds","overflows"]:
+            report[name] = counts.get(name,0)
+        return report
 
 # Section with a model generator
 class Generator:
@@ -193,130 +131,375 @@ class Generator:
     to generate SMILES. 
     """
     
-    def __init__(self,model,Utils,sanitycheck=lambda x: True):
+    def __init__(self,model,Utils,sanitycheck=lambda x: True,batch_size=1,stateful=False,sampler=None,grammar=None,indices=False,profile=False):
         """
         Constructor of ErtlLSTMGenerator.
         Input:
         model        -- Trained model.
         Utils        -- Utils used to generate the training set.
+        batch_size   -- Number of sequences generated in parallel (default = 1).
+        stateful     -- Flag indicating that model is a stateful model reading
+                        a single character per call (default = False).
+                        See BaseModel.InitStateful.
+        sampler      -- Sampler drawing the next characters (default = None,
+                        using Sampler() without temperature or top-k).
+                        Pass a Sampler with a seeded numpy.random.Generator
+                        to reproduce runs; the seeds are drawn from it as well.
+        grammar      -- Grammar for constrained decoding (default = None, unconstrained).
+                        With LGIGrammar(Utils.chars) characters that cannot lead
+                        to a valid LGI-string are masked before sampling.
+                        See LGIGrammar.Counters for the masked probability mass.
+        indices      -- Flag indicating that model reads character indices
+                        instead of one-hot tensors (default = False).
+                        See BaseModel(encoding=1).
+        profile      -- Flag to profile the stages of the generation (default = False).
+                        See Profiling and GeneratorProfile.
         """
         self.model = model
         self.Utils = Utils
         self.sanitycheck = sanitycheck
+        self.batch_size = batch_size
+        self.stateful = stateful
+        self.sampler = sampler if sampler is not None else Sampler()
+        self.grammar = grammar
+        self.indices = indices
+        self.profile = GeneratorProfile() if profile else None
+        
+    def Profiling(self,enable=True):
+        """
+        Method switches the profiling on or off. The profile applies
+        to the generation started afterwards.
+        Input:
+        enable -- Flag to profile (default = True).
+        Return:
+        Instance of GeneratorProfile, or None when switched off.
+        """
+        if not enable:
+            self.profile = None
+        elif self.profile is None:
+            self.profile = GeneratorProfile()
+        return self.profile
+        
+    def Clone(self,model):
+        """
+        Method creates a generator with the same settings for another
+        model, e.g. a copy of the model used in a background thread.
+        The clone has its own sampler, seeded from the sampler of
+        this generator, and its own grammar counters.
+        Input:
+        model -- Model of the clone.
+        Return:
+        Instance of Generator.
+        """
+        sampler = Sampler(self.sampler.temperature,self.sampler.topk,np.random.default_rng(self.sampler.rng.integers(2**63)))
+        grammar = LGIGrammar(self.grammar.chars) if self.grammar is not None else None
+        return Generator(model,self.Utils,self.sanitycheck,self.batch_size,self.stateful,sampler,grammar,self.indices,self.profile is not None)
         
     def Sample(self,preds):
         """
         Method samples an index from the probability array.
         Input:
-        preds -- Prediction array.
+        preds -- Prediction array, or matrix with one row per sequence.
         Return:
-        Randomly sampled index.
-        """
-        # sampling an index from a probability array
-        preds = np.asarray(preds).astype('float64')
-        preds = np.log(preds)
-        exp_preds = np.exp(preds)
-        preds = exp_preds / np.sum(exp_preds)
-        probas = np.random.multinomial(1, preds, 1)
-        c = np.argmax(probas)
-        return c
+        Randomly sampled index, or array with one index per row.
+        """
+        return self.sampler.Sample(preds)
         
-    def DoSmiles(self,seedstring,maxlen=40,smi=""):
+    def Seed(self):
         """
-        Method generates a SMILES using the model.
-        Input:
-        seedstring -- Seed.
-        maxlen     -- Maximum length (default = 40).
-        smi        -- Currently known SMILES String.
-                      New characters will be added.
+        Method selects a random seed from the text corpus.
+        The seed is the window of maxlen characters ending
+        with a line break, so that the model starts a new entry.
         Return:
-        Updated SMILES String.
+        Seed string of length maxlen.
         """
-        model,Utils = self.model,self.Utils
-        while (True):
-            x = zeros((1, Utils.maxlen, len(Utils.chars)))
-            for t, char in enumerate(seedstring):
-                x[0, t, Utils.char_indices[char]] = 1.
+        maxlen,text = self.Utils.MaxLen(),self.Utils.Text()
+        start = self.sampler.rng.integers(maxlen, len(text) - 1)
+        end = text.index("\n",start)
+        return text[end-maxlen+1:end+1]
 
-            preds = model.predict(x, verbose=0)[0]
-            next_index = self.Sample(preds)
-            next_char = Utils.indices_char[next_index]
-
-            seedstring = seedstring[1:] + next_char
+    def ResetSlot(self,b):
+        """
+        Method resets the hidden/cell state of a single slot
+        in a stateful model, keeping the other slots unchanged.
+        Input:
+        b -- Index of the slot.
+        """
+        if hasattr(self.model,"ResetSlot"):
+            return self.model.ResetSlot(b)
+        states = [state for layer in self.model.layers if getattr(layer,"stateful",False) for state in layer.states]
+        if len(states) == 0:
+            return
+        from keras import backend as K
+        values = K.batch_get_value(states)
+        for value in values:
+            value[b] = 0.
+        K.batch_set_value(list(zip(states,values)))
 
-            if next_char == "\n":
-                return smi,seedstring
-            smi += next_char
-            if len(smi) > 120: return None,None # new seed needed        
+    def Sequences(self,ncopies=20,batch_size=None):
+        """
+        Method generates an endless sequence of Strings. The
+        method advances batch_size independent sequences together,
+        running a single forward pass per character over a tensor
+        with shape (batch_size,maxlen,numchars), or (batch_size,maxlen)
+        for a model reading character indices. Finished slots
+        continue on their own output for ncopies Strings and are
+        then refilled with a new seed.
+        A stateful model reads a tensor with shape (batch_size,1,numchars).
+        The seed of a refilled slot is then fed one character per
+        step before the slot starts sampling.
+        Input:
+        ncopies     -- Number of copies for every random seed (default = 20).
+        batch_size  -- Number of parallel sequences (default = None, using
+                       the batch size of the generator).
+        Return:
+        Iterator over generated Strings.
+        """
+        model,Utils = self.model,self.Utils
+        if batch_size is None:
+            batch_size = self.batch_size
+        if self.stateful and batch_size != self.batch_size:
+            raise ValueError("Stateful model requires batch size %s"%(self.batch_size))
+        maxlen,numchars = Utils.MaxLen(),Utils.NumChars()
+        onehot = np.eye(numchars,dtype="float32")
+        encode = (lambda w: w) if self.indices else (lambda w: onehot[w])
         
-    def Predict(self,
-                ncollect=1000,
-                ncopies=20,
-                verbose=False,
-                sanitycheck=lambda x: True,
-                standardize=lambda x: x):
+        # Define the windows with character indices for every slot
+        # In stateful mode only the last character is fed to the
+        # model and the seeds are queued in pending.
+        windows = zeros((batch_size,maxlen),dtype="int32")
+        pending = [list() for b in range(batch_size)]
+        smis,copies = [""]*batch_size,[0]*batch_size
+        grammar = self.grammar
+        states = [None]*batch_size
+        profile,clock = self.profile,time.perf_counter
+        def reseed(b):
+            seed = [Utils.char_indices[c] for c in self.Seed()]
+            if self.stateful:
+                self.ResetSlot(b)
+                pending[b] = seed
+            else:
+                windows[b] = seed
+            smis[b],copies[b] = "",ncopies
+            if grammar is not None:
+                states[b] = grammar.State()
+            if profile is not None:
+                profile.Count("seeds")
+        if self.stateful:
+            model.reset_states()
+        for b in range(batch_size):
+            reseed(b)
+        
+        # Run the slots until the consumer stops
+        # The stages are timed only when profiling
+        while True:
+            if profile is not None:
+                t0 = clock()
+            if self.stateful:
+                for b in range(batch_size):
+                    if len(pending[b]) > 0:
+                        windows[b,-1] = pending[b].pop(0)
+                priming = [len(p) > 0 for p in pending]
+                x = encode(windows[:,-1:])
+                if profile is not None:
+                    t1 = clock()
+                preds = model.predict_on_batch(x)
+            else:
+                priming = [False]*batch_size
+                x = encode(windows)
+                if profile is not None:
+                    t1 = clock()
+                preds = model.predict(x,batch_size=batch_size,verbose=0)
+            if profile is not None:
+                t2 = clock()
+            if grammar is not None:
+                preds = grammar.Mask(preds,states,rows=[b for b in range(batch_size) if not priming[b]])
+            if profile is not None:
+                t3 = clock()
+            indices = self.sampler.Sample(preds)
+            windows[:,:-1] = windows[:,1:]
+            windows[:,-1] = indices
+            if profile is not None:
+                profile.Add("encode",t1-t0)
+                profile.Add("predict",t2-t1)
+                if grammar is not None:
+                    profile.Add("mask",t3-t2)
+                profile.Add("sample",clock()-t3)
+                profile.Count("chars",batch_size-sum(priming))
+            
+            for b,next_index in enumerate(indices):
+                if priming[b]:
+                    continue
+                next_char = Utils.indices_char[next_index]
+                if next_char == "\n":
+                    smi,smis[b] = smis[b],""
+                    copies[b] -= 1
+                    if grammar is not None:
+                        states[b] = grammar.State()
+                    if copies[b] == 0:
+                        reseed(b)
+                    if profile is not None:
+                        profile.Count("strings")
+                    yield smi
+                else:
+                    smis[b] += next_char
+                    if grammar is not None:
+                        grammar.Push(states[b],next_char)
+                    if len(smis[b]) > 120: # new seed needed
+                        reseed(b)
+                        if profile is not None:
+                            profile.Count("overflows")
+        
+    def Stream(self,
+               ncollect=None,
+               ncopies=20,
+               verbose=False,
+               sanitycheck=lambda x: True,
+               standardize=lambda x: x,
+               batch_size=None,
+               index=None,
+               unique=False):
         """
-        Class Predict generates SMILES.
+        Method generates an iterator over accepted Strings. Strings
+        are yielded as soon as they pass the sanity check, so that the
+        consumer can write or analyze them while the generation runs.
         Input:
-        ncollect    -- Number of SMILES to collect (default = 1,000).
+        ncollect    -- Number of Strings to collect (default = None, endless).
         ncopies     -- Number of copies for every random seed (default = 20).
         verbose     -- Flag for verbose mode (default = False).
-        sanitycheck -- Method to check generated Strings for
-                       validity (default = 'lambda x: True', accepting all).
+        sanitycheck -- Method to check generated Strings for validity
+                       (default = 'lambda x: True', accepting all).
+                       None uses the sanity check of the generator.
         standardize -- Method to standardize the molecule upon completion 
                        (default = lambda x: x, keeping unchanged).
+        batch_size  -- Number of sequences generated in parallel
+                       (default = None, using the batch size of the generator).
+        index       -- Instance of GraphIndex updated with the accepted strings
+                       to count unique and novel graphs (default = None).
+        unique      -- Flag to skip graphs generated before according to
+                       the index (default = False).
+        Return:
+        Iterator over standardized Strings.
         """
-        model,maxlen = self.model,self.Utils.MaxLen()
-        text = self.Utils.Text()
+        if sanitycheck is None:
+            sanitycheck = self.sanitycheck
         nsmi = 0
-        mols = list()
         good,bad = 0,0
         starttime = datetime.now()
+        profile,clock = self.profile,time.perf_counter
         
-        # Run as long as we have too few SMILES on the list
-        while len(mols)<ncollect:
-            start = random.randint(maxlen, len(text) - 1)
-            end = text.index("\n",start)
-            seedstring= text[end-maxlen+1:end+1]
-
-            # Run the number of copies on this seed
-            for n in range(ncopies):
-                smi,seedstring = self.DoSmiles(seedstring)
-                if smi == None:
-                    if seedstring == None:
-                        break; # new seed needed
+        # Run as long as we have too few SMILES
+        for smi in self.Sequences(ncopies=ncopies,batch_size=batch_size):
+            if ncollect is not None and nsmi >= ncollect:
+                break
 
-                # Decode to molecule and check if valid
-                keep = True
-                if sanitycheck is not None:
-                    keep = sanitycheck(smi)
-                else:
-                    keep = self.sanitycheck(smi)
-                if keep:
-                    # Count the molecule as passed 
-                    good += 1
-                    # Append the standardized SMILES
-                    mols.append(standardize(smi))
-                    nsmi += 1
-                    if verbose:
-                        print(nsmi,"Rate G/B = %s/%s"%(good,bad),smi)
+            # Decode to molecule and check if valid
+            if profile is not None:
+                t0 = clock()
+            keep = sanitycheck(smi)
+            if profile is not None:
+                profile.Add("sanitycheck",clock()-t0)
+                profile.Count("accepted" if keep else "rejected")
+            if keep:
+                # Count the molecule as passed 
+                good += 1
+                
+                # Skip duplicates
+                if index is not None:
+                    if profile is not None:
+                        t0 = clock()
+                    status = index.Update(smi)
+                    if profile is not None:
+                        profile.Add("index",clock()-t0)
+                    if unique and status is not None and not status[0]:
+                        if profile is not None:
+                            profile.Count("duplicates")
+                        continue
+                        
+                # Yield the standardized SMILES
+                nsmi += 1
+                if verbose and index is not None:
+                    counters = index.Counters()
+                    print(nsmi,"Rate G/B = %s/%s U/N = %s/%s"%(good,bad,counters["unique"],counters["novel"]),smi)
+                elif verbose:
+                    print(nsmi,"Rate G/B = %s/%s"%(good,bad),smi)
+                if profile is not None:
+                    t0 = clock()
+                standardized = standardize(smi)
+                if profile is not None:
+                    profile.Add("standardize",clock()-t0)
+                yield standardized
                     
-                    # Stop on completion
-                    if len(mols) == ncollect:
-                        break
-                else: 
-                    bad += 1
+                # Stop on completion
+                if nsmi == ncollect:
+                    break
+            else: 
+                bad += 1
                     
         # Compute the elapsed time and print
         if verbose:
             diff = datetime.now()-starttime
             diff_in_seconds = diff.days*24*60*60 + diff.seconds
             print("Generation time: %s seconds"%(diff_in_seconds))
+            if index is not None:
+                counters = index.Counters()
+                print("Unique: %s (%.4f) Novel: %s (%.4f)"%(counters["unique"],counters["unique_rate"],counters["novel"],counters["novel_rate"]))
+        
+    def Predict(self,
+                ncollect=1000,
+                ncopies=20,
+                verbose=False,
+                sanitycheck=lambda x: True,
+                standardize=lambda x: x,
+                batch_size=None,
+                index=None,
+                unique=False,
+                report=False):
+        """
+        Class Predict generates SMILES.
+        Input:
+        ncollect    -- Number of SMILES to collect (default = 1,000).
+        ncopies     -- Number of copies for every random seed (default = 20).
+        verbose     -- Flag for verbose mode (default = False).
+        sanitycheck -- Method to check generated Strings for
+                       validity (default = 'lambda x: True', accepting all).
+        standardize -- Method to standardize the molecule upon completion 
+                       (default = lambda x: x, keeping unchanged).
+        batch_size  -- Number of sequences generated in parallel
+                       (default = None, using the batch size of the generator).
+        index       -- Instance of GraphIndex updated with the accepted strings
+                       to count unique and novel graphs (default = None).
+        unique      -- Flag to skip graphs generated before according to
+                       the index (default = False).
+        report      -- Flag to profile the call and return the report of
+                       GeneratorProfile as well (default = False).
+        Return:
+        List with ncollect Strings. See Stream for an iterator.
+        With report, a tuple with the list and the report.
+        """
+        generate = lambda: list(self.Stream(ncollect,ncopies,verbose,sanitycheck,standardize,batch_size,index,unique))
+        if report:
+            return self.Profiled(generate)
+        return generate()
         
-        # Done
-        return mols     
+    def Profiled(self,method):
+        """
+        Method runs a method with a new profile. The profile is added to the
+        profile of the generator, if profiling is switched on.
+        Input:
+        method -- Method without arguments.
+        Return:
+        Tuple with the result of the method and the report of the profile.
+        """
+        saved,self.profile = self.profile,GeneratorProfile()
+        try:
+            return method(),self.profile.Report()
+        finally:
+            if saved is not None:
+                saved.Merge(self.profile)
+            self.profile = saved
 
-    def PercentValid(self,ncollect=180,ncopies=5,distmethod=None,verbose=False):
+    def PercentValid(self,ncollect=180,ncopies=5,distmethod=None,verbose=False,test=None,report=False):
         """
         Method validates the generation rate of valid strings.
         Input:
@@ -324,16 +507,44 @@ class Generator:
         ncopies     -- Number of random copies to generate (default = 5).
         distmethod  -- 
         verbose     -- Flag for verbose mode (default = False).
+        test        -- Instance of SequentialTest updated with every generated
+                       string (default = None, generating ncollect strings).
+                       Generation stops as soon as the test decides, or after
+                       ncollect strings. See SampleSize.SequentialTest.
+        report      -- Flag to profile the call and return the report of
+                       GeneratorProfile as well (default = False).
+        The seconds spent on generation and validation are stored in timings.
+        Return:
+        Ratio of valid strings and histogram, and the report with report.
         """
-        # Call the parent class to generate and accept all
-        # We accept all with True because we want to measure
-        mols = self.Predict(ncollect=ncollect,ncopies=ncopies,sanitycheck=lambda x: True)
+        if report:
+            (ratio,H),profile = self.Profiled(lambda: self.PercentValid(ncollect,ncopies,distmethod,verbose,test))
+            return ratio,H,profile
+        start,validation = time.perf_counter(),0.
+        mols,valid = list(),list()
+        for smi in self.Sequences(ncopies=ncopies):
+            # Validate every string until ncollect strings, or until the test decides
+            mols.append(smi)
+            checked = time.perf_counter()
+            keep = self.sanitycheck(smi)
+            validation += time.perf_counter()-checked
+            if self.profile is not None:
+                self.profile.Add("sanitycheck",time.perf_counter()-checked)
+                self.profile.Count("accepted" if keep else "rejected")
+            if keep:
+                valid.append(smi)
+            if test is not None and test.Update(keep) != 0 or len(mols) >= ncollect:
+                break
+        if self.profile is not None:
+            self.profile.Count("valid",len(valid))
+        self.timings = {"generation_seconds":time.perf_counter()-start-validation,"validation_seconds":validation}
         num_gen = float(len(mols))
-        # Filter the valid ones using our real measure
-        valid = [smi for smi in mols if self.sanitycheck(smi)]
         num_valid = float(len(valid))
         ratio = num_valid/num_gen
-        print("Validity: NumGen=%s NumValid=%s Ratio=%.4f"%(num_gen,num_valid,ratio))
+        if test is None:
+            print("Validity: NumGen=%s NumValid=%s Ratio=%.4f"%(num_gen,num_valid,ratio))
+        else:
+            print("Validity: NumGen=%s NumValid=%s Ratio=%.4f Decision=%s"%(num_gen,num_valid,ratio,test.Decision()))
         
         # Compute a histogram
         H = None
@@ -349,8 +560,134 @@ import unittest
 class GeneratorTest(unittest.TestCase):
     """ Method checks GeneratorTest for correct return values """
     
+    class UniformModel:
+        """ Model returning a uniform distribution with a preference for line breaks """
+        
+        def __init__(self,numchars):
+            self.numchars = numchars
+            self.calls = 0
+            
+        def predict(self,x,batch_size=None,verbose=0):
+            self.calls += 1
+            preds = np.ones((len(x),self.numchars))
+            preds[:,-1] = 4.0
+            return preds/preds.sum(axis=1,keepdims=True)
+    
+    class IndexModel(UniformModel):
+        """ Variant reading character indices """
+        
+        def predict(self,x,batch_size=None,verbose=0):
+            assert x.ndim == 2
+            return GeneratorTest.UniformModel.predict(self,x)
+    
+    class StatefulUniformModel(UniformModel):
+        """ Stateful variant reading a single character per call """
+        
+        layers = []
+        
+        def predict_on_batch(self,x):
+            assert x.shape[1] == 1
+            return self.predict(x)
+        
+        def reset_states(self):
+            pass
+    
     def setUp(self):
-        pass
+        from lgi_generative_model_utils import DataUtils
+        self.Utils = DataUtils(maxlen=12,step=3)
+        self.Utils.Prepare(["ABBBBA","ABBC(A)A","B1BBBBB1","AC1BC(A)B1"]*10)
+        self.model = self.UniformModel(self.Utils.NumChars())
+        
+    def test_PredictBatch(self):
+        """ Method checks that batched generation returns the requested number of Strings """
+        gen = Generator(self.model,self.Utils)
+        mols = gen.Predict(ncollect=50,batch_size=8)
+        self.assertEqual(50,len(mols))
+        self.assertTrue(all([set(smi).issubset(set(self.Utils.okchars)) for smi in mols]))
+        self.assertTrue(all(["\n" not in smi for smi in mols]))
+        
+    def test_PredictIndices(self):
+        """ Method checks generation with a model reading character indices """
+        model = self.IndexModel(self.Utils.NumChars())
+        mols = Generator(model,self.Utils,indices=True).Predict(ncollect=10,batch_size=4)
+        self.assertEqual(10,len(mols))
+        
+    def test_Reproducible(self):
+        """ Method checks that seeded samplers reproduce the generated Strings """
+        mols = [Generator(self.model,self.Utils,sampler=Sampler(rng=np.random.default_rng(7))).Predict(ncollect=20,batch_size=4) for _ in range(2)]
+        self.assertListEqual(mols[0],mols[1])
+        
+    def test_PredictConstrained(self):
+        """ Method checks that constrained decoding generates valid Strings only """
+        from lgi_valid_graph import GraphValidator
+        gen = Generator(self.model,self.Utils,grammar=LGIGrammar(self.Utils.chars))
+        mols = gen.Predict(ncollect=10,batch_size=8)
+        self.assertTrue(all([GraphValidator.IsValid(smi) for smi in mols]))
+        self.assertGreater(gen.grammar.Counters()["mean_masked"],0)
+        
+    def test_PredictStateful(self):
+        """ Method checks generation with a stateful model """
+        model = self.StatefulUniformModel(self.Utils.NumChars())
+        gen = Generator(model,self.Utils,batch_size=4,stateful=True)
+        mols = gen.Predict(ncollect=20)
+        self.assertEqual(20,len(mols))
+        self.assertRaises(ValueError,lambda: gen.Predict(ncollect=1,batch_size=2))
+        
+    def test_PercentValidSequential(self):
+        """ Method checks that the sequential test stops early for a bad model """
+        from lgi_valid_graph import GraphValidator
+        from samplesize import SampleSize
+        gen = Generator(self.model,self.Utils,sanitycheck=GraphValidator.IsValid,batch_size=8)
+        test = SampleSize.SequentialTest(.95,300)
+        ratio,H = gen.PercentValid(ncollect=300,test=test)
+        self.assertEqual(test.Decision(),-1)
+        self.assertLess(test.n,50)
+        self.assertAlmostEqual(ratio,test.Ratio())
+        
+    def test_PredictUnique(self):
+        """ Method checks that duplicates are skipped and novel graphs are counted """
+        from lgi_index import GraphIndex,Key
+        index = GraphIndex().Build(self.Utils.Text().split("\n"),workers=1)
+        gen = Generator(self.model,self.Utils,grammar=LGIGrammar(self.Utils.chars))
+        mols = gen.Predict(ncollect=4,batch_size=8,index=index,unique=True)
+        keys = [key for key in map(Key,mols) if key is not None]
+        counters = index.Counters()
+        self.assertGreater(len(keys),0)
+        self.assertEqual(len(keys),len(set(keys)))
+        self.assertEqual(counters["unique"],len(keys))
+        self.assertLessEqual(counters["novel"],counters["unique"])
+        
+    def test_Profile(self):
+        """ Method checks the profile of the generation stages """
+        from lgi_valid_graph import GraphValidator
+        gen = Generator(self.model,self.Utils,grammar=LGIGrammar(self.Utils.chars),batch_size=4)
+        mols,report = gen.Predict(ncollect=5,sanitycheck=GraphValidator.IsValid,report=True)
+        self.assertIsNone(gen.profile)
+        self.assertEqual(report["accepted"],5)
+        self.assertEqual(report["model_calls"],report["stages"]["predict"]["calls"])
+        self.assertEqual(report["chars"],4*report["model_calls"])
+        self.assertGreaterEqual(report["seeds"],4)
+        self.assertTrue(set(["encode","predict","mask","sample","sanitycheck","standardize"]).issubset(report["stages"]))
+        profile = gen.Profiling()
+        ratio,H,report = gen.PercentValid(ncollect=20,report=True)
+        self.assertEqual(report["valid"],int(round(20*ratio)))
+        self.assertEqual(profile.Report()["valid"],report["valid"])
+        self.assertIsNone(gen.Profiling(False))
+        
+        # The counters follow the real validation
+        gen = Generator(self.model,self.Utils,sanitycheck=GraphValidator.IsValid,batch_size=4)
+        ratio,H,report = gen.PercentValid(ncollect=40,report=True)
+        self.assertLess(ratio,1.)
+        self.assertEqual(report["accepted"],report["valid"])
+        self.assertEqual(report["rejected"],40-report["valid"])
+        self.assertAlmostEqual(report["rejection_rate"],1.-ratio)
+
+    def test_Stream(self):
+        """ Method checks that the stream yields the Strings of Predict """
+        mols = Generator(self.model,self.Utils,sampler=Sampler(rng=np.random.default_rng(3))).Predict(ncollect=20,batch_size=4)
+        stream = Generator(self.model,self.Utils,sampler=Sampler(rng=np.random.default_rng(3))).Stream(batch_size=4)
+        self.assertListEqual(mols,[next(stream) for _ in range(20)])
+        stream.close()
     
 class ValidationGeneratorTest(unittest.TestCase):
     """ Methods checks ValidationGenerator for correct return values """
@@ -0,0 +1,325 @@
+"""
+Copyright 2019 Ruud van Deursen, Firmenich SA.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+File lgi_grammar.py defines the grammar used for constrained
+decoding of LGI-strings. A parser state is kept for every
+generated sequence and the probability of characters that
+cannot lead to a valid LGI-string is set to zero before sampling.
+"""
+
+import numpy
+
+class LGIState:
+    """
+    Class LGIState keeps the parser state of a single partially
+    generated LGI-string: the open branches, the open ring-closure
+    labels and the remaining degree of every vertex.
+    """
+    
+    def __init__(self):
+        """ Constructor of LGIState """
+        super(LGIState,self).__init__()
+        self.remaining = []
+        self.bonded = set()
+        self.stack = []
+        self.rings = {}
+        self.prev = -1
+        self.last = None # Type of the last token
+        self.label = ""  # Partial %-label
+        
+    def Stuck(self,remaining,stack,nrings):
+        """
+        Method checks if open rings can no longer be closed, i.e.
+        if no vertex that can still receive an edge is left.
+        Input:
+        remaining -- Remaining degree of the current vertex.
+        stack     -- Branch points left on the stack.
+        nrings    -- Number of open ring labels.
+        Return:
+        True if the state cannot be completed.
+        """
+        if nrings == 0 or remaining > 0:
+            return False
+        return not any([self.remaining[v] > 0 for v in stack])
+        
+    def Ring(self,label):
+        """
+        Method checks if the current vertex can take a ring-closure label.
+        Input:
+        label -- Ring-closure label.
+        Return:
+        True if the label opens or closes a ring at the current vertex.
+        """
+        prev = self.prev
+        nrings = len(self.rings)+1
+        if label in self.rings:
+            other = self.rings[label]
+            edge = (other,prev) if other < prev else (prev,other)
+            if other == prev or edge in self.bonded:
+                return False
+            nrings -= 2
+        return not self.Stuck(self.remaining[prev]-1,self.stack,nrings)
+        
+    def Allowed(self,char,degree):
+        """
+        Method checks if a character can follow the current state.
+        Input:
+        char   -- Next character.
+        degree -- Dictionary with the degree encoded by the vertex characters.
+        Return:
+        True if the character can lead to a valid LGI-string.
+        """
+        last,prev = self.last,self.prev
+        if last == "invalid":
+            return True
+        if last is None:
+            return char in degree
+        
+        # Complete a %-label with two digits
+        if last == "percent":
+            if not char.isdigit():
+                return False
+            if len(self.label) == 0:
+                return char != "0" and any([self.Ring(char+digit) for digit in "0123456789"])
+            return self.Ring(self.label+char)
+        
+        remaining = self.remaining[prev]
+        if char in degree:
+            # Leaving a vertex requires that all its edges are present
+            if remaining < 1 or (last != "open" and remaining != 1):
+                return False
+            if degree[char] > 1 or len(self.rings) == 0:
+                return True
+            stack = self.stack
+            if last == "open":
+                self.remaining[prev] -= 1
+                stuck = self.Stuck(0,stack,len(self.rings))
+                self.remaining[prev] += 1
+                return not stuck
+            return not self.Stuck(0,stack,len(self.rings))
+        if last == "open":
+            return False
+        if char == "(":
+            return remaining >= 1
+        if char == ")":
+            if len(self.stack) == 0 or remaining != 0:
+                return False
+            top = self.stack[-1]
+            return not self.Stuck(self.remaining[top],self.stack[:-1],len(self.rings))
+        if char == "%":
+            return remaining >= 1 and (self.Ring("%") or any([self.Ring(label) for label in self.rings if len(label) == 2]))
+        if char.isdigit():
+            return remaining >= 1 and self.Ring(char)
+        if char == "\n":
+            return remaining == 0 and len(self.stack) == 0 and len(self.rings) == 0
+        return False
+    
+    def Push(self,char,degree):
+        """
+        Method updates the state with the next character.
+        If the character is not allowed the state becomes
+        invalid and no longer constrains the sequence.
+        Input:
+        char   -- Next character.
+        degree -- Dictionary with the degree encoded by the vertex characters.
+        """
+        if self.last == "invalid":
+            return
+        if not self.Allowed(char,degree):
+            self.last = "invalid"
+            return
+        prev = self.prev
+        if self.last == "percent":
+            self.label += char
+            if len(self.label) == 2:
+                self.Close(self.label)
+                self.label = ""
+        elif char in degree:
+            vertex = len(self.remaining)
+            self.remaining.append(degree[char])
+            if prev >= 0:
+                self.remaining[prev] -= 1
+                self.remaining[vertex] -= 1
+                self.bonded.add((prev,vertex))
+            self.prev,self.last = vertex,"vertex"
+        elif char == "(":
+            self.stack.append(prev)
+            self.last = "open"
+        elif char == ")":
+            self.prev,self.last = self.stack.pop(),"close"
+        elif char == "%":
+            self.last = "percent"
+        elif char.isdigit():
+            self.Close(char)
+            
+    def Close(self,label):
+        """
+        Method opens or closes a ring-closure label at the current vertex.
+        The edge is counted at the opening vertex when the label opens.
+        Input:
+        label -- Ring-closure label.
+        """
+        prev = self.prev
+        if label in self.rings:
+            other = self.rings.pop(label)
+            self.bonded.add((other,prev) if other < prev else (prev,other))
+        else:
+            self.rings[label] = prev
+        self.remaining[prev] -= 1
+        self.last = "ring"
+        
+
+class LGIGrammar:
+    """
+    Class LGIGrammar masks the characters that cannot lead
+    to a valid LGI-string and counts the masked probability mass.
+    """
+    
+    def __init__(self,chars):
+        """
+        Constructor of LGIGrammar.
+        Input:
+        chars -- List with the characters of the vocabulary, in the
+                 order of the model output (e.g. DataUtils.chars).
+        """
+        super(LGIGrammar,self).__init__()
+        self.chars = list(chars)
+        self.degree = dict([(char,idx+1) for idx,char in enumerate(["A","B","C","D","E","F"])])
+        self.Reset()
+        
+    def Reset(self):
+        """
+        Method resets the counters.
+        Return:
+        Updated instance of LGIGrammar.
+        """
+        self.steps = 0
+        self.masked = 0.
+        self.fallbacks = 0
+        self.invalid = 0
+        return self
+        
+    def State(self):
+        """
+        Return:
+        New state for an empty sequence.
+        """
+        return LGIState()
+    
+    def Push(self,state,char):
+        """
+        Method updates the state with the next character.
+        Input:
+        state -- State of the sequence.
+        char  -- Next character.
+        """
+        state.Push(char,self.degree)
+        if state.last == "invalid":
+            self.invalid += 1
+    
+    def Mask(self,preds,states,rows=None):
+        """
+        Method sets the probability of disallowed characters to zero.
+        Rows without any allowed probability mass are left unchanged
+        and counted as fallback.
+        Input:
+        preds  -- Probability matrix of shape (batch,vocab).
+        states -- List with the state of every row.
+        rows   -- Rows to mask (default = None, masking all rows).
+        Return:
+        Masked probability matrix.
+        """
+        preds = numpy.array(preds,dtype="float64")
+        chars,degree = self.chars,self.degree
+        if rows is None:
+            rows = range(len(states))
+        for b in rows:
+            allowed = [states[b].Allowed(char,degree) for char in chars]
+            total = preds[b].sum()
+            kept = preds[b]*allowed
+            mass = kept.sum()
+            self.steps += 1
+            if mass > 0:
+                self.masked += 1.0-mass/total
+                preds[b] = kept
+            else:
+                self.fallbacks += 1
+        return preds
+    
+    def Counters(self):
+        """
+        Return:
+        Dictionary with the number of masked steps, the total and
+        mean masked probability mass, the number of fallbacks and
+        the number of sequences that left the grammar.
+        """
+        mean = self.masked/self.steps if self.steps > 0 else 0.
+        return {"steps":self.steps,"masked":self.masked,"mean_masked":mean,
+                "fallbacks":self.fallbacks,"invalid":self.invalid}
+    
+
+import unittest
+class LGIGrammarTest(unittest.TestCase):
+    """
+    Test class evaluating the constrained decoding.
+    """
+    
+    def setUp(self):
+        """ Setup """
+        self.chars = list("ABCDEF()%123456789\n")
+        self.grammar = LGIGrammar(self.chars)
+        
+    def Allowed(self,prefix):
+        state = self.grammar.State()
+        for char in prefix:
+            self.grammar.Push(state,char)
+        return "".join([c for c in self.chars if state.Allowed(c,self.grammar.degree)])
+        
+    def test_Allowed(self):
+        """ Method tests the allowed characters after a prefix """
+        self.assertEqual("ABCDEF",self.Allowed(""))
+        self.assertEqual("ABCDEF(",self.Allowed("A"))
+        self.assertEqual("\n",self.Allowed("AA"))
+        self.assertEqual("(%123456789",self.Allowed("AC"))
+        self.assertEqual("ABCDEF",self.Allowed("AC("))
+        self.assertEqual("BCDEF(",self.Allowed("B1B"))
+        self.assertEqual("BCDEF(1",self.Allowed("B1BB"))
+        self.assertEqual("123456789",self.Allowed("AC%"))
+        self.assertEqual("BCDEF(",self.Allowed("AC%12"))
+        self.assertEqual("ABCDEF(%23456789",self.Allowed("AD1(B"))
+        
+    def test_Sampled(self):
+        """ Method tests that random constrained sequences are valid LGI-strings """
+        from lgi_reader import lgireader
+        rng = numpy.random.default_rng(5)
+        grammar = LGIGrammar(self.chars)
+        for _ in range(100):
+            state,lgi = grammar.State(),""
+            while len(lgi) < 120:
+                preds = grammar.Mask(numpy.ones((1,len(self.chars))),[state])
+                char = self.chars[rng.choice(len(self.chars),p=preds[0]/preds[0].sum())]
+                if char == "\n":
+                    break
+                grammar.Push(state,char)
+                lgi += char
+            if len(lgi) < 120:
+                self.assertIsNotNone(lgireader.Read(lgi),lgi)
+        self.assertEqual(0,grammar.Counters()["fallbacks"])
+        self.assertGreater(grammar.Counters()["mean_masked"],0)
+        
+# Runner for tests
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,298 @@
+"""
+Copyright 2019 Ruud van Deursen, Firmenich SA.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+File lgi_index.py defines an index of canonical graph hashes to
+measure the uniqueness and novelty of generated lgi-strings. The
+index is built once from the training graphs and updated with the
+generated graphs. Keys are hashes of the canonical lgi-strings, so
+isomorphic graphs share a key independent of the traversal.
+"""
+
+from lgi_reader import lgireader
+from lgi_translator import LGI
+import concurrent.futures
+import hashlib
+import math
+import numpy as np
+import unittest
+
+"""
+Writer of the canonical strings.
+"""
+canonical_writer = LGI()
+
+def Key(lgi):
+    """
+    Method computes the key of a graph.
+    Input:
+    lgi -- lgi-string.
+    Return:
+    Integer with the 128-bit hash of the canonical string,
+    or None if the lgi-string is invalid.
+    """
+    G = lgireader.Read(lgi)
+    if G is None:
+        return None
+    canonical = canonical_writer.Write(*G)
+    if canonical is None:
+        return None
+    return int.from_bytes(hashlib.blake2b(canonical.encode(),digest_size=16).digest(),"little")
+
+def Keys(chunk):
+    """
+    Method computes the keys of a chunk in a worker process.
+    Input:
+    chunk -- List with lgi-strings.
+    Return:
+    List with keys, skipping invalid lgi-strings.
+    """
+    return [key for key in map(Key,chunk) if key is not None]
+
+class KeySet:
+    """
+    Class KeySet stores keys exactly, using the lower 64 bits of every key.
+    """
+    
+    def __init__(self):
+        """ Constructor of KeySet """
+        super(KeySet,self).__init__()
+        self.keys = set()
+        
+    def Add(self,key):
+        """
+        Method adds a key.
+        Input:
+        key -- Key of a graph.
+        Return:
+        True if the key was not in the set.
+        """
+        key &= 0xffffffffffffffff
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        return True
+        
+    def Contains(self,key):
+        """
+        Input:
+        key -- Key of a graph.
+        Return:
+        True if the key is in the set.
+        """
+        return key&0xffffffffffffffff in self.keys
+        
+    def __len__(self):
+        return len(self.keys)
+        
+class BloomFilter:
+    """
+    Class BloomFilter stores keys approximately in a bit array with
+    a fixed size. Contains can return a false positive with a rate
+    close to error once capacity keys are added, but never a false
+    negative.
+    """
+    
+    def __init__(self,capacity=10000000,error=0.001):
+        """
+        Constructor of BloomFilter.
+        Input:
+        capacity -- Expected number of keys (default = 10,000,000).
+        error    -- False-positive rate at capacity (default = 0.001).
+        """
+        super(BloomFilter,self).__init__()
+        self.nbits = max(64,int(math.ceil(-capacity*math.log(error)/math.log(2)**2)))
+        self.nhashes = max(1,int(round(self.nbits/capacity*math.log(2))))
+        self.bits = np.zeros((self.nbits+7)//8,dtype=np.uint8)
+        self.count = 0
+        
+    def Positions(self,key):
+        """
+        Method computes the bit positions of a key by double hashing
+        with the lower and upper 64 bits of the key.
+        Input:
+        key -- Key of a graph.
+        Return:
+        List with bit positions.
+        """
+        h1,h2 = key&0xffffffffffffffff,(key>>64)|1
+        return [(h1+idx*h2)%self.nbits for idx in range(self.nhashes)]
+        
+    def Add(self,key):
+        """
+        Method adds a key.
+        Input:
+        key -- Key of a graph.
+        Return:
+        True if the key was not in the filter.
+        """
+        new = False
+        for pos in self.Positions(key):
+            byte,mask = pos>>3,1<<(pos&7)
+            if not self.bits[byte]&mask:
+                self.bits[byte] |= mask
+                new = True
+        self.count += new
+        return new
+        
+    def Contains(self,key):
+        """
+        Input:
+        key -- Key of a graph.
+        Return:
+        True if the key is probably in the filter.
+        """
+        return all(self.bits[pos>>3]&(1<<(pos&7)) for pos in self.Positions(key))
+        
+    def __len__(self):
+        return self.count
+
+class GraphIndex:
+    """
+    Class GraphIndex keeps the keys of the reference graphs, e.g.
+    the training set, and of the generated graphs. A generated graph
+    is unique if its key was not generated before and novel if its
+    key is not in the reference set. In approximate mode the keys are
+    stored in Bloom filters with a bounded memory, e.g. for runs with
+    millions of samples, at the cost of rare false duplicates.
+    """
+    
+    def __init__(self,approximate=False,capacity=10000000,error=0.001):
+        """
+        Constructor of GraphIndex.
+        Input:
+        approximate -- Flag to store keys in Bloom filters (default = False).
+        capacity    -- Expected number of keys per filter in approximate mode
+                       (default = 10,000,000).
+        error       -- False-positive rate at capacity in approximate mode
+                       (default = 0.001).
+        """
+        super(GraphIndex,self).__init__()
+        self.approximate = approximate
+        self.capacity = capacity
+        self.error = error
+        self.reference = self.NewSet()
+        self.Reset()
+        
+    def NewSet(self):
+        """
+        Return:
+        Empty instance of BloomFilter in approximate mode, otherwise of KeySet.
+        """
+        return BloomFilter(self.capacity,self.error) if self.approximate else KeySet()
+        
+    def Reset(self):
+        """
+        Method clears the generated graphs and counters, keeping the reference graphs.
+        Return:
+        Updated instance of GraphIndex.
+        """
+        self.generated = self.NewSet()
+        self.total,self.unique,self.novel,self.invalid = 0,0,0,0
+        return self
+        
+    def Build(self,strings,workers=None,chunksize=10000):
+        """
+        Method adds reference graphs to the index, e.g.
+        index.Build(Utils.Text().split("\\n")).
+        Input:
+        strings   -- List with lgi-strings.
+        workers   -- Number of worker processes (default = None, using all cores).
+                     The keys are computed in-process if set to 1 or for a
+                     single chunk.
+        chunksize -- Number of strings per chunk (default = 10,000).
+        Return:
+        Updated instance of GraphIndex.
+        """
+        strings = [lgi for lgi in strings if len(lgi) > 0]
+        chunks = [strings[idx:idx+chunksize] for idx in range(0,len(strings),chunksize)]
+        if workers == 1 or len(chunks) <= 1:
+            for keys in map(Keys,chunks):
+                self.AddReference(keys)
+        else:
+            with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+                for keys in pool.map(Keys,chunks):
+                    self.AddReference(keys)
+        return self
+        
+    def AddReference(self,keys):
+        """
+        Method adds keys to the reference set.
+        Input:
+        keys -- List with keys of reference graphs.
+        """
+        for key in keys:
+            self.reference.Add(key)
+        
+    def Update(self,lgi):
+        """
+        Method adds a generated graph to the index.
+        Input:
+        lgi -- Generated lgi-string.
+        Return:
+        Tuple (unique,novel), or None if the lgi-string is invalid.
+        """
+        self.total += 1
+        key = Key(lgi)
+        if key is None:
+            self.invalid += 1
+            return None
+        unique = self.generated.Add(key)
+        novel = unique and not self.reference.Contains(key)
+        self.unique += unique
+        self.novel += novel
+        return unique,novel
+        
+    def Counters(self):
+        """
+        Method returns the counters of the generated graphs.
+        Return:
+        Dictionary with the number of generated, invalid, unique and novel
+        graphs, the size of the reference set and the unique and novel
+        rates relative to the valid graphs.
+        """
+        valid = max(self.total-self.invalid,1)
+        return {"total":self.total,"invalid":self.invalid,"unique":self.unique,"novel":self.novel,
+                "reference":len(self.reference),"unique_rate":self.unique/valid,"novel_rate":self.novel/valid}
+
+class GraphIndexTest(unittest.TestCase):
+    """
+    Unit tests for the graph index.
+    """
+    
+    def test_Exact(self):
+        index = GraphIndex().Build(["ABC1BC1A","B1BBBBB1",""],workers=1)
+        self.assertEqual(index.Counters()["reference"],2)
+        self.assertEqual(index.Update("AC1BC1BA"),(True,False))   # Isomorphic to ABC1BC1A
+        self.assertEqual(index.Update("ABBA"),(True,True))
+        self.assertEqual(index.Update("ABBA"),(False,False))
+        self.assertIsNone(index.Update("A("))
+        counters = index.Counters()
+        self.assertEqual((counters["total"],counters["unique"],counters["novel"],counters["invalid"]),(4,2,1,1))
+        self.assertEqual(index.Reset().Counters()["total"],0)
+        self.assertEqual(index.Update("ABBA"),(True,True))
+        
+    def test_Approximate(self):
+        index = GraphIndex(approximate=True,capacity=1000,error=0.01)
+        self.assertEqual(len(index.reference.bits),(index.reference.nbits+7)//8)
+        index.Build(["ABC1BC1A"],workers=1)
+        self.assertEqual(index.Update("AC1BC1BA"),(True,False))
+        self.assertEqual(index.Update("AC1BC1BA"),(False,False))
+        strings = ["A"+"B"*n+"A" for n in range(60)]
+        self.assertEqual(sum([index.Update(lgi)[0] for lgi in strings]),60)
+        self.assertTrue(all(not index.Update(lgi)[0] for lgi in strings))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,249 @@
+"""
+Copyright 2019 Ruud van Deursen, Firmenich SA.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+File lgi_metrics.py defines a headless logger writing the training
+metrics after every epoch, and an optional renderer plotting the
+log at a throttled rate. The log survives a killed run and can be
+followed from another process.
+"""
+
+from keras.callbacks import Callback
+from datetime import datetime
+import csv
+import json
+import os
+import time
+
+"""
+Columns of the metrics log. Other metrics reported by Keras follow.
+"""
+columns = ["epoch","time","loss","pct_valid","valid_epoch","epoch_seconds","train_seconds","samples",
+           "samples_per_second","generation_seconds","validation_seconds"]
+
+def Read(filename):
+    """
+    Method reads a metrics log.
+    Input:
+    filename -- File with the log, in JSONL or CSV format (by extension).
+    Return:
+    List with a dictionary per epoch.
+    """
+    if not os.path.exists(filename):
+        return list()
+    with open(filename) as f:
+        if not filename.endswith(".csv"):
+            return [json.loads(line) for line in f if line.strip()]
+        rows = list()
+        for row in csv.DictReader(f):
+            for key,value in row.items():
+                try:
+                    row[key] = float(value) if value != "" else None
+                except ValueError:
+                    pass
+            rows.append(row)
+        return rows
+
+class MetricsLogger(Callback):
+    """
+    Class MetricsLogger appends a row per epoch to a JSONL or CSV file,
+    with the loss, the rate of valid strings, the wall time of the epoch,
+    the training samples per second and the seconds spent on generation
+    and validation. The training time runs from the start of the epoch
+    to the end of its last batch, so that the callbacks at the end of
+    the epoch are excluded from the samples per second. Add the logger after the OnlineGenerator in the list
+    of callbacks, so that the rate of the epoch is available.
+    """
+    
+    def __init__(self,filename,online=None,append=False):
+        """
+        Constructor of MetricsLogger.
+        Input:
+        filename -- File for the log. Files ending with .csv are
+                    written as CSV, others as JSONL.
+        online   -- OnlineGenerator measuring the rate of valid strings (default = None).
+        append   -- Flag to append to an existing log (default = False).
+        """
+        super(MetricsLogger,self).__init__()
+        self.filename = filename
+        self.online = online
+        self.append = append
+        self.csv = filename.endswith(".csv")
+        self.columns = None
+        
+    def on_train_begin(self,logs=None):
+        if not self.append:
+            open(self.filename,"w").close()
+        self.columns = None
+        
+    def on_epoch_begin(self,epoch,logs=None):
+        self.start = self.end = time.perf_counter()
+        self.samples = 0
+        
+    def on_batch_end(self,batch,logs=None):
+        self.samples += (logs or {}).get("size",0)
+        self.end = time.perf_counter()
+        
+    def on_epoch_end(self,epoch,logs=None):
+        seconds = self.end-self.start
+        row = {"epoch":epoch+1,"time":datetime.now().isoformat(timespec="seconds"),
+               "epoch_seconds":time.perf_counter()-self.start,"train_seconds":seconds,
+               "samples":self.samples,"samples_per_second":self.samples/seconds if seconds > 0 else None}
+        for key,value in (logs or {}).items():
+            if key not in ["batch","size"]:
+                row[key] = float(value)
+        online = self.online
+        if online is not None and len(getattr(online,"pct_hist",[])) > 0:
+            row.update({"pct_valid":float(online.pct),"valid_epoch":online.valid_epoch})
+            row.update(online.timings)
+        self.Write(row)
+        
+    def Write(self,row):
+        """
+        Method appends a row to the log and closes the file.
+        Input:
+        row -- Dictionary with the metrics of an epoch.
+        """
+        with open(self.filename,"a",newline="") as f:
+            if not self.csv:
+                f.write(json.dumps(row)+"\n")
+                return
+            if self.columns is None:
+                if f.tell() > 0:
+                    with open(self.filename) as g:
+                        self.columns = next(csv.reader(g))
+                else:
+                    self.columns = columns+sorted(set(row)-set(columns))
+                    csv.writer(f).writerow(self.columns)
+            csv.DictWriter(f,self.columns,restval="",extrasaction="ignore").writerow(row)
+
+class MetricsPlot(Callback):
+    """
+    Class MetricsPlot plots a metrics log, at most once per interval.
+    The plot reads the log only, so that it can be used in a notebook
+    following a run on a server, or as callback after the MetricsLogger.
+    """
+    
+    def __init__(self,filename,interval=60.,keys=["loss","pct_valid","samples_per_second"],output=None):
+        """
+        Constructor of MetricsPlot.
+        Input:
+        filename -- File with the log.
+        interval -- Minimum number of seconds between two plots (default = 60).
+        keys     -- Metrics to plot (default = ['loss','pct_valid','samples_per_second']).
+        output   -- Image file to save the plot to (default = None, showing the plot).
+        """
+        super(MetricsPlot,self).__init__()
+        self.filename = filename
+        self.interval = interval
+        self.keys = keys
+        self.output = output
+        self.last = None
+        
+    def Render(self,force=False):
+        """
+        Method plots the log unless the last plot is more recent than the interval.
+        matplotlib is imported on the first plot.
+        Input:
+        force -- Flag to plot regardless of the interval (default = False).
+        Return:
+        True if plotted.
+        """
+        now = time.perf_counter()
+        if not force and self.last is not None and now-self.last < self.interval:
+            return False
+        self.last = now
+        rows = Read(self.filename)
+        import matplotlib
+        if self.output is not None:
+            matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        fig = plt.figure(figsize=(4*len(self.keys),4))
+        for idx,key in enumerate(self.keys):
+            plt.subplot(1,len(self.keys),idx+1)
+            points = [(row["epoch"],row[key]) for row in rows if row.get(key) is not None]
+            if len(points) > 0:
+                plt.plot(*zip(*points))
+            plt.xlabel("Epoch")
+            plt.ylabel(key)
+        if self.output is not None:
+            plt.savefig(self.output)
+            plt.close(fig)
+        else:
+            from IPython.display import clear_output
+            clear_output(wait=True)
+            plt.show()
+        return True
+        
+    def on_epoch_end(self,epoch,logs=None):
+        self.Render()
+        
+    def on_train_end(self,logs=None):
+        self.Render(force=True)
+            
+import unittest
+class MetricsLoggerTest(unittest.TestCase):
+    """ Test class for the metrics log in both formats """
+    
+    class FakeOnline:
+        """ OnlineGenerator with results """
+        pct_hist,pct,valid_epoch = [0.5],0.5,1
+        timings = {"generation_seconds":2.0,"validation_seconds":0.5}
+        delay = 0.
+        
+        def on_epoch_end(self,epoch,logs=None):
+            time.sleep(self.delay)
+        
+    def Run(self,filename,append=False,delay=0.):
+        online = self.FakeOnline()
+        online.delay = delay
+        logger = MetricsLogger(filename,online=online,append=append)
+        logger.on_train_begin()
+        for epoch in range(2):
+            logger.on_epoch_begin(epoch)
+            for batch in range(3):
+                logger.on_batch_end(batch,{"size":32,"loss":1.0})
+            online.on_epoch_end(epoch)
+            logger.on_epoch_end(epoch,{"loss":1.0/(epoch+1)})
+            
+    def test_Formats(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as outdir:
+            for ext in ["jsonl","csv"]:
+                filename = os.path.join(outdir,"metrics.%s"%(ext))
+                self.Run(filename)
+                self.Run(filename,append=True)
+                rows = Read(filename)
+                self.assertEqual(len(rows),4)
+                self.assertListEqual([row["epoch"] for row in rows],[1,2,1,2])
+                self.assertEqual(rows[1]["loss"],0.5)
+                self.assertEqual(rows[0]["samples"],96)
+                self.assertEqual(rows[0]["pct_valid"],0.5)
+                self.assertEqual(rows[0]["generation_seconds"],2.0)
+                self.assertGreater(rows[0]["samples_per_second"],0)
+                
+    def test_Throughput(self):
+        """ Method checks that a slow online generator is excluded from the throughput """
+        import tempfile
+        with tempfile.TemporaryDirectory() as outdir:
+            filename = os.path.join(outdir,"metrics.jsonl")
+            self.Run(filename,delay=0.2)
+            for row in Read(filename):
+                self.assertGreaterEqual(row["epoch_seconds"],0.2)
+                self.assertLess(row["train_seconds"],0.1)
+                self.assertGreater(row["samples_per_second"],96/0.1)
+
+if __name__ == "__main__":
+    unittest.main()
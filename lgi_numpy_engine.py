@@ -0,0 +1,701 @@
+"""
+Copyright 2019 Ruud van Deursen, Firmenich SA.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+File lgi_numpy_engine.py defines a NumPy implementation of the
+forward pass of the generative models built by BaseModel. The weights
+are exported from a trained model, or loaded from a npz-file, so that
+graphs can be generated on CPU hosts without TensorFlow or CuDNN.
+The model implements predict, predict_on_batch and reset_states and
+can be used as model in Generator.
+"""
+
+import json
+import numpy as np
+import unittest
+
+def Sigmoid(x):
+    """ Method computes the logistic sigmoid """
+    return 1./(1.+np.exp(-x))
+
+def HardSigmoid(x):
+    """ Method computes the hard sigmoid of Keras """
+    return np.clip(.2*x+.5,0.,1.)
+
+def Softmax(x):
+    """ Method computes the softmax over the last axis """
+    e = np.exp(x-x.max(axis=-1,keepdims=True))
+    return e/e.sum(axis=-1,keepdims=True)
+
+"""
+Activations by their name in the Keras configuration.
+"""
+activations = {"sigmoid":Sigmoid,"hard_sigmoid":HardSigmoid,"tanh":np.tanh,"linear":lambda x: x,"relu":lambda x: np.maximum(x,0.)}
+
+def MergeSum(C,n,merge):
+    """
+    Method sums the concatenated outputs of n minimodels to the width of
+    a single minimodel, pairing the positions as the merge does.
+    Input:
+    C     -- Array with the concatenated outputs in the last axis.
+    n     -- Number of minimodels.
+    merge -- Merge mode 1 summing the minimodels position by position,
+             or 2 reshaping the concatenation to (d,n) as WeightedAverage.
+    Return:
+    Array with the sums.
+    """
+    d = C.shape[-1]//n
+    if merge == 1:
+        return C.reshape(C.shape[:-1]+(n,d)).sum(axis=-2)
+    # A product with ones is much faster than a sum over the short last axis
+    return C.reshape(C.shape[:-1]+(d,n))@np.ones(n,dtype=C.dtype)
+
+def FoldHead(gammas,betas,kernel,bias,merge=0,weights=None):
+    """
+    Method folds the layer normalizations of the minimodels and their merge
+    into a scale and the output layer. With y_i = gamma_i*n_i+beta_i the
+    normalized output of minimodel i, every merge mode is linear in the
+    concatenation of y_i. Concatenated minimodels fold the gammas into the
+    rows of the kernel. The average and WeightedAverage fold the gammas and
+    the weights into a scale of the concatenated n_i, which MergeSum sums to
+    the width of one minimodel, so that the output layer keeps its size.
+    The betas are folded into the bias in both cases.
+    Input:
+    gammas  -- List with the gamma of every LayerNormalization.
+    betas   -- List with the beta of every LayerNormalization.
+    kernel  -- Kernel of the output layer.
+    bias    -- Bias of the output layer.
+    merge   -- Merge mode as in BaseModel (default = 0, concatenated).
+    weights -- Kernel of WeightedAverage with shape (num,1), used with merge 2 (default = None).
+    Return:
+    Tuple with the scale of the concatenated normalized outputs, or None
+    if they are not merged, the folded kernel and the folded bias.
+    """
+    n = len(gammas)
+    kernel,bias = np.asarray(kernel),np.asarray(bias)
+    gamma,beta = np.concatenate(gammas),np.concatenate(betas)
+    if n == 1 or merge not in [1,2]:
+        return None,gamma[:,None]*kernel,bias+beta@kernel
+    weight = np.full(len(gamma),1./n) if merge == 1 else np.tile(np.ravel(weights),len(gammas[0]))
+    return (gamma*weight).astype(gamma.dtype),kernel,bias+MergeSum(beta*weight,n,merge)@kernel
+
+class LSTMCell:
+    """
+    Class LSTMCell defines a LSTM cell with gates in Keras order (i,f,c,o).
+    """
+    
+    def __init__(self,kernel,recurrent_kernel,bias,activation="tanh",recurrent_activation="sigmoid"):
+        """
+        Constructor of LSTMCell.
+        Input:
+        kernel               -- Input weights with shape (input_dim,4*units).
+        recurrent_kernel     -- Recurrent weights with shape (units,4*units).
+        bias                 -- Bias with shape (4*units,).
+        activation           -- Name of the activation (default = 'tanh').
+        recurrent_activation -- Name of the gate activation (default = 'sigmoid').
+        """
+        super(LSTMCell,self).__init__()
+        self.kernel = np.asarray(kernel,dtype="float32")
+        self.recurrent_kernel = np.asarray(recurrent_kernel,dtype="float32")
+        self.bias = np.asarray(bias,dtype="float32")
+        self.units = self.recurrent_kernel.shape[0]
+        self.activation = activations[activation]
+        self.recurrent_activation = activations[recurrent_activation]
+        
+    def Inputs(self,x):
+        """ Method projects the inputs for all time steps at once """
+        return x@self.kernel+self.bias
+        
+    def Zero(self,batch_size):
+        """ Method returns the zero state (h,c) """
+        return [np.zeros((batch_size,self.units),dtype="float32") for _ in range(2)]
+        
+    def Step(self,z,state):
+        """
+        Method advances the cell by one step.
+        Input:
+        z     -- Projected input with shape (batch_size,4*units).
+        state -- List with the hidden and cell state.
+        Return:
+        Output and new state.
+        """
+        h,c = state
+        u = self.units
+        z = z+h@self.recurrent_kernel
+        i = self.recurrent_activation(z[:,:u])
+        f = self.recurrent_activation(z[:,u:2*u])
+        g = self.activation(z[:,2*u:3*u])
+        o = self.recurrent_activation(z[:,3*u:])
+        c = f*c+i*g
+        h = o*self.activation(c)
+        return h,[h,c]
+
+class GRUCell:
+    """
+    Class GRUCell defines a GRU cell with gates in Keras order (z,r,h).
+    With reset_after the reset gate is applied after the recurrent
+    product, as in CuDNNGRU.
+    """
+    
+    def __init__(self,kernel,recurrent_kernel,bias,recurrent_bias,reset_after=False,activation="tanh",recurrent_activation="hard_sigmoid"):
+        """
+        Constructor of GRUCell.
+        Input:
+        kernel               -- Input weights with shape (input_dim,3*units).
+        recurrent_kernel     -- Recurrent weights with shape (units,3*units).
+        bias                 -- Input bias with shape (3*units,).
+        recurrent_bias       -- Recurrent bias with shape (3*units,), zero without reset_after.
+        reset_after          -- Flag to apply the reset gate after the product (default = False).
+        activation           -- Name of the activation (default = 'tanh').
+        recurrent_activation -- Name of the gate activation (default = 'hard_sigmoid').
+        """
+        super(GRUCell,self).__init__()
+        self.kernel = np.asarray(kernel,dtype="float32")
+        self.recurrent_kernel = np.asarray(recurrent_kernel,dtype="float32")
+        self.bias = np.asarray(bias,dtype="float32")
+        self.recurrent_bias = np.asarray(recurrent_bias,dtype="float32")
+        self.units = self.recurrent_kernel.shape[0]
+        self.reset_after = reset_after
+        self.activation = activations[activation]
+        self.recurrent_activation = activations[recurrent_activation]
+        
+    def Inputs(self,x):
+        """ Method projects the inputs for all time steps at once """
+        return x@self.kernel+self.bias
+        
+    def Zero(self,batch_size):
+        """ Method returns the zero state (h) """
+        return [np.zeros((batch_size,self.units),dtype="float32")]
+        
+    def Step(self,z,state):
+        """
+        Method advances the cell by one step.
+        Input:
+        z     -- Projected input with shape (batch_size,3*units).
+        state -- List with the hidden state.
+        Return:
+        Output and new state.
+        """
+        h, = state
+        u = self.units
+        if self.reset_after:
+            zh = h@self.recurrent_kernel+self.recurrent_bias
+            gz = self.recurrent_activation(z[:,:u]+zh[:,:u])
+            gr = self.recurrent_activation(z[:,u:2*u]+zh[:,u:2*u])
+            hh = self.activation(z[:,2*u:]+gr*zh[:,2*u:])
+        else:
+            zh = h@self.recurrent_kernel[:,:2*u]
+            gz = self.recurrent_activation(z[:,:u]+zh[:,:u])
+            gr = self.recurrent_activation(z[:,u:2*u]+zh[:,u:2*u])
+            hh = self.activation(z[:,2*u:]+(gr*h)@self.recurrent_kernel[:,2*u:])
+        h = gz*h+(1.-gz)*hh
+        return h,[h]
+
+def Cell(spec,arrays,prefix):
+    """
+    Method constructs a cell from its specification.
+    Input:
+    spec   -- Dictionary with cell, activation, recurrent_activation and reset_after.
+    arrays -- Dictionary with the weights.
+    prefix -- Prefix of the weights of the cell.
+    Return:
+    LSTMCell or GRUCell.
+    """
+    args = [arrays["%s/%s"%(prefix,name)] for name in ["kernel","recurrent_kernel","bias"]]
+    if spec["cell"] == "lstm":
+        return LSTMCell(*args,activation=spec["activation"],recurrent_activation=spec["recurrent_activation"])
+    return GRUCell(*args,arrays["%s/recurrent_bias"%(prefix)],reset_after=spec["reset_after"],
+                   activation=spec["activation"],recurrent_activation=spec["recurrent_activation"])
+
+class Recurrent:
+    """
+    Class Recurrent defines a (bidirectional) recurrent layer.
+    The outputs of a bidirectional layer are concatenated.
+    """
+    
+    def __init__(self,forward,backward=None,return_sequences=False):
+        """
+        Constructor of Recurrent.
+        Input:
+        forward          -- Cell of the forward direction.
+        backward         -- Cell of the backward direction (default = None).
+        return_sequences -- Flag to return all outputs (default = False).
+        """
+        super(Recurrent,self).__init__()
+        self.forward = forward
+        self.backward = backward
+        self.return_sequences = return_sequences
+        
+    def Scan(self,cell,x):
+        """ Method runs a cell over a tensor with shape (batch_size,time,input_dim) """
+        z = cell.Inputs(x)
+        state = cell.Zero(x.shape[0])
+        outputs = list()
+        for t in range(z.shape[1]):
+            h,state = cell.Step(z[:,t],state)
+            outputs.append(h)
+        if self.return_sequences:
+            return np.stack(outputs,axis=1)
+        return outputs[-1]
+        
+    def Run(self,x):
+        """
+        Method runs the layer over a window.
+        Input:
+        x -- Tensor with shape (batch_size,time,input_dim).
+        Return:
+        Outputs with shape (batch_size,time,units) or (batch_size,units).
+        """
+        output = self.Scan(self.forward,x)
+        if self.backward is None:
+            return output
+        backward = self.Scan(self.backward,x[:,::-1])
+        if self.return_sequences:
+            backward = backward[:,::-1]
+        return np.concatenate([output,backward],axis=-1)
+        
+    def Step(self,x,state):
+        """
+        Method advances a unidirectional layer by one step.
+        Input:
+        x     -- Tensor with shape (batch_size,input_dim).
+        state -- State of the cell.
+        Return:
+        Output and new state.
+        """
+        return self.forward.Step(self.forward.Inputs(x),state)
+
+class NumpyModel:
+    """
+    Class NumpyModel defines the forward pass of a model built by
+    BaseModel.Build: embedding and latent recurrent layers, layer
+    normalization, the merge of the minimodels, the dense output
+    layer and the softmax. Dropout is an identity at inference.
+    """
+    
+    def __init__(self,config,arrays,stateful=False):
+        """
+        Constructor of NumpyModel.
+        Input:
+        config   -- Dictionary with the architecture, see Export.
+        arrays   -- Dictionary with the weights.
+        stateful -- Flag to read a single character per call to predict_on_batch
+                    and to carry the states to the next call (default = False).
+        """
+        super(NumpyModel,self).__init__()
+        self.config = config
+        self.arrays = dict([(k,np.asarray(v,dtype="float32")) for k,v in arrays.items()])
+        self.stateful = stateful
+        self.numchars = config["numchars"]
+        self.onehot = np.eye(self.numchars,dtype="float32")
+        self.layers = dict()
+        for name,spec in config["recurrent"].items():
+            backward = Cell(spec,self.arrays,"%s/backward"%(name)) if spec["bidirectional"] else None
+            self.layers[name] = Recurrent(Cell(spec,self.arrays,"%s/forward"%(name)),backward,spec["return_sequences"])
+        if stateful and any(spec["bidirectional"] for spec in config["recurrent"].values()):
+            raise ValueError("Stateful models require unidirectional layers")
+        self.states = None
+        
+    def Clone(self,stateful=None):
+        """
+        Method returns a model sharing the weights with its own states.
+        Input:
+        stateful -- Flag for stateful mode (default = None, unchanged).
+        """
+        return NumpyModel(self.config,self.arrays,self.stateful if stateful is None else stateful)
+        
+    def Fold(self):
+        """
+        Method returns an inference model with the layer normalizations
+        and the merge folded into a scale and the output layer. See FoldHead.
+        Return:
+        Instance of NumpyModel with the same predictions.
+        """
+        config = self.config
+        if config.get("folded",False):
+            return self
+        arrays = self.arrays
+        scale,kernel,bias = FoldHead([arrays["%s/gamma"%(name)] for name in config["norms"]],
+                               [arrays["%s/beta"%(name)] for name in config["norms"]],
+                               arrays["Output/kernel"],arrays["Output/bias"],config["merge"],arrays.get("WeightedAvg/kernel"))
+        folded = dict([(key,value) for key,value in arrays.items()
+                       if key.split("/")[0] not in config["norms"]+["WeightedAvg","Output"]])
+        folded.update({"Output/kernel":kernel,"Output/bias":bias})
+        if scale is not None:
+            folded["Merge/scale"] = scale
+        return NumpyModel(dict(config,folded=True),folded,self.stateful)
+        
+    def Encode(self,x):
+        """ Method expands character indices to one-hot tensors """
+        x = np.asarray(x)
+        if self.config["encoding"] == 1 or x.ndim == 2:
+            return self.onehot[x.astype("int64")]
+        return x.astype("float32")
+        
+    def LayerNorm(self,name,x):
+        """ Method normalizes with the population standard deviation, as LayerNormalization """
+        mean = x.mean(axis=-1,keepdims=True)
+        std = x.std(axis=-1,keepdims=True)
+        if self.config.get("folded",False):
+            return (x-mean)/(std+self.config["eps"])
+        return self.arrays["%s/gamma"%(name)]*(x-mean)/(std+self.config["eps"])+self.arrays["%s/beta"%(name)]
+        
+    def WeightedAverage(self,outputs):
+        """
+        Method computes the weighted average as WeightedAverage.call,
+        reshaping the concatenated outputs to (output_dim,num).
+        """
+        C = np.concatenate(outputs,axis=-1)
+        R = C.reshape(C.shape[0],outputs[0].shape[-1],len(outputs))
+        return R@self.arrays["WeightedAvg/kernel"][:,0]
+        
+    def Head(self,latents):
+        """ Method normalizes, merges and computes the probabilities """
+        config = self.config
+        outputs = [self.LayerNorm(name,h) for name,h in zip(config["norms"],latents)]
+        if len(outputs) == 1:
+            output = outputs[0]
+        elif config.get("folded",False):
+            output = np.concatenate(outputs,axis=-1)
+            if "Merge/scale" in self.arrays:
+                output = MergeSum(output*self.arrays["Merge/scale"],len(outputs),config["merge"])
+        elif config["merge"] == 1:
+            output = np.mean(outputs,axis=0)
+        elif config["merge"] == 2:
+            output = self.WeightedAverage(outputs)
+        else:
+            output = np.concatenate(outputs,axis=-1)
+        return Softmax(output@self.arrays["Output/kernel"]+self.arrays["Output/bias"])
+        
+    def predict(self,x,batch_size=None,verbose=0):
+        """
+        Method computes the probabilities of the next character for windows.
+        Input:
+        x          -- Tensor with shape (batch_size,maxlen,numchars) or indices (batch_size,maxlen).
+        batch_size -- Ignored, for compatibility with Keras.
+        verbose    -- Ignored, for compatibility with Keras.
+        Return:
+        Probabilities with shape (batch_size,numchars).
+        """
+        x = self.Encode(x)
+        config,layers = self.config,self.layers
+        embeddings = [layers[name].Run(x) for name in config["embeddings"]]
+        if len(embeddings) == 1:
+            embeddings = embeddings*len(config["latents"])
+        return self.Head([layers[name].Run(e) for name,e in zip(config["latents"],embeddings)])
+        
+    def predict_on_batch(self,x):
+        """
+        Method computes the probabilities. A stateful model reads a single
+        character per sequence and updates the states.
+        Input:
+        x -- Tensor with shape (batch_size,1,numchars) or indices (batch_size,1).
+        Return:
+        Probabilities with shape (batch_size,numchars).
+        """
+        if not self.stateful:
+            return self.predict(x)
+        x = self.Encode(x)[:,-1]
+        config,layers = self.config,self.layers
+        if self.states is None or self.states[config["latents"][0]][0].shape[0] != x.shape[0]:
+            self.states = dict([(name,layer.forward.Zero(x.shape[0])) for name,layer in layers.items()])
+        embeddings = list()
+        for name in config["embeddings"]:
+            h,self.states[name] = layers[name].Step(x,self.states[name])
+            embeddings.append(h)
+        if len(embeddings) == 1:
+            embeddings = embeddings*len(config["latents"])
+        latents = list()
+        for name,e in zip(config["latents"],embeddings):
+            h,self.states[name] = layers[name].Step(e,self.states[name])
+            latents.append(h)
+        return self.Head(latents)
+        
+    def reset_states(self):
+        """ Method resets the states of all sequences """
+        self.states = None
+        
+    def ResetSlot(self,b):
+        """
+        Method resets the states of a single sequence.
+        Input:
+        b -- Index of the sequence.
+        """
+        if self.states is not None:
+            for state in self.states.values():
+                for value in state:
+                    value[b] = 0.
+                    
+    def Save(self,filename):
+        """
+        Method stores the configuration and weights in a npz-file.
+        Input:
+        filename -- Name of the file.
+        """
+        np.savez(filename,__config__=np.array(json.dumps(self.config)),**self.arrays)
+        
+    @staticmethod
+    def Load(filename,stateful=False):
+        """
+        Method loads a model stored with Save.
+        Input:
+        filename -- Name of the file.
+        stateful -- Flag for stateful mode (default = False).
+        Return:
+        Instance of NumpyModel.
+        """
+        with np.load(filename,allow_pickle=False) as f:
+            arrays = dict([(k,f[k]) for k in f.files if k != "__config__"])
+            config = json.loads(str(f["__config__"]))
+        return NumpyModel(config,arrays,stateful)
+
+def ExportCell(layer,prefix,arrays):
+    """
+    Method converts the weights of a Keras recurrent layer. The two
+    biases of CuDNNLSTM are summed, CuDNNGRU maps to a GRU with reset_after.
+    Input:
+    layer  -- Keras layer (LSTM, GRU, CuDNNLSTM or CuDNNGRU).
+    prefix -- Prefix of the weights.
+    arrays -- Dictionary receiving the weights.
+    Return:
+    Dictionary with the specification of the cell.
+    """
+    kind = type(layer).__name__
+    weights = layer.get_weights()
+    kernel,recurrent_kernel = weights[0],weights[1]
+    units = recurrent_kernel.shape[0]
+    config = layer.get_config()
+    bias = weights[2] if len(weights) > 2 else np.zeros(recurrent_kernel.shape[1],dtype="float32")
+    if kind == "CuDNNLSTM":
+        spec = {"cell":"lstm","activation":"tanh","recurrent_activation":"sigmoid"}
+        bias = bias[:4*units]+bias[4*units:]
+    elif kind == "CuDNNGRU":
+        spec = {"cell":"gru","activation":"tanh","recurrent_activation":"sigmoid","reset_after":True}
+        bias,recurrent_bias = bias[:3*units],bias[3*units:]
+    elif kind == "LSTM":
+        spec = {"cell":"lstm","activation":config["activation"],"recurrent_activation":config["recurrent_activation"]}
+    elif kind == "GRU":
+        reset_after = config.get("reset_after",False)
+        spec = {"cell":"gru","activation":config["activation"],"recurrent_activation":config["recurrent_activation"],"reset_after":reset_after}
+        if reset_after:
+            bias = bias.reshape(2,-1)
+            bias,recurrent_bias = bias[0],bias[1]
+        else:
+            recurrent_bias = np.zeros_like(bias)
+    else:
+        raise ValueError("Unsupported recurrent layer %s"%(kind))
+    arrays.update({"%s/kernel"%(prefix):kernel,"%s/recurrent_kernel"%(prefix):recurrent_kernel,"%s/bias"%(prefix):bias})
+    if spec["cell"] == "gru":
+        arrays["%s/recurrent_bias"%(prefix)] = recurrent_bias
+    return spec
+
+def Export(basemodel,model=None):
+    """
+    Method exports the weights of a model built by BaseModel.
+    Input:
+    basemodel -- Instance of BaseModel.
+    model     -- Keras model (default = None, using the model of basemodel).
+    Return:
+    Instance of NumpyModel.
+    """
+    model = model if model is not None else basemodel.model
+    if model is None:
+        raise ValueError("Model has not been initialized")
+    n = basemodel.num_models
+    config = {"numchars":basemodel.Utils.NumChars(),"maxlen":basemodel.Utils.MaxLen(),
+              "encoding":basemodel.encoding,"merge":basemodel.merge,
+              "embeddings":["Embedding_%s"%(idx) for idx in range(n)] if basemodel.split == 1 else ["Embedding"],
+              "latents":["Latent_%s"%(idx) for idx in range(n)],
+              "norms":["LayerNormm_%s"%(idx) for idx in range(n)],
+              "recurrent":dict()}
+    arrays = dict()
+    for name in config["embeddings"]+config["latents"]:
+        layer = model.get_layer(name)
+        if hasattr(layer,"forward_layer"):
+            if layer.merge_mode != "concat":
+                raise ValueError("Unsupported merge mode %s"%(layer.merge_mode))
+            spec = ExportCell(layer.forward_layer,"%s/forward"%(name),arrays)
+            ExportCell(layer.backward_layer,"%s/backward"%(name),arrays)
+            spec["bidirectional"] = True
+        else:
+            spec = ExportCell(layer,"%s/forward"%(name),arrays)
+            spec["bidirectional"] = False
+        spec["return_sequences"] = name in config["embeddings"]
+        config["recurrent"][name] = spec
+    for name in config["norms"]:
+        layer = model.get_layer(name)
+        config["eps"] = layer.eps
+        arrays["%s/gamma"%(name)],arrays["%s/beta"%(name)] = layer.get_weights()
+    if n > 1 and basemodel.merge == 2:
+        arrays["WeightedAvg/kernel"], = model.get_layer("WeightedAvg").get_weights()
+    arrays["Output/kernel"],arrays["Output/bias"] = model.get_layer("Output").get_weights()
+    return NumpyModel(config,arrays)
+
+def RandomModel(numchars,units=32,cell="lstm",minimodels=2,merge=2,encoding=0,bias=None,seed=None):
+    """
+    Method constructs a randomly initialized model with unidirectional
+    layers and a single embedding, e.g. to benchmark the generation.
+    Input:
+    numchars   -- Number of characters.
+    units      -- Number of units of the recurrent layers (default = 32).
+    cell       -- Recurrent cell, 'lstm' or 'gru' (default = 'lstm').
+    minimodels -- Number of minimodels (default = 2).
+    merge      -- Merge mode as in BaseModel (default = 2).
+    encoding   -- Input encoding as in BaseModel (default = 0).
+    bias       -- Bias of the output layer (default = None, zero). The log of the
+                  character frequencies gives strings of realistic length.
+    seed       -- Seed of the random weights (default = None).
+    Return:
+    Instance of NumpyModel.
+    """
+    rng = np.random.default_rng(seed)
+    gates = 4 if cell == "lstm" else 3
+    config = {"numchars":numchars,"maxlen":None,"encoding":encoding,"merge":merge,"eps":1e-6,
+              "embeddings":["Embedding"],"latents":["Latent_%s"%(idx) for idx in range(minimodels)],
+              "norms":["LayerNormm_%s"%(idx) for idx in range(minimodels)],"recurrent":dict()}
+    arrays = dict()
+    for name in config["embeddings"]+config["latents"]:
+        inputs = numchars if name == "Embedding" else units
+        config["recurrent"][name] = {"cell":cell,"activation":"tanh","recurrent_activation":"sigmoid","reset_after":True,
+                                     "bidirectional":False,"return_sequences":name == "Embedding"}
+        arrays["%s/forward/kernel"%(name)] = rng.normal(0,1/np.sqrt(inputs),(inputs,gates*units))
+        arrays["%s/forward/recurrent_kernel"%(name)] = rng.normal(0,1/np.sqrt(units),(units,gates*units))
+        arrays["%s/forward/bias"%(name)] = np.zeros(gates*units)
+        arrays["%s/forward/recurrent_bias"%(name)] = np.zeros(gates*units)
+    for name in config["norms"]:
+        arrays["%s/gamma"%(name)],arrays["%s/beta"%(name)] = np.ones(units),np.zeros(units)
+    arrays["WeightedAvg/kernel"] = rng.uniform(0,1,(minimodels,1))
+    width = units*minimodels if merge == 0 and minimodels > 1 else units
+    arrays["Output/kernel"],arrays["Output/bias"] = rng.normal(0,1/np.sqrt(width),(width,numchars)),np.zeros(numchars) if bias is None else bias
+    return NumpyModel(config,arrays)
+
+class NumpyModelTest(unittest.TestCase):
+    """
+    Unit tests for the NumPy forward pass, using fake Keras layers.
+    """
+    
+    class FakeLayer:
+        """ Layer with weights and configuration """
+        
+        def __init__(self,weights,config=dict()):
+            self.weights,self.config = weights,config
+            
+        def get_weights(self):
+            return self.weights
+            
+        def get_config(self):
+            return self.config
+            
+    def Layer(self,kind,weights,**config):
+        return type(kind,(self.FakeLayer,),{})(weights,config)
+        
+    def Weights(self,inputs,units,gates,nbias=1):
+        rng = self.rng
+        return [rng.normal(0,.5,(inputs,gates*units)),rng.normal(0,.5,(units,gates*units)),rng.normal(0,.5,nbias*gates*units)]
+        
+    def Model(self,kind="LSTM",bidirectional=False,split=0,merge=2,n=3,units=5,numchars=7,**config):
+        arrays = dict()
+        gates = 4 if "LSTM" in kind else 3
+        names = ["Embedding_%s"%(idx) for idx in range(n)] if split == 1 else ["Embedding"]
+        spec = {"numchars":numchars,"maxlen":6,"encoding":0,"merge":merge,"eps":1e-6,"embeddings":names,
+                "latents":["Latent_%s"%(idx) for idx in range(n)],"norms":["LayerNormm_%s"%(idx) for idx in range(n)],"recurrent":dict()}
+        for name in spec["embeddings"]+spec["latents"]:
+            inputs = numchars if name in names else units*(2 if bidirectional else 1)
+            directions = ["forward","backward"] if bidirectional else ["forward"]
+            for direction in directions:
+                layer = self.Layer(kind,self.Weights(inputs,units,gates,2 if "CuDNN" in kind else 1),**config)
+                spec["recurrent"][name] = ExportCell(layer,"%s/%s"%(name,direction),arrays)
+            spec["recurrent"][name].update({"bidirectional":bidirectional,"return_sequences":name in names})
+        width = units*(2 if bidirectional else 1)
+        for name in spec["norms"]:
+            arrays["%s/gamma"%(name)],arrays["%s/beta"%(name)] = self.rng.normal(1,.1,width),self.rng.normal(0,.1,width)
+        arrays["WeightedAvg/kernel"] = self.rng.uniform(0,1,(n,1))
+        width *= n if merge == 0 else 1
+        arrays["Output/kernel"],arrays["Output/bias"] = self.rng.normal(0,1,(width,numchars)),self.rng.normal(0,1,numchars)
+        return NumpyModel(spec,arrays)
+        
+    def setUp(self):
+        self.rng = np.random.default_rng(5)
+        self.x = self.rng.integers(0,7,(4,6))
+        
+    def test_Stateful(self):
+        """ Method checks that stepping through a window reproduces the windowed forward pass """
+        for kind,config in [("LSTM",{"activation":"tanh","recurrent_activation":"hard_sigmoid"}),("CuDNNLSTM",{}),
+                            ("GRU",{"activation":"tanh","recurrent_activation":"hard_sigmoid","reset_after":False}),("CuDNNGRU",{})]:
+            for split,merge in [(0,2),(1,0),(1,1)]:
+                model = self.Model(kind,split=split,merge=merge,**config)
+                twin = model.Clone(stateful=True)
+                for t in range(self.x.shape[1]):
+                    preds = twin.predict_on_batch(self.x[:,t:t+1])
+                np.testing.assert_allclose(preds,model.predict(self.x),rtol=1e-4,atol=1e-6)
+                self.assertTrue(np.allclose(preds.sum(axis=1),1.))
+                twin.ResetSlot(1)
+                self.assertEqual(np.abs(twin.states["Latent_0"][0][1]).sum(),0.)
+                
+    def test_CuDNN(self):
+        """ Method checks that CuDNNLSTM equals LSTM with the summed bias """
+        kernel,recurrent_kernel,bias = self.Weights(7,5,4,2)
+        arrays = dict()
+        cudnn = ExportCell(self.Layer("CuDNNLSTM",[kernel,recurrent_kernel,bias]),"a",arrays)
+        lstm = ExportCell(self.Layer("LSTM",[kernel,recurrent_kernel,bias[:20]+bias[20:]],activation="tanh",recurrent_activation="sigmoid"),"b",arrays)
+        self.assertEqual(cudnn,lstm)
+        np.testing.assert_allclose(arrays["a/bias"],arrays["b/bias"])
+        
+    def test_Bidirectional(self):
+        """ Method checks that the backward direction reads the reversed window """
+        model = self.Model("LSTM",bidirectional=True,activation="tanh",recurrent_activation="sigmoid")
+        x = model.Encode(self.x)
+        layer = model.layers["Embedding"]
+        sequences = layer.Run(x)
+        final = Recurrent(layer.forward,layer.backward).Run(x)
+        np.testing.assert_allclose(final,np.concatenate([sequences[:,-1,:5],sequences[:,0,5:]],axis=1),rtol=1e-5)
+        self.assertRaises(ValueError,lambda: model.Clone(stateful=True))
+        
+    def test_WeightedAverage(self):
+        """ Method checks the reshape semantics of WeightedAverage """
+        model = self.Model("LSTM",n=3,activation="tanh",recurrent_activation="sigmoid")
+        outputs = [self.rng.normal(0,1,(2,5)) for _ in range(3)]
+        C,kernel = np.concatenate(outputs,axis=1),model.arrays["WeightedAvg/kernel"][:,0]
+        expected = [[sum(C[b,i*3+j]*kernel[j] for j in range(3)) for i in range(5)] for b in range(2)]
+        np.testing.assert_allclose(model.WeightedAverage(outputs),expected,rtol=1e-5)
+        
+    def test_RandomModel(self):
+        """ Method checks the shapes of a random model """
+        for cell in ["lstm","gru"]:
+            preds = RandomModel(7,units=4,cell=cell,seed=1).predict(self.x)
+            self.assertTupleEqual(preds.shape,(4,7))
+            np.testing.assert_allclose(preds.sum(axis=1),1.,rtol=1e-5)
+        
+    def test_Fold(self):
+        """ Method checks that folding the head keeps the predictions """
+        for n,merge in [(1,0),(3,0),(3,1),(3,2)]:
+            model = self.Model("CuDNNGRU",bidirectional=True,n=n,merge=merge)
+            folded = model.Fold()
+            self.assertTrue(all(key.split("/")[0] not in model.config["norms"] for key in folded.arrays))
+            self.assertEqual(folded.arrays["Output/kernel"].shape,model.arrays["Output/kernel"].shape)
+            self.assertEqual("Merge/scale" in folded.arrays,n > 1 and merge > 0)
+            np.testing.assert_allclose(folded.predict(self.x),model.predict(self.x),rtol=1e-4,atol=1e-6)
+            
+    def test_SaveLoad(self):
+        """ Method checks that a stored model reproduces the predictions """
+        import os,tempfile
+        model = self.Model("CuDNNGRU",bidirectional=True)
+        with tempfile.TemporaryDirectory() as outdir:
+            filename = os.path.join(outdir,"model.npz")
+            model.Save(filename)
+            np.testing.assert_allclose(NumpyModel.Load(filename).predict(self.x),model.predict(self.x))
+
+if __name__ == "__main__":
+    unittest.main()
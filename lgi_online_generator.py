@@ -0,0 +1,390 @@
+"""
+Copyright 2019 Ruud van Deursen, Firmenich SA.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+
+
+"""
+File lgi_online_generator defines a Keras callback validating
+the generator during training.
+"""
+
+# Keras inputs
+from keras import backend as K
+from keras.models import clone_model
+from keras.callbacks import Callback
+from samplesize import SampleSize
+
+# Miscellaneous inputs
+import numpy as np
+import contextlib
+import queue
+import threading
+import warnings
+
+
+# Define a special function for early-stopping
+# This method will stop the training when a better percentage
+# has been reached.
+class OnlineGenerator(Callback):
+    """
+    The class OnlineGenerator is a special Callback function
+    to keep track of the number of valid generated molecules.
+    The Callback has been derived from EarlyStopping and stops
+    as soon as a threshold is repeatedly exceeded.
+    In asynchronous mode the weights are snapshot at the end of
+    every epoch and evaluated by a background thread on a copy
+    of the model, while the next epoch trains. The decisions use
+    the results as they arrive, at most maxlag epochs late.
+    """
+
+    def __init__(self,
+                 gen,
+                 min_value=.95,
+                 ncollect=300,
+                 npop=None,
+                 patience=0,
+                 verbose=0,
+                 baseline=None,
+                 targetdist=None,
+                 distmethod=None,
+                 warmup=3,
+                 restore_best_weights=True,
+                 filename=None,
+                 asynchronous=False,
+                 maxlag=1,
+                 sequential=False):
+        """
+        Constructor of OnlineGenerator.
+        Input:
+        gen                  -- Generator.
+        min_value            -- Minimum value to reach and repeatedly hold (default = 0.95).
+        patience             -- Patience until stop.
+        verbose              -- Value for verbose mode (default = 0).
+        baseline             -- Value for baseline (default = None).
+        targetdist           -- Target distribution (default = None).
+                                If set to None, the distribution of online generated
+                                entries is not compared to the reference distribution.
+        distmethod           -- Distribution method (default = None).
+                                If set to None, the distribution of online generated
+                                entries is not compared to the reference distribution.
+        restore_best_weights -- Value to restore best weights (default = True).
+        filename             -- File name to store the output data to (default is None).
+                                If set to None, nothing is stored.
+        asynchronous         -- Flag to evaluate in a background thread (default = False).
+        maxlag               -- Maximum number of snapshots waiting for evaluation in
+                                asynchronous mode besides the one under evaluation
+                                (default = 1). Training blocks at the end of an epoch
+                                when more snapshots are waiting.
+        sequential           -- Flag to stop the generation of every epoch as soon as
+                                a sequential test decides that the rate is below the
+                                lower bound of the interval or reaches min_value
+                                (default = False). At most ncollect strings are
+                                generated. See SampleSize.SequentialTest.
+        """
+        super(OnlineGenerator, self).__init__()
+        self.gen = gen
+        self.ncollect = ncollect
+        self.targetdist = targetdist
+        self.method = distmethod
+        self.baseline = baseline
+        self.patience = patience
+        self.pct,self.epoch = 0,0
+        self.valid_epoch,self.timings = 0,{}
+        self.mode = 'max'
+        self.verbose = verbose
+        self.history = {}
+        self.wait = 0
+        self.stopped_epoch = 0
+        self.restore_best_weights = restore_best_weights
+        self.best_weights = None
+        self.monitor_op = np.greater
+        self.filename = filename
+        self.asynchronous = asynchronous
+        self.maxlag = maxlag
+        self.worker = None
+        self.sequential = sequential
+        self.npop = npop
+        
+        # Define minvalue with statistical window
+        self.minvalue = min_value
+        self.lowervalue,self.uppervalue = SampleSize.ComputeInterval(min_value,ncollect,npopulation=npop)
+
+    def on_train_begin(self, logs=None):
+        # Allow instances to be re-used
+        self.wait = 0
+        self.stopped_epoch = 0
+        self.loss_hist = list()
+        self.pct_hist = list()
+        if self.baseline is not None:
+            self.best = self.baseline
+        else:
+            self.best = np.inf if self.monitor_op == np.less else -np.inf
+        if self.asynchronous:
+            self.StartWorker()
+            
+    def StartWorker(self):
+        """
+        Method starts the background thread evaluating weight snapshots
+        on a copy of the model. The copy and its predict function are
+        built here, in the training thread.
+        """
+        self.evalgen = self.gen.Clone(self.CopyModel())
+        self.graph = K.get_session().graph if K.backend() == "tensorflow" else None
+        self.requests = queue.Queue(maxsize=self.maxlag)
+        self.results = queue.Queue()
+        self.worker = threading.Thread(target=self.Work,daemon=True)
+        self.worker.start()
+        
+    def CopyModel(self):
+        """
+        Method copies the model of the generator for the background thread.
+        Return:
+        Copy of the model with the current weights.
+        """
+        model = clone_model(self.gen.model)
+        model.set_weights(self.gen.model.get_weights())
+        if hasattr(model,"_make_predict_function"):
+            model._make_predict_function()
+        return model
+        
+    def Work(self):
+        """
+        Method runs in the background thread and evaluates the weight
+        snapshots in the order of the epochs. A snapshot of None stops
+        the thread.
+        """
+        context = self.graph.as_default() if self.graph is not None else contextlib.nullcontext()
+        with context:
+            while True:
+                request = self.requests.get()
+                if request is None:
+                    return
+                epoch,weights = request
+                try:
+                    self.evalgen.model.set_weights(weights)
+                    self.results.put((epoch,self.evaluate(self.evalgen),weights))
+                except Exception as e:
+                    self.results.put((epoch,e,weights))
+                    
+    def evaluate(self,gen):
+        """
+        Method measures the rate of valid strings.
+        Input:
+        gen -- Generator to evaluate.
+        Return:
+        Tuple with the rate of valid strings, the histogram, the decision
+        of the sequential test, or None if the test is not used, and a
+        dictionary with the seconds spent on generation and validation.
+        """
+        if not self.sequential:
+            return gen.PercentValid(ncollect=self.ncollect,verbose=self.verbose)+(None,dict(getattr(gen,"timings",{})))
+        test = SampleSize.SequentialTest(self.minvalue,self.ncollect,npopulation=self.npop)
+        return gen.PercentValid(ncollect=self.ncollect,verbose=self.verbose,test=test)+(test.Decision(),dict(getattr(gen,"timings",{})))
+        
+    def collect(self,block=False):
+        """
+        Method applies the results of the background thread.
+        Input:
+        block -- Flag to wait for all submitted epochs (default = False).
+        """
+        while block and self.requests.unfinished_tasks > 0 or not self.results.empty():
+            epoch,result,weights = self.results.get()
+            self.requests.task_done()
+            if isinstance(result,Exception):
+                raise result
+            self.update(epoch,result,weights)
+
+    def generate(self):
+        self.epoch += 1
+        self.update(self.epoch,self.evaluate(self.gen))
+        
+    def update(self,epoch,result,weights=None):
+        """
+        Method updates the best weights and the stopping criterion
+        with the result of an epoch.
+        Input:
+        epoch   -- Evaluated epoch.
+        result  -- Tuple with the rate of valid strings, the histogram, the
+                   decision of the sequential test and the timings.
+        weights -- Weights of the evaluated epoch (default = None,
+                   using the current weights of the model).
+        """
+        self.pct,self.H,decision,self.timings = result
+        self.valid_epoch = epoch
+        self.pct_hist.append(self.pct)
+        self.history[epoch] = (self.pct,self.H)
+        if self.verbose:
+            print("Updating score after epoch %s: %.1f%%"%(epoch,100.0*self.pct))
+
+        # Check the output valid
+        current = self.pct
+        if current is None or self.stopped_epoch > 0:
+            return
+        get_weights = (lambda: weights) if weights is not None else self.model.get_weights
+
+        # Update the best weights
+        if current > self.best:
+            self.best = current
+            self.best_weights = get_weights()
+
+        # Continue until the lower confidence bound is repeatedly exceeded,
+        # or until the sequential test decides for a rate reaching min value
+        below = decision < 0 if decision is not None else current < self.lowervalue
+        if self.minvalue is not None and below:
+            self.wait = 0
+            if self.restore_best_weights:
+                self.best_weights = get_weights()
+            print("Min value of %.4f not yet reached: %.4f"%(self.minvalue,current))
+            return
+        else:
+            # Count and stop after 5 rounds.
+            self.wait += 1
+            print("Above min value of %.4f for %s consecutive epochs"%(self.minvalue,self.wait))
+            if self.wait >= self.patience:
+                self.stopped_epoch = epoch
+                self.model.stop_training = True
+                if self.restore_best_weights:
+                    if self.verbose > 0:
+                        print('Restoring model weights from the end of '
+                              'the best epoch')
+                    self.model.set_weights(self.best_weights)        
+            
+    def on_epoch_end(self, batch, logs={}):
+        if self.asynchronous:
+            # Submit the snapshot, blocking while maxlag epochs are waiting
+            self.epoch += 1
+            self.requests.put((self.epoch,self.model.get_weights()))
+            self.collect()
+        else:
+            self.generate()
+        self.loss_hist.append(logs["loss"])
+        if len(self.pct_hist) > 0:
+            print("Epoch %s: loss=%.4f valid=%.1f%% (epoch %s)"%(self.epoch,logs["loss"],100.0*self.pct_hist[-1],self.valid_epoch))
+        else:
+            print("Epoch %s: loss=%.4f"%(self.epoch,logs["loss"]))
+
+    def on_train_end(self, logs={}):
+        #self.generate()
+        if self.worker is not None:
+            # Apply the results of the epochs still under evaluation
+            self.collect(block=True)
+            self.requests.put(None)
+            self.worker.join()
+            self.worker = None
+        self.collected_logs = logs
+        if self.stopped_epoch > 0 and self.verbose > 0:
+            print('Epoch %05d: early stopping' % (self.stopped_epoch + 1))
+            lower,upper = self.epoch-self.patience,self.epoch-self.patience+2
+            print("Recommended model at epoch = [%s,%s]"%(lower,upper))
+        else:
+            print("No stable results observed for target %.3f [%.3f,%.3f]"%(self.minvalue,self.lowervalue,self.uppervalue))
+            
+        if self.filename is not None:
+            with open(self.filename,"w") as f:
+                f.write("epoch,loss,pct_valid\n")
+                e = 0
+                for loss,pct in zip(self.loss_hist,self.pct_hist):
+                    e += 1
+                    f.write("%s,%.4f,%.1f\n"%(e,loss,100.0*pct))
+            print("Loss/Valid written to %s"%(self.filename))
+            
+    def get_monitor_value(self, logs={}):
+        monitor_value = self.pct
+        if monitor_value is None:
+            warnings.warn(
+                'Early stopping conditioned on metric `%s` '
+                'which is not available. Available metrics are: %s' %
+                (self.monitor, ','.join(list(logs.keys()))), RuntimeWarning
+            )
+        return monitor_value
+
+# Test time
+import unittest
+class OnlineGeneratorTest(unittest.TestCase):
+    """ Methods checks OnlineGenerator in synchronous and asynchronous mode """
+    
+    class FakeModel:
+        """ Model with a single weight """
+        
+        def __init__(self):
+            self.weights = [np.zeros(1)]
+            self.stop_training = False
+            
+        def get_weights(self):
+            return [w.copy() for w in self.weights]
+            
+        def set_weights(self,weights):
+            self.weights = [w.copy() for w in weights]
+            
+    class FakeGenerator:
+        """ Generator with a rate of valid strings equal to the weight """
+        
+        def __init__(self,model):
+            self.model = model
+            self.samples = []
+            self.rng = np.random.default_rng(0)
+            
+        def Clone(self,model):
+            return OnlineGeneratorTest.FakeGenerator(model)
+            
+        def PercentValid(self,ncollect,verbose,test=None):
+            rate = float(self.model.weights[0][0])
+            if test is None:
+                return rate,None
+            while test.Update(self.rng.random() < rate) == 0:
+                pass
+            self.samples.append(test.n)
+            return test.Ratio(),None
+            
+    class FakeOnlineGenerator(OnlineGenerator):
+        """ Callback copying the fake model """
+        
+        def CopyModel(self):
+            return OnlineGeneratorTest.FakeModel()
+            
+    def Run(self,asynchronous,sequential=False,min_value=.5,values=[0.1,0.3,0.9,0.95,0.93,0.99,0.99,0.99]):
+        model = self.FakeModel()
+        callback = self.FakeOnlineGenerator(self.FakeGenerator(model),min_value=min_value,patience=2,asynchronous=asynchronous,sequential=sequential)
+        callback.model = model
+        callback.on_train_begin()
+        for epoch,value in enumerate(values):
+            if model.stop_training:
+                break
+            model.weights = [np.array([value])]
+            callback.on_epoch_end(epoch,{"loss":1.0})
+        callback.on_train_end()
+        return callback,model
+        
+    def test_Asynchronous(self):
+        """ Method checks that the asynchronous mode takes the same decisions """
+        sync,sync_model = self.Run(False)
+        callback,model = self.Run(True)
+        self.assertEqual(sync.stopped_epoch,4)
+        self.assertEqual(callback.stopped_epoch,4)
+        self.assertListEqual(callback.pct_hist[:4],sync.pct_hist)
+        self.assertEqual(len(callback.pct_hist),len(callback.loss_hist))
+        self.assertEqual(model.weights[0][0],0.95)
+        self.assertEqual(sync_model.weights[0][0],0.95)
+        self.assertIsNone(callback.worker)
+        
+    def test_Sequential(self):
+        """ Method checks that obviously bad epochs stop after a few samples """
+        callback,model = self.Run(False,sequential=True,min_value=.95,values=[0.1,0.3,0.999,0.999,0.999,0.999])
+        self.assertEqual(callback.stopped_epoch,4)
+        self.assertLess(max(callback.gen.samples[:2]),20)
+        self.assertLessEqual(max(callback.gen.samples),callback.ncollect)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+"""
+Copyright 2019 Ruud van Deursen, Firmenich SA.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+File lgi_reader.py defines a native reader for LGI-graph strings.
+The reader parses atoms, branches and ring-closure labels in a
+single pass and returns the degrees and edges of the graph,
+without a chemistry toolkit.
+"""
+
+class LGIReader:
+    """ 
+    Class LGIReader defines a class to read LGI-graph strings.
+    This class can currently only read lgi-strings with a degree of 1-6.
+    """
+    
+    def __init__(self):
+        """ Constructor of LGIReader """
+        super(LGIReader,self).__init__()
+        self.degree = dict([(char,idx+1) for idx,char in enumerate(["A","B","C","D","E","F"])])
+        self.digits = set("0123456789")
+        self.cache = None
+        
+    def SetCache(self,cache):
+        """
+        Method sets the cache used in front of the parser.
+        Input:
+        cache -- Instance of LGICache keeping graphs, or None to disable caching.
+        Return:
+        Updated instance of LGIReader.
+        """
+        self.cache = cache
+        return self
+        
+    def Read(self,lgi):
+        """
+        Method Read imports an lgi to a graph, using the cache if set.
+        Input:
+        lgi -- lgi-string defining a graph.
+        Return:
+        Tuple (degrees,edges), or None if the lgi-string is invalid.
+        """
+        cache = self.cache
+        if cache is None:
+            return self.Parse(lgi)
+        entry = cache.Get(lgi,graph=True)
+        if entry is not None:
+            return entry[1]
+        G = self.Parse(lgi)
+        cache.Put(lgi,G is not None,G)
+        return G
+        
+    def Parse(self,lgi):
+        """
+        Method parses an lgi to a graph.
+        Input:
+        lgi -- lgi-string defining a graph.
+        Return:
+        Tuple (degrees,edges) with the degree encoded for every vertex
+        and the list of edges as vertex index pairs, or None if the
+        lgi-string is malformed or a real degree does not match the
+        character in the string.
+        """
+        degree,digits = self.degree,self.digits
+        degrees,edges,bonded = [],[],set()
+        stack,rings = [],{}
+        prev,last = -1,None # Current vertex and type of the last token
+        idx,num = 0,len(lgi)
+        while idx < num:
+            char = lgi[idx]
+            if char in degree:
+                # Vertex bonded to the current vertex
+                vertex = len(degrees)
+                degrees.append(degree[char])
+                if prev >= 0:
+                    edges.append((prev,vertex))
+                    bonded.add((prev,vertex))
+                elif last is not None:
+                    return None
+                prev,last = vertex,"vertex"
+            elif last is None or last == "open":
+                # Other tokens follow a vertex, ring label or branch
+                return None
+            elif char == "(":
+                stack.append(prev)
+                last = "open"
+            elif char == ")":
+                if len(stack) == 0:
+                    return None
+                prev,last = stack.pop(),"close"
+            elif char in digits or char == "%":
+                # Ring-closure label with one digit or % and two digits
+                if char == "%":
+                    label = lgi[idx+1:idx+3]
+                    if len(label) != 2 or label[0] == "0" or label[1] not in digits:
+                        return None
+                    idx += 2
+                else:
+                    label = char
+                if label in rings:
+                    other = rings.pop(label)
+                    edge = (other,prev) if other < prev else (prev,other)
+                    if other == prev or edge in bonded:
+                        return None
+                    edges.append(edge)
+                    bonded.add(edge)
+                else:
+                    rings[label] = prev
+                last = "ring"
+            elif char.isspace() and lgi[idx:].isspace():
+                break
+            else:
+                return None
+            idx += 1
+            
+        # Check for unclosed branches and rings
+        if len(stack) > 0 or len(rings) > 0 or len(degrees) == 0:
+            return None
+        
+        # Check the real degree against the encoded degree
+        real = [0]*len(degrees)
+        for f,t in edges:
+            real[f] += 1
+            real[t] += 1
+        if real != degrees:
+            return None
+        
+        # Done
+        return degrees,edges
+
+"""
+Static instance of the class.
+"""
+lgireader = LGIReader()
+
+
+import unittest
+class LGIReaderTest(unittest.TestCase):
+    """
+    Test class evaluating the parsed graphs.
+    """
+    
+    def test_Valid(self):
+        """ Method tests the degrees and edges of valid strings """
+        self.assertEqual(([1,1],[(0,1)]),lgireader.Read("AA"))
+        self.assertEqual(([2]*6,[(0,1),(1,2),(2,3),(3,4),(4,5),(0,5)]),lgireader.Read("B1BBBBB1"))
+        self.assertEqual(([1,3,1,1],[(0,1),(1,2),(1,3)]),lgireader.Read("AC(A)A"))
+        self.assertEqual(([1,4,1,2,2],[(0,1),(1,2),(1,3),(3,4),(1,4)]),lgireader.Read("AD(A)1BB1"))
+        self.assertEqual(([2]*5,[(0,1),(1,2),(2,3),(3,4),(0,4)]),lgireader.Read("B%10BBBB%10"))
+        self.assertIsNotNone(lgireader.Read("B1BBBBB1\n"))
+        
+    def test_Cache(self):
+        """ Method tests that only cached graphs count as hits """
+        from lgi_cache import LGICache
+        for graphs,hits in [(False,0),(True,1)]:
+            cache = LGICache(maxsize=10,graphs=graphs)
+            reader = LGIReader().SetCache(cache)
+            cache.Put("AA",True)
+            cache.Put("AB",False)
+            for _ in range(2):
+                self.assertEqual(([1,1],[(0,1)]),reader.Read("AA"))
+                self.assertIsNone(reader.Read("AB"))
+            self.assertEqual(hits,cache.Counters()["hits"]-2)
+            self.assertEqual(2-hits,cache.Counters()["misses"])
+        
+    def test_Invalid(self):
+        """ Method tests that malformed strings and wrong degrees are rejected """
+        for lgi in ["","A","AB","A1A1","C1CC1","C(A)(A)","(A)A","A)","AC()A","D((A)A)AA",
+                    "AC(1)","AB1","B12BB12","D11AAA","B%01BBBB%01","B%10BBBB%1","b1bbbbb1","ABXA"]:
+            self.assertIsNone(lgireader.Read(lgi),lgi)
+            
+    def test_Dataset(self):
+        """ Method tests that all graphs in the bundled dataset are valid """
+        import os
+        filename = os.path.join(os.path.dirname(os.path.abspath(__file__)),"datasets","Graphs_can.lgi")
+        with open(filename) as f:
+            lines = [line.strip() for line in f][:5000]
+        self.assertTrue(all([lgireader.Read(lgi) is not None for lgi in lines]))
+        
+# Runner for tests
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+Copyright 2019 Ruud van Deursen, Firmenich SA.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+File lgi_sampler.py defines a sampler to draw the next
+characters for a batch of sequences in a single vectorized
+operation using the inverse cumulative distribution.
+"""
+
+import numpy
+
+class Sampler:
+    """
+    Class Sampler draws one index per row from a matrix with
+    probabilities of shape (batch,vocab). The sampler optionally
+    applies a temperature and restricts the draw to the top-k
+    most likely characters.
+    """
+    
+    def __init__(self,temperature=1.0,topk=None,rng=None):
+        """
+        Constructor of Sampler.
+        Input:
+        temperature -- Temperature applied to the probabilities (default = 1.0).
+                       Values below 1 sharpen and values above 1 flatten
+                       the distribution.
+        topk        -- Number of most likely characters to sample from
+                       (default = None, sampling from all characters).
+        rng         -- Random generator of type numpy.random.Generator
+                       (default = None, creating a new unseeded generator).
+                       Pass a seeded generator to reproduce runs.
+        """
+        super(Sampler,self).__init__()
+        self.temperature = temperature
+        self.topk = topk
+        self.rng = rng if rng is not None else numpy.random.default_rng()
+        self.buffer = numpy.empty(0)
+        
+    def Sample(self,preds):
+        """
+        Method samples an index from every row of the probability matrix.
+        Input:
+        preds -- Probability matrix of shape (batch,vocab) or a single
+                 probability vector of shape (vocab,). The rows do not
+                 have to be normalized.
+        Return:
+        Array with sampled indices of shape (batch,), or a single index
+        if preds is a vector.
+        """
+        preds = numpy.asarray(preds)
+        single = preds.ndim == 1
+        preds = numpy.atleast_2d(preds)
+        nbatch,nvocab = preds.shape
+        
+        # Apply temperature and top-k on the probabilities
+        if self.temperature != 1.0:
+            preds = numpy.power(preds,1.0/self.temperature)
+        if self.topk is not None and self.topk < nvocab:
+            cutoff = numpy.partition(preds,nvocab-self.topk,axis=1)[:,nvocab-self.topk]
+            preds = numpy.where(preds >= cutoff[:,None],preds,0.)
+        
+        # Draw with the inverse cumulative distribution.
+        # Using <= skips characters with zero probability.
+        cdf = numpy.cumsum(preds,axis=1,dtype="float64")
+        if len(self.buffer) < nbatch:
+            self.buffer = numpy.empty(nbatch)
+        u = self.buffer[:nbatch]
+        self.rng.random(out=u)
+        u *= cdf[:,-1]
+        indices = (cdf <= u[:,None]).sum(axis=1)
+        numpy.minimum(indices,nvocab-1,out=indices)
+        
+        # Done
+        if single:
+            return indices[0]
+        return indices
+
+    
+import unittest
+class SamplerTest(unittest.TestCase):
+    """
+    Test class evaluating the sampled indices.
+    """
+    
+    def setUp(self):
+        """ Setup """
+        self.preds = numpy.array([[0.1,0.0,0.6,0.3],[0.0,0.0,0.0,1.0],[0.5,0.5,0.0,0.0]])
+        
+    def test_Reproducible(self):
+        """ Method tests that equally seeded samplers draw identical indices """
+        s1 = Sampler(rng=numpy.random.default_rng(42))
+        s2 = Sampler(rng=numpy.random.default_rng(42))
+        for _ in range(10):
+            self.assertListEqual(list(s1.Sample(self.preds)),list(s2.Sample(self.preds)))
+            
+    def test_Support(self):
+        """ Method tests that characters with zero probability are never drawn """
+        sampler = Sampler(rng=numpy.random.default_rng(1))
+        drawn = numpy.array([sampler.Sample(self.preds) for _ in range(2000)])
+        self.assertNotIn(1,drawn[:,0])
+        self.assertTrue((drawn[:,1] == 3).all())
+        self.assertTrue(set(drawn[:,2]).issubset(set([0,1])))
+        self.assertAlmostEqual(0.6,(drawn[:,0] == 2).mean(),1)
+        
+    def test_TopK(self):
+        """ Method tests that top-1 sampling returns the most likely character """
+        sampler = Sampler(topk=1)
+        self.assertListEqual([2,3],list(sampler.Sample(self.preds[:2])))
+        self.assertEqual(2,sampler.Sample(self.preds[0]))
+        
+    def test_Temperature(self):
+        """ Method tests that a low temperature concentrates the draw """
+        sampler = Sampler(temperature=0.05,rng=numpy.random.default_rng(3))
+        drawn = numpy.array([sampler.Sample(self.preds[0]) for _ in range(200)])
+        self.assertGreater((drawn == 2).mean(),0.99)
+        
+# Runner for tests
+if __name__ == "__main__":
+    unittest.main()
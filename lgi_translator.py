@@ -12,49 +12,191 @@ Redistribution and use in source and binary forms, with or without modification,
 THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
-from rdkit.Chem import MolToSmiles,MolFromSmiles
-from rdkit.Chem import RWMol,Atom,Bond,BondType
-import g6_reader
 
-class LGI:
+"""
+File lgi_translator.py defines translators from SMILES and g6-strings
+to lgi-strings, and from lgi-strings to g6-strings. Random lgi-strings are written natively by a depth-first
+traversal with ring-closure labels. Canonical lgi-strings are written with
+the canonical ranking of RDKit, which is faster than a pure-Python search
+and matches the canonical strings of the bundled datasets.
+"""
 
-    def __init__(self):
-        self.d2atno = [5,9,8,7,6,15,16]
-        self.replacements = [("B","@"),("F","a"),("O","b"),("N","c"),("C","d"),("P","e"),("S","f")]
-        self.allowed = set([0,1,2,3,4,5,6])
+from lgi_reader import lgireader
+from g6_codec import g6codec
+import numpy as np
+import random
+import unittest
 
-    def Write(self,degrees,edges,canonical=True):
-        if set(degrees).issubset(self.allowed):
-            # Define the molecule
-            cp = RWMol()
-            _ = [cp.AddAtom(Atom(self.d2atno[D])) for D in degrees]
-            _ = [cp.AddBond(f,t,BondType.SINGLE) for f,t in edges]
+class LGI:
+    """
+    Class LGI writes graphs as lgi-strings. Every vertex is written as
+    the character encoding its degree, i.e. A-F for degree 1-6, and ring
+    closures are written with labels 1-9 and %10-%99.
+    """
 
-            # Export as canonical SMILES or a random SMILES
-            if canonical:
-                out = MolToSmiles(cp,canonical=True)
-            else:
-                out = MolToSmiles(cp,canonical=False,doRandom=True)
+    def __init__(self,seed=None):
+        """
+        Constructor of LGI.
+        Input:
+        seed -- Seed for the random traversals (default = None).
+        """
+        super(LGI,self).__init__()
+        self.chars = ["","A","B","C","D","E","F"]
+        self.allowed = set([1,2,3,4,5,6])
+        self.rng = random.Random(seed)
+        self.atoms = None
+        self.table = str.maketrans("FONCPS","ABCDEF")
 
-            # Carry out replacements
-            for src,dst in self.replacements:
-                out = out.replace(src,dst)
-            return out.upper()
-        else:
+    def Write(self,degrees,edges,canonical=True,rng=None):
+        """
+        Method writes a graph as lgi-string.
+        Input:
+        degrees   -- List with the degree of every vertex.
+        edges     -- List or array with edges as vertex index pairs.
+        canonical -- Flag to write the canonical string (default = True).
+                     If set to False, a random traversal is written.
+        rng       -- Instance of random.Random for the random traversal
+                     (default = None, using the generator of the instance).
+        Return:
+        lgi-string, or None if the graph is disconnected, a degree is
+        not in the range 1-6 or does not match the edges, or more than
+        99 ring labels are open.
+        """
+        if len(degrees) == 0 or not set(degrees).issubset(self.allowed):
+            return None
+        
+        # Check the degrees against the edges
+        V = len(degrees)
+        edges = edges.tolist() if hasattr(edges,"tolist") else list(edges)
+        real = [0]*V
+        for f,t in edges:
+            real[f] += 1
+            real[t] += 1
+        if real != list(degrees):
             return None
+        
+        # Write the canonical string or a random traversal
+        if canonical:
+            return self.Canonical(degrees,edges)
+        adj = [[] for _ in range(V)]
+        for f,t in edges:
+            adj[f].append(t)
+            adj[t].append(f)
+        rank = list(range(V))
+        (rng or self.rng).shuffle(rank)
+        return self.Traverse(adj,rank)
+        
+    def Canonical(self,degrees,edges):
+        """
+        Method writes the canonical lgi-string with RDKit. Every vertex
+        is written as the element with the valence equal to its degree,
+        i.e. F, O, N, C, P and S for degree 1-6, and the canonical SMILES
+        is mapped back to the characters A-F.
+        Input:
+        degrees -- List with the degree of every vertex.
+        edges   -- List with edges as vertex index pairs.
+        Return:
+        lgi-string, or None if the graph is disconnected or more than
+        99 ring labels are open.
+        """
+        from rdkit.Chem import RWMol,Atom,BondType,MolToSmiles
+        if self.atoms is None:
+            self.atoms = [Atom(atno) for atno in [0,9,8,7,6,15,16]]
+        mol = RWMol()
+        for degree in degrees:
+            mol.AddAtom(self.atoms[degree])
+        for f,t in edges:
+            mol.AddBond(f,t,BondType.SINGLE)
+        out = MolToSmiles(mol)
+        if "." in out or "%(" in out:
+            return None
+        return out.translate(self.table)
+                
+    def Traverse(self,adj,rank):
+        """
+        Method writes the depth-first traversal of a graph, starting at
+        the vertex with the lowest rank and visiting neighbours by rank.
+        Input:
+        adj  -- Adjacency lists of the graph.
+        rank -- List with the rank of every vertex.
+        Return:
+        lgi-string, or None if the graph is disconnected or more than
+        99 ring labels are open.
+        """
+        # First pass: define the spanning tree and the ring bonds
+        V = len(adj)
+        nbrs = [sorted(n,key=rank.__getitem__) for n in adj]
+        start = min(range(V),key=rank.__getitem__)
+        children,rings = [[] for _ in range(V)],[[] for _ in range(V)]
+        parent,position = [-1]*V,[-1]*V
+        position[start] = 0
+        order,stack = [start],[(start,iter(nbrs[start]))]
+        while len(stack) > 0:
+            v,it = stack[-1]
+            u = next(it,None)
+            if u is None:
+                stack.pop()
+            elif position[u] < 0:
+                parent[u],position[u] = v,len(order)
+                order.append(u)
+                children[v].append(u)
+                stack.append((u,iter(nbrs[u])))
+        if len(order) < V:
+            return None
+        nrings = 0
+        for v in order:
+            for u in nbrs[v]:
+                if position[u] > position[v] and parent[u] != v:
+                    rings[v].append(nrings)
+                    rings[u].append(nrings)
+                    nrings += 1
+        
+        # Second pass: write the atoms, ring labels and branches
+        out,labels,free = [],dict(),[]
+        nextlabel = 1
+        stack = [start]
+        while len(stack) > 0:
+            item = stack.pop()
+            if isinstance(item,str):
+                out.append(item)
+                continue
+            out.append(self.chars[len(adj[item])])
+            closed = []
+            for ring in rings[item]:
+                if ring in labels:
+                    label = labels.pop(ring)
+                    closed.append(label)
+                else:
+                    if len(free) > 0:
+                        label = free.pop(0)
+                    else:
+                        label,nextlabel = nextlabel,nextlabel+1
+                    if label > 99:
+                        return None
+                    labels[ring] = label
+                out.append(str(label) if label < 10 else "%%%d"%(label))
+            free = sorted(free+closed)
+            branches = children[item]
+            if len(branches) > 0:
+                stack.append(branches[-1])
+                for child in reversed(branches[:-1]):
+                    stack.extend([")",child,"("])
+        return "".join(out)
     
 class SmiToLgi(LGI):
     """ 
     Class translates SMILES to graphs. This translator is based on
     organic chemistry and can produce graphs with vertex degrees
-    in the range [0,6].
+    in the range [1,6].
     """
     
-    def __init__(self):
+    def __init__(self,seed=None):
         """
-        Constructor of Smi
+        Constructor of SmiToLgi.
+        Input:
+        seed -- Seed for the random traversals (default = None).
         """
-        super(SmiToLgi,self).__init__()
+        super(SmiToLgi,self).__init__(seed)
     
     def Translate(self,smi,canonical=True):
         """
@@ -62,29 +204,109 @@ class SmiToLgi(LGI):
         graph G(V,E) with featureless vertices and unweighted
         edges, e.g. the graph equivalent of a saturated hydrocarbon.
         Input:
-        smi
+        smi       -- SMILES-string.
+        canonical -- Flag to write the canonical string (default = True).
+        Return:
+        lgi-string, or None if the SMILES cannot be translated.
         """
-        # Make a copy of the molecule to address the degrees
+        # RDKit is only needed to parse SMILES
+        from rdkit.Chem import MolFromSmiles
         mol = MolFromSmiles(smi)
+        if mol is None:
+            return None
         degrees = [atom.GetDegree() for atom in mol.GetAtoms()]
         edges = [(bond.GetBeginAtomIdx(),bond.GetEndAtomIdx()) for bond in mol.GetBonds()]
         return self.Write(degrees,edges,canonical=canonical)
+        
+    def TranslateMany(self,lines,canonical=True):
+        """
+        Method translates a list of SMILES-strings.
+        Input:
+        lines     -- List with SMILES-strings.
+        canonical -- Flag to write the canonical strings (default = True).
+        Return:
+        List with lgi-strings, or None for SMILES that cannot be translated.
+        """
+        return [self.Translate(smi,canonical) for smi in lines]
             
 class G6ToLgi(LGI):
     """ 
-    Class translates SMILES to graphs. This translator is based on
-    organic chemistry and can produce graphs with vertex degrees
-    in the range [0,6].
+    Class translates graphs in g6-format to lgi-strings.
     """
     
-    def __init__(self):
-        super(G6ToLgi,self).__init__()
+    def __init__(self,seed=None):
+        """
+        Constructor of G6ToLgi.
+        Input:
+        seed -- Seed for the random traversals (default = None).
+        """
+        super(G6ToLgi,self).__init__(seed)
         
     def Translate(self,g6,canonical=True):
-        G = g6_reader.decodegeng(g6)
-        V = G.number_of_nodes()
-        degrees = [G.degree(idx) for idx in range(V)]
-        return self.Write(degrees,G.edges(),canonical)
+        """
+        Method translates a g6-string to an lgi-string.
+        Input:
+        g6        -- Graph in g6-format.
+        canonical -- Flag to write the canonical string (default = True).
+        Return:
+        lgi-string, or None if the graph cannot be translated.
+        """
+        return self.TranslateMany([g6],canonical)[0]
+        
+    def TranslateMany(self,lines,canonical=True):
+        """
+        Method translates a list of g6-strings, decoding them in bulk.
+        Input:
+        lines     -- List with g6-strings.
+        canonical -- Flag to write the canonical strings (default = True).
+        Return:
+        List with lgi-strings, or None for graphs that cannot be translated.
+        """
+        translated = []
+        for graph in g6codec.DecodeMany(lines):
+            if graph is None:
+                translated.append(None)
+                continue
+            n,edges = graph
+            degrees = np.bincount(edges.ravel(),minlength=n).tolist()
+            translated.append(self.Write(degrees,edges,canonical))
+        return translated
+        
+class LgiToG6:
+    """
+    Class translates lgi-strings to graphs in g6-format, e.g. to pass
+    generated graphs to nauty-style tools.
+    """
+    
+    def __init__(self):
+        """ Constructor of LgiToG6 """
+        super(LgiToG6,self).__init__()
+        
+    def Translate(self,lgi):
+        """
+        Method translates an lgi-string to a g6-string.
+        Input:
+        lgi -- lgi-string.
+        Return:
+        g6-string, or None if the lgi-string is invalid.
+        """
+        return self.TranslateMany([lgi])[0]
+        
+    def TranslateMany(self,lines):
+        """
+        Method translates a list of lgi-strings, encoding them in bulk.
+        Input:
+        lines -- List with lgi-strings.
+        Return:
+        List with g6-strings, or None for invalid lgi-strings.
+        """
+        graphs = [lgireader.Read(lgi) for lgi in lines]
+        valid = [idx for idx,G in enumerate(graphs) if G is not None]
+        encoded = g6codec.EncodeMany([(len(graphs[idx][0]),graphs[idx][1]) for idx in valid])
+        translated = [None]*len(lines)
+        for idx,g6 in zip(valid,encoded):
+            translated[idx] = g6
+        return translated
             
 """
 Statically constructed instance of the class.
@@ -95,3 +317,80 @@ smi_to_lgi = SmiToLgi()
 Static instance to G6ToLGI.
 """
 g6_to_lgi = G6ToLgi()
+
+"""
+Static instance to LgiToG6.
+"""
+lgi_to_g6 = LgiToG6()
+
+class LGITest(unittest.TestCase):
+    """
+    Unit tests for the native lgi writer.
+    """
+    
+    def Graph(self,lgi,permutation=None):
+        degrees,edges = lgireader.Parse(lgi)
+        if permutation is not None:
+            degrees = [degrees[permutation.index(idx)] for idx in range(len(degrees))]
+            edges = [(permutation[f],permutation[t]) for f,t in edges]
+        return degrees,edges
+        
+    def test_Dataset(self):
+        # The canonical strings are the strings of the bundled dataset
+        import os
+        filename = os.path.join(os.path.dirname(os.path.abspath(__file__)),"datasets","Graphs_can.lgi")
+        with open(filename) as f:
+            lines = [line.strip() for line in f][:2000]
+        writer = LGI()
+        self.assertListEqual([writer.Write(*self.Graph(lgi)) for lgi in lines],lines)
+        
+    def Isomorphic(self,G,H):
+        # Compare sorted degree sequences and canonical strings
+        return sorted(G[0]) == sorted(H[0]) and LGI().Write(*G) == LGI().Write(*H)
+        
+    def test_RoundTrip(self):
+        writer,rng = LGI(seed=1),random.Random(2)
+        for lgi in ["AA","ABA","B1BB1","AC(A)A","ABC1BC1A","C12BBC1BB2"]:
+            G = self.Graph(lgi)
+            permutation = list(range(len(G[0])))
+            rng.shuffle(permutation)
+            canonical = writer.Write(*G)
+            self.assertEqual(canonical,writer.Write(*self.Graph(lgi,permutation)))
+            self.assertEqual(lgireader.Parse(canonical)[0].count(1),G[0].count(1))
+            self.assertEqual(canonical,writer.Write(*self.Graph(writer.Write(*G,canonical=False))))
+            
+    def test_Random(self):
+        G = self.Graph("C12BBC1BB2")
+        self.assertEqual(LGI(seed=3).Write(*G,canonical=False),LGI(seed=3).Write(*G,canonical=False))
+        strings = set([LGI().Write(*G,canonical=False,rng=random.Random(seed)) for seed in range(20)])
+        self.assertTrue(len(strings) > 1)
+        for lgi in strings:
+            self.assertIsNotNone(lgireader.Parse(lgi))
+        
+    def test_Invalid(self):
+        writer = LGI()
+        self.assertIsNone(writer.Write([1,1,1,1],[(0,1),(2,3)]))
+        self.assertIsNone(writer.Write([1,7],[(0,1)]))
+        self.assertIsNone(writer.Write([2,2],[(0,1)]))
+        self.assertIsNone(writer.Write([],[]))
+        
+    def test_G6(self):
+        lines = ["ABC1BC1A","C12BBC1BB2","AC(A)A"]
+        g6 = lgi_to_g6.TranslateMany(lines+["A("])
+        self.assertIsNone(g6[-1])
+        self.assertEqual(g6_to_lgi.TranslateMany(g6[:-1]),[LGI().Write(*self.Graph(lgi)) for lgi in lines])
+        
+    def test_Labels(self):
+        # Traversing one rail of a ladder first keeps eleven rings open
+        n = 12
+        edges = [(idx,idx+1) for idx in range(n-1)]+[(n+idx,n+idx+1) for idx in range(n-1)]+[(idx,2*n-1-idx) for idx in range(n)]
+        adj = [[] for _ in range(2*n)]
+        for f,t in edges:
+            adj[f].append(t)
+            adj[t].append(f)
+        lgi = LGI().Traverse(adj,list(range(2*n)))
+        self.assertTrue("%11" in lgi)
+        self.assertTrue(self.Isomorphic(([len(nbrs) for nbrs in adj],edges),lgireader.Parse(lgi)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -12,11 +12,36 @@ Redistribution and use in source and binary forms, with or without modification,
 THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
-from lgi_translator import smi_to_lgi,g6_to_lgi
+"""
+File lgi_translator_runner.py translates files with graphs in g6-format
+or molecules in SMILES-format to lgi-strings, and files with lgi-strings
+to g6-strings. The input is read in
+blocks of lines, translated in a process pool and written incrementally.
+A checkpoint file records the input file, the settings and the written
+blocks, so that an interrupted run can resume. The checkpoint is removed
+once all blocks are written. Run as script, e.g.
+
+python lgi_translator_runner.py graphs.g6 --blocksize 10000
+python lgi_translator_runner.py generated.lgi --out generated.g6
+"""
+
+from lgi_translator import smi_to_lgi,g6_to_lgi,lgi_to_g6
+from collections import deque
+from datetime import datetime
+import argparse
 import tqdm
 import concurrent.futures
 import multiprocessing
+import itertools
+import json
+import os
 import sys
+import warnings
+
+"""
+Translators per input format.
+"""
+translators = {"g6":g6_to_lgi,"smi":smi_to_lgi,"lgi":lgi_to_g6}
 
 def Run(lines):
     """
@@ -33,17 +58,273 @@ def Run(lines):
             pool.map(g6_to_lgi.Translate, lines, chunksize=16), total=num_in)) 
     return list(filter(lambda x: x is not None,translated))
 
-if __name__ == "__main__":
-    # Define
-    fin = sys.argv[1]
-    fout = fin.replace(".g6",".lgi")
-    with open(fin,"r") as f:
-        lines = [line.strip().split("\t")[0] for line in f.readlines()]
-        
-    # Translate
-    lgi_lines = Run(lines)
+def Format(filename):
+    """
+    Method determines the input format from the file extension.
+    Input:
+    filename -- Name of the input file.
+    Return:
+    Format 'smi' for .smi and .smiles files, 'lgi' for .lgi files, otherwise 'g6'.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    return "smi" if ext in [".smi",".smiles"] else "lgi" if ext == ".lgi" else "g6"
+
+def TranslateBlock(block):
+    """
+    Method translates a block of lines in a worker process.
+    Lines that cannot be translated are skipped.
+    Input:
+    block -- Tuple (format,lines).
+    Return:
+    List with translated strings.
+    """
+    fmt,lines = block
+    return [line for line in translators[fmt].TranslateMany(lines) if line is not None]
+
+def Blocks(f,blocksize):
+    """
+    Method reads a file in blocks of lines. The first
+    whitespace-separated field of every non-empty line is kept.
+    Input:
+    f         -- Opened input file.
+    blocksize -- Number of lines per block.
+    Return:
+    Iterator over tuples (index,lines).
+    """
+    lines = (line.split()[0] for line in f if len(line.strip()) > 0)
+    for idx in itertools.count():
+        block = list(itertools.islice(lines,blocksize))
+        if len(block) == 0:
+            return
+        yield idx,block
+
+def Source(fin,fmt,blocksize):
+    """
+    Method identifies the input file and the settings of a translation.
+    Input:
+    fin       -- Input file.
+    fmt       -- Input format.
+    blocksize -- Number of lines per block.
+    Return:
+    Dictionary with the path, size and modification time of the
+    input file, the input format and the block size.
+    """
+    stat = os.stat(fin)
+    return {"path":os.path.abspath(fin),"size":stat.st_size,"mtime":stat.st_mtime_ns,
+            "format":fmt,"blocksize":blocksize}
+
+class Checkpoint:
+    """
+    Class Checkpoint records the written blocks and the size
+    of the output file to resume an interrupted translation.
+    """
+    
+    def __init__(self,filename,source):
+        """
+        Constructor of Checkpoint.
+        Input:
+        filename  -- Name of the checkpoint file.
+        source    -- Identity of the input file and settings, see Source.
+        """
+        super(Checkpoint,self).__init__()
+        self.filename = filename
+        self.source = source
+        self.first = 0      # All blocks before first are written
+        self.done = set()   # Written blocks after first
+        self.size = 0       # Size of the output file
+        
+    def Load(self):
+        """
+        Method loads the checkpoint file if it exists. A checkpoint
+        written for another input file or other settings is ignored
+        with a warning, and the translation starts from scratch.
+        Return:
+        Updated instance of Checkpoint.
+        """
+        if os.path.exists(self.filename):
+            with open(self.filename) as f:
+                values = json.load(f)
+            if values.get("source") != self.source:
+                warnings.warn("Checkpoint %s does not match the input file or settings, starting from scratch"%(self.filename))
+                return self
+            self.first,self.done,self.size = values["first"],set(values["done"]),values["size"]
+        return self
+        
+    def Remove(self):
+        """
+        Method removes the checkpoint file after a completed translation.
+        """
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
     
-    # Write
-    with open(fout,"w") as f:
-        _ = [f.write("%s\n"%(lgi)) for lgi in lgi_lines]
-    print("Output written to %s - %s lines"%(fout,len(lgi_lines)))
+    def IsDone(self,idx):
+        """
+        Input:
+        idx -- Index of the block.
+        Return:
+        True if the block has been written.
+        """
+        return idx < self.first or idx in self.done
+        
+    def Update(self,idx,size):
+        """
+        Method marks a block as written and saves the checkpoint.
+        Input:
+        idx  -- Index of the written block.
+        size -- Size of the output file after writing the block.
+        """
+        self.done.add(idx)
+        while self.first in self.done:
+            self.done.remove(self.first)
+            self.first += 1
+        self.size = size
+        tmp = "%s.tmp"%(self.filename)
+        with open(tmp,"w") as f:
+            json.dump({"source":self.source,"first":self.first,"done":sorted(self.done),"size":self.size},f)
+        os.replace(tmp,self.filename)
+
+def Translate(fin,fout=None,fmt=None,blocksize=10000,workers=None,ordered=True,resume=True,verbose=True):
+    """
+    Method translates a file with a streaming pipeline.
+    At most two blocks per worker are read ahead of the written output.
+    Input:
+    fin       -- Input file with g6-strings, SMILES or lgi-strings.
+    fout      -- Output file (default = None, replacing the extension of fin by
+                 .g6 for lgi-strings and by .lgi otherwise).
+    fmt       -- Input format 'g6', 'smi' or 'lgi' (default = None, derived from the extension).
+    blocksize -- Number of lines per block (default = 10,000).
+    workers   -- Number of worker processes (default = None, using all cores).
+    ordered   -- Flag to write the output in input order (default = True).
+                 If set to False, blocks are written in completion order.
+    resume    -- Flag to resume from the checkpoint of an interrupted run (default = True).
+                 The checkpoint is only used for the same input file and settings.
+    verbose   -- Flag for verbose mode, showing the progress (default = True).
+    Return:
+    Tuple with the number of input lines and written lines.
+    """
+    if fmt is None:
+        fmt = Format(fin)
+    if fout is None:
+        fout = "%s.%s"%(os.path.splitext(fin)[0],"g6" if fmt == "lgi" else "lgi")
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    maxpending = 2*workers
+    
+    # Restore the output file to the size of the last checkpoint
+    checkpoint = Checkpoint("%s.checkpoint"%(fout),Source(fin,fmt,blocksize))
+    if resume:
+        checkpoint.Load()
+    with open(fout,"a") as out:
+        out.truncate(checkpoint.size)
+    
+    num_in,num_out = 0,0
+    starttime = datetime.now()
+    progress = tqdm.tqdm(unit=" lines",disable=not verbose)
+    with open(fin) as f, open(fout,"a") as out, concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        blocks = ((idx,lines) for idx,lines in Blocks(f,blocksize) if not checkpoint.IsDone(idx))
+        pending,finished,order = dict(),dict(),deque()
+        exhausted = False
+        while not exhausted or len(pending) > 0:
+            # Submit blocks while the number of unwritten blocks is bounded
+            while not exhausted and len(pending)+len(finished) < maxpending:
+                block = next(blocks,None)
+                if block is None:
+                    exhausted = True
+                    break
+                idx,lines = block
+                pending[pool.submit(TranslateBlock,(fmt,lines))] = (idx,len(lines))
+                order.append(idx)
+            if len(pending) == 0:
+                break
+            
+            # Write the completed blocks
+            done,_ = concurrent.futures.wait(pending,return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                idx,num = pending.pop(future)
+                finished[idx] = (num,future.result())
+            while len(order) > 0:
+                idx = order[0] if ordered else next((idx for idx in order if idx in finished),None)
+                if idx not in finished:
+                    break
+                order.remove(idx)
+                num,translated = finished.pop(idx)
+                out.write("".join(["%s\n"%(line) for line in translated]))
+                out.flush()
+                checkpoint.Update(idx,out.tell())
+                num_in += num
+                num_out += len(translated)
+                progress.update(num)
+    progress.close()
+    checkpoint.Remove()
+    
+    # Report the throughput
+    diff = datetime.now()-starttime
+    seconds = diff.days*24*60*60 + diff.seconds + 1e-6*diff.microseconds
+    if verbose:
+        print("Output written to %s - %s lines from %s input lines in %.1f seconds (%.0f lines/s)"%(fout,num_out,num_in,seconds,num_in/max(seconds,1e-6)))
+    return num_in,num_out
+
+# Import unittest
+import unittest
+import tempfile
+class TranslatorRunnerTest(unittest.TestCase):
+    """ Test class for the resumable translation """
+    
+    def setUp(self):
+        import networkx as nx
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fin = os.path.join(self.tmpdir.name,"graphs.g6")
+        self.fout = os.path.join(self.tmpdir.name,"graphs.lgi")
+        self.graphs = [nx.to_graph6_bytes(nx.path_graph(n),header=False).decode().strip() for n in range(3,9)]
+        
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        
+    def Write(self,graphs):
+        with open(self.fin,"w") as f:
+            f.write("".join(["%s\n"%(g6) for g6 in graphs]))
+            
+    def Read(self):
+        with open(self.fout) as f:
+            return f.read().split()
+        
+    def test_Translate(self):
+        """ Method checks that the checkpoint is removed and a changed input is translated again """
+        self.Write(self.graphs)
+        self.assertEqual(Translate(self.fin,self.fout,blocksize=2,workers=1,verbose=False),(6,6))
+        self.assertFalse(os.path.exists("%s.checkpoint"%(self.fout)))
+        self.Write(self.graphs[:3])
+        self.assertEqual(Translate(self.fin,self.fout,blocksize=2,workers=1,verbose=False),(3,3))
+        self.assertEqual(len(self.Read()),3)
+        
+    def test_Resume(self):
+        """ Method checks that only a matching checkpoint is resumed """
+        self.Write(self.graphs)
+        source = Source(self.fin,"g6",2)
+        with open(self.fout,"w") as f:
+            f.write("A\nB\n")
+        Checkpoint("%s.checkpoint"%(self.fout),source).Update(0,4)
+        self.assertEqual(Translate(self.fin,self.fout,blocksize=2,workers=1,verbose=False),(4,4))
+        self.assertEqual(self.Read()[:2],["A","B"])
+        
+        # A checkpoint with other settings is ignored
+        with open(self.fout,"w") as f:
+            f.write("A\nB\n")
+        Checkpoint("%s.checkpoint"%(self.fout),source).Update(0,4)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            self.assertEqual(Translate(self.fin,self.fout,blocksize=3,workers=1,verbose=False),(6,6))
+        self.assertEqual(len(caught),1)
+        self.assertNotIn("A",self.Read())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Translate g6-strings or SMILES to lgi-strings, or lgi-strings to g6-strings")
+    parser.add_argument("fin",help="Input file (.g6, .smi or .lgi)")
+    parser.add_argument("--out",default=None,help="Output file (default: input file with extension .lgi, or .g6 for lgi input)")
+    parser.add_argument("--format",default=None,choices=["g6","smi","lgi"],help="Input format (default: derived from the extension)")
+    parser.add_argument("--blocksize",type=int,default=10000,help="Number of lines per block")
+    parser.add_argument("--workers",type=int,default=None,help="Number of worker processes")
+    parser.add_argument("--unordered",action="store_true",help="Write blocks in completion order")
+    parser.add_argument("--restart",action="store_true",help="Ignore the checkpoint of an interrupted run")
+    args = parser.parse_args()
+    Translate(args.fin,args.out,args.format,args.blocksize,args.workers,ordered=not args.unordered,resume=not args.restart)
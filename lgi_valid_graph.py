@@ -12,14 +12,34 @@ Redistribution and use in source and binary forms, with or without modification,
 THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
-from lgi_reader_rdkit import lgireader
+from lgi_reader import lgireader
+import concurrent.futures
+import numpy
+import os
 
 class ValidGraph:
     """ Class ValidGraph checks if a lgi-graph defines a valid graph """
     
-    def __init__(self):
-        """ Constructor of ValidGraph """    
+    def __init__(self,cache=None):
+        """
+        Constructor of ValidGraph
+        Input:
+        cache -- Instance of LGICache used in front of the validation
+                 (default = None, no caching).
+        """    
         super(ValidGraph,self).__init__()
+        self.cache = cache
+        
+    def SetCache(self,cache):
+        """
+        Method sets the cache used in front of the validation.
+        Input:
+        cache -- Instance of LGICache, or None to disable caching.
+        Return:
+        Updated instance of ValidGraph.
+        """
+        self.cache = cache
+        return self
         
     def IsValid(self,lgi):
         """
@@ -30,10 +50,115 @@ class ValidGraph:
         True if lgi-string defines a valid graph, i.e. if the
         real degree of the vertex matches the character encoded.
         """
-        G = lgireader.Read(lgi)
-        return G is not None    
+        cache = self.cache
+        if cache is None:
+            return lgireader.Read(lgi) is not None
+        entry = cache.Get(lgi)
+        if entry is not None:
+            return entry[0]
+        G = lgireader.Parse(lgi)
+        cache.Put(lgi,G is not None,G)
+        return G is not None
+    
+    def IsValidBatch(self,strings,workers=None,chunksize=10000):
+        """
+        Method checks a list of lgi-strings for valid graphs.
+        Large lists are split in chunks and validated in a process
+        pool. Every chunk is sent as a single joined string and
+        returned as packed bits.
+        Input:
+        strings   -- List with lgi-strings.
+        workers   -- Number of worker processes (default = None, using all cores).
+        chunksize -- Number of strings per chunk (default = 10,000).
+        Return:
+        Boolean array with the validity of every string in input order.
+        """
+        num = len(strings)
+        if workers is None:
+            workers = os.cpu_count()
+        if workers <= 1 or num <= chunksize:
+            return numpy.fromiter((self.IsValid(lgi) for lgi in strings),dtype=bool,count=num)
+        
+        # Validate only the unique strings missing in the cache
+        cache = self.cache
+        if cache is not None:
+            known = dict()
+            for lgi in strings:
+                if lgi not in known:
+                    entry = cache.Get(lgi)
+                    known[lgi] = None if entry is None else entry[0]
+            missing = [lgi for lgi,valid in known.items() if valid is None]
+            if len(missing) > chunksize:
+                results = self.ValidateParallel(missing,workers,chunksize)
+            else:
+                results = [lgireader.Parse(lgi) is not None for lgi in missing]
+            for lgi,valid in zip(missing,results):
+                known[lgi] = bool(valid)
+                cache.Put(lgi,known[lgi])
+            return numpy.fromiter((known[lgi] for lgi in strings),dtype=bool,count=num)
+        return self.ValidateParallel(strings,workers,chunksize)
+    
+    def ValidateParallel(self,strings,workers,chunksize):
+        """
+        Method validates lgi-strings in chunks in a process pool,
+        without using the cache.
+        Input:
+        strings   -- List with lgi-strings.
+        workers   -- Number of worker processes.
+        chunksize -- Number of strings per chunk.
+        Return:
+        Boolean array with the validity of every string in input order.
+        """
+        # Validate the chunks in parallel, keeping the input order
+        num = len(strings)
+        chunks = ["\0".join(strings[start:start+chunksize]) for start in range(0,num,chunksize)]
+        valid = numpy.zeros(num,dtype=bool)
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            for idx,packed in enumerate(pool.map(ValidateChunk,chunks)):
+                start = idx*chunksize
+                end = min(start+chunksize,num)
+                valid[start:end] = numpy.unpackbits(numpy.frombuffer(packed,dtype=numpy.uint8),count=end-start)
+        return valid
     
 """
 Static instance of the validator
 """
 GraphValidator = ValidGraph()
+
+def ValidateChunk(chunk):
+    """
+    Method validates a chunk of lgi-strings in a worker process.
+    Input:
+    chunk -- String with lgi-strings separated by a null character.
+    Return:
+    Validity of the lgi-strings as packed bits.
+    """
+    valid = [GraphValidator.IsValid(lgi) for lgi in chunk.split("\0")]
+    return numpy.packbits(valid).tobytes()
+
+
+import unittest
+class ValidGraphTest(unittest.TestCase):
+    """
+    Test class evaluating the validation of lgi-strings.
+    """
+    
+    def test_IsValidBatch(self):
+        """ Method tests that batch validation matches the single validation in input order """
+        strings = ["B1BBBB1","B1BBBB","AA","A","AC(A)A","AC(A)","B%10BBBB%10"]*50
+        expected = [GraphValidator.IsValid(lgi) for lgi in strings]
+        self.assertListEqual(expected,list(GraphValidator.IsValidBatch(strings,workers=1)))
+        self.assertListEqual(expected,list(GraphValidator.IsValidBatch(strings,workers=2,chunksize=33)))
+        
+    def test_Cache(self):
+        """ Method tests that cached validation parses duplicate strings once """
+        from lgi_cache import LGICache
+        validator = ValidGraph(cache=LGICache(maxsize=10))
+        strings = ["B1BBBB1","B1BBBB","AA"]*5
+        self.assertListEqual([validator.IsValid(lgi) for lgi in strings],[GraphValidator.IsValid(lgi) for lgi in strings])
+        self.assertEqual({"size":3,"hits":12,"misses":3,"evictions":0},validator.cache.Counters())
+        self.assertListEqual([True,False,True]*5,list(validator.IsValidBatch(strings,workers=2,chunksize=2)))
+        
+# Runner for tests
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""
+Copyright 2019 Ruud van Deursen, Firmenich SA.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+File lgi_window_sequence.py defines a streaming data source
+for training. The training windows are cut from the text corpus
+on demand for every batch instead of materializing X and y
+for the complete corpus.
+"""
+
+from keras.utils import Sequence
+import numpy
+
+class WindowSequence(Sequence):
+    """
+    Class WindowSequence defines a keras Sequence cutting the
+    sliding windows and next characters for a batch from the
+    corpus of DataUtils. The windows are shuffled by offset at
+    the end of every epoch. Memory for X and y depends on the
+    batch size only.
+    """
+    
+    def __init__(self,Utils,batch_size=256,indices=False,shuffle=True,seed=None):
+        """
+        Constructor of WindowSequence.
+        Input:
+        Utils      -- DataUtils with a prepared text corpus (see DataUtils.Prepare).
+                      Like DataUtils.Encode, maxlen is set to the longest
+                      observed word if that is shorter.
+        batch_size -- Number of windows per batch (default = 256).
+        indices    -- Flag to return character indices instead of one-hot
+                      tensors (default = False). Use with BaseModel(encoding=1).
+        shuffle    -- Flag to shuffle the windows every epoch (default = True).
+        seed       -- Seed for the shuffling (default = None).
+        """
+        super(WindowSequence,self).__init__()
+        text = Utils.Text()
+        maxword = max([len(x) for x in text.split("\n")])
+        Utils.maxlen = min(maxword,Utils.maxlen)
+        self.maxlen,self.step = Utils.maxlen,Utils.step
+        self.numchars = Utils.NumChars()
+        self.batch_size = batch_size
+        self.indices = indices
+        self.shuffle = shuffle
+        self.rng = numpy.random.default_rng(seed)
+        
+        # Translate the corpus once to character indices
+        self.codes = Utils.Indices(text)
+        self.offsets = numpy.arange(0,len(text)-self.maxlen,self.step,dtype=numpy.int64)
+        self.positions = numpy.arange(self.maxlen)
+        self.onehot = numpy.eye(self.numchars,dtype=bool)
+        if shuffle:
+            self.rng.shuffle(self.offsets)
+    
+    def __len__(self):
+        """
+        Return:
+        Number of batches per epoch.
+        """
+        return (len(self.offsets)+self.batch_size-1)//self.batch_size
+    
+    def __getitem__(self,idx):
+        """
+        Method cuts the windows of a batch.
+        Input:
+        idx -- Index of the batch.
+        Return:
+        Tuple (X,y) for the batch, encoded like DataUtils.Encode.
+        """
+        offsets = self.offsets[idx*self.batch_size:(idx+1)*self.batch_size]
+        X = self.codes[offsets[:,None]+self.positions]
+        y = self.codes[offsets+self.maxlen]
+        if self.indices:
+            return X,y
+        return self.onehot[X],self.onehot[y]
+    
+    def on_epoch_end(self):
+        """
+        Method shuffles the windows for the next epoch.
+        """
+        if self.shuffle:
+            self.rng.shuffle(self.offsets)
+
+            
+import unittest
+class WindowSequenceTest(unittest.TestCase):
+    """ Test class evaluating the streamed batches """
+    
+    def test_Batches(self):
+        """ Method tests that the unshuffled batches equal the encoded training set """
+        from lgi_generative_model_utils import DataUtils
+        Utils = DataUtils(maxlen=10,step=3)
+        text = Utils.Prepare(["ABBBBA","ABBC(A)A","B1BBBBB1","AC1BC(A)B1"]*5)
+        X,y,maxlen = Utils.Encode(text)
+        seq = WindowSequence(Utils,batch_size=7,shuffle=False)
+        Xs = numpy.concatenate([seq[idx][0] for idx in range(len(seq))])
+        ys = numpy.concatenate([seq[idx][1] for idx in range(len(seq))])
+        self.assertTrue((X == Xs).all() and (y == ys).all())
+        Xi,yi = WindowSequence(Utils,batch_size=len(X),indices=True,shuffle=False)[0]
+        self.assertTrue((X.argmax(axis=2) == Xi).all() and (y.argmax(axis=1) == yi).all())
+        
+# Runner for tests
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,212 @@
+"""
+Copyright 2019 Ruud van Deursen, Firmenich SA.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+"""
+File lgi_writer.py defines a writer storing generated strings in a
+background thread. Strings are buffered in batches, so that the
+generation does not wait for the disk, and every batch is flushed,
+so that the file can be read while the generation runs.
+"""
+
+import queue
+import threading
+import unittest
+
+class BackgroundWriter:
+    """
+    Class BackgroundWriter writes strings to a file in a background thread.
+    Usage:
+    with BackgroundWriter("generated.lgi") as writer:
+        writer.Consume(gen.Stream(ncollect=100000))
+    """
+    
+    def __init__(self,filename,batchsize=1000,maxbatches=16,mode="w"):
+        """
+        Constructor of BackgroundWriter.
+        Input:
+        filename   -- Name of the output file.
+        batchsize  -- Number of strings per flushed batch (default = 1,000).
+        maxbatches -- Maximum number of batches waiting for the disk
+                      (default = 16). Write blocks when the queue is full.
+        mode       -- Mode to open the file, 'w' or 'a' (default = 'w').
+        """
+        super(BackgroundWriter,self).__init__()
+        self.filename = filename
+        self.batchsize = batchsize
+        self.mode = mode
+        self.batch = list()
+        self.batches = queue.Queue(maxsize=maxbatches)
+        self.error = None
+        self.count = 0
+        self.written = 0
+        self.thread = None
+        
+    def Start(self):
+        """
+        Method opens the file and starts the background thread.
+        Return:
+        Self.
+        """
+        if self.thread is None:
+            self.ios = open(self.filename,self.mode)
+            self.thread = threading.Thread(target=self.Work,daemon=True)
+            self.thread.start()
+        return self
+        
+    def Work(self):
+        """
+        Method writes batches until it receives None.
+        """
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                self.ios.write("".join(["%s\n"%(s) for s in batch]))
+                self.ios.flush()
+                self.written += len(batch)
+            except BaseException as e:
+                self.error = e
+        
+    def Check(self):
+        """
+        Method raises the error of the background thread, if any.
+        """
+        if self.error is not None:
+            raise self.error
+                
+    def Write(self,s):
+        """
+        Method adds a string to the current batch.
+        Input:
+        s -- String to write.
+        """
+        self.batch.append(s)
+        self.count += 1
+        if len(self.batch) >= self.batchsize:
+            self.Flush()
+            
+    def Flush(self):
+        """
+        Method passes the current batch to the background thread.
+        """
+        self.Check()
+        if self.thread is None:
+            self.Start()
+        if len(self.batch) > 0:
+            self.batches.put(self.batch)
+            self.batch = list()
+            
+    def Consume(self,strings):
+        """
+        Method writes all strings of an iterator.
+        Input:
+        strings -- Iterator over strings, e.g. Generator.Stream.
+        Return:
+        Number of strings written with this call.
+        """
+        n = self.count
+        for s in strings:
+            self.Write(s)
+        return self.count-n
+        
+    def Close(self):
+        """
+        Method flushes the last batch, waits for the background thread
+        and closes the file.
+        """
+        if self.thread is not None:
+            if self.error is None:
+                self.Flush()
+            self.batches.put(None)
+            self.thread.join()
+            self.thread = None
+            self.ios.close()
+        self.Check()
+        
+    def __enter__(self):
+        return self.Start()
+        
+    def __exit__(self,exc_type,exc_value,traceback):
+        # Do not hide an exception raised in the with-block by an error of the writer
+        try:
+            self.Close()
+        except Exception:
+            if exc_type is None:
+                raise
+        return False
+
+class BackgroundWriterTest(unittest.TestCase):
+    """
+    Unit tests for BackgroundWriter.
+    """
+    
+    def test_Consume(self):
+        import os,tempfile
+        with tempfile.TemporaryDirectory() as outdir:
+            filename = os.path.join(outdir,"generated.lgi")
+            strings = ["A%sA"%("B"*i) for i in range(25)]
+            with BackgroundWriter(filename,batchsize=10,maxbatches=1) as writer:
+                self.assertEqual(writer.Consume(iter(strings)),25)
+            self.assertEqual(writer.written,25)
+            self.assertListEqual(open(filename).read().split("\n")[:-1],strings)
+            with BackgroundWriter(filename,mode="a") as writer:
+                writer.Write("ABA")
+            self.assertEqual(open(filename).read().split("\n")[-2],"ABA")
+            
+    class FailingSink:
+        """ File failing on every write """
+        
+        def write(self,s):
+            raise OSError("disk full")
+            
+        def flush(self):
+            pass
+            
+        def close(self):
+            pass
+            
+    def Failing(self,outdir):
+        import os,time
+        writer = BackgroundWriter(os.path.join(outdir,"generated.lgi"),batchsize=1).Start()
+        writer.ios.close()
+        writer.ios = self.FailingSink()
+        writer.Write("ABA")
+        for _ in range(500):
+            if writer.error is not None:
+                break
+            time.sleep(0.01)
+        return writer
+            
+    def test_Error(self):
+        import tempfile
+        writer = BackgroundWriter("/nonexistent/generated.lgi")
+        self.assertRaises(OSError,writer.Start)
+        
+        # Errors of the background thread are raised on the next write and on close
+        with tempfile.TemporaryDirectory() as outdir:
+            writer = self.Failing(outdir)
+            self.assertRaises(OSError,writer.Write,"ABBA")
+            self.assertRaises(OSError,writer.Close)
+            
+            # An exception raised in the with-block is not replaced
+            with self.assertRaises(ValueError):
+                with self.Failing(outdir):
+                    raise ValueError()
+
+if __name__ == "__main__":
+    unittest.main()
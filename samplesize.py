@@ -14,7 +14,6 @@ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
 """
 
 import argparse
-from scipy.stats import norm
 from numpy import ceil,sqrt
 import numpy as np
 
@@ -43,6 +42,7 @@ class SampleSizeCalculator:
         if confidence_level in self.zdict:
             z = self.zdict[confidence_level]
         else:
+            from scipy.stats import norm # Loaded on first use only
             alpha = 1 - (confidence_level)
             z = norm.ppf(1 - (alpha/2))
         return z
@@ -98,6 +98,101 @@ class SampleSizeCalculator:
         # Return the interval as p-factor,p+factor
         return np.max([p-factor,0.0]),np.min([p+factor,1.0])
 
+    def SequentialTest(self,percentile,nsample,npopulation=None,confidence_level=.95):
+        """
+        Method creates a sequential probability ratio test deciding
+        whether a rate is below the lower bound of the percentage
+        interval computed by ComputeInterval for the sample size, or
+        reaches the percentile. The test decides for the percentile
+        with probability 1-alpha at a rate equal to the percentile,
+        and after nsample observations it accepts an observed rate
+        at or above the lower bound, as the fixed sample does. Most
+        decisions need fewer samples.
+        Input:
+        percentile       -- Desired percentile.
+        nsample          -- Maximum sample size.
+        npopulation      -- Population size (default = None).
+        confidence_level -- Confidence level (default = .95).
+        Return:
+        Instance of SequentialTest.
+        """
+        if confidence_level > 1:
+            confidence_level /= 100.0
+        lower,_ = self.ComputeInterval(percentile,nsample,npopulation=npopulation,confidence_level=confidence_level)
+        return SequentialTest(lower,percentile,alpha=1-confidence_level,nmax=nsample,threshold=lower)
+    
+class SequentialTest:
+    """
+    Class SequentialTest defines Wald's sequential probability ratio
+    test between a rate p0 (lower) and a rate p1 (upper). Every
+    observation updates the log-likelihood ratio. The test decides
+    for the lower rate when the ratio falls below log(beta/(1-alpha))
+    and for the upper rate when it exceeds log((1-beta)/alpha), and
+    compares the observed rate to a threshold after nmax observations.
+    """
+    
+    def __init__(self,lower,upper,alpha=.05,beta=None,nmax=None,threshold=None):
+        """
+        Constructor of SequentialTest.
+        Input:
+        lower -- Rate p0 of the lower hypothesis.
+        upper -- Rate p1 of the upper hypothesis.
+        alpha -- Probability to decide for the upper rate at rate p0 (default = 0.05).
+        beta  -- Probability to decide for the lower rate at rate p1 (default = None, equal to alpha).
+        nmax  -- Maximum number of observations (default = None, unbounded).
+        threshold -- Minimum observed rate to decide for the upper rate after
+                     nmax observations (default = None, the middle of lower and upper).
+        """
+        super(SequentialTest,self).__init__()
+        if beta is None:
+            beta = alpha
+        eps = 1e-6
+        p0,p1 = np.clip(lower,eps,1-eps),np.clip(upper,eps,1-eps)
+        if p1 <= p0:
+            p1 = min(p0+eps,1-eps/2)
+        self.lower,self.upper = float(p0),float(p1)
+        self.valid_step = np.log(p1/p0)
+        self.invalid_step = np.log((1-p1)/(1-p0))
+        self.accept = np.log((1-beta)/alpha)
+        self.reject = np.log(beta/(1-alpha))
+        self.nmax = nmax
+        self.threshold = 0.5*(self.lower+self.upper) if threshold is None else threshold
+        self.n,self.nvalid,self.llr = 0,0,0.0
+        
+    def Update(self,valid):
+        """
+        Method adds an observation.
+        Input:
+        valid -- Flag indicating a valid sample.
+        Return:
+        Decision after the observation, see Decision.
+        """
+        self.n += 1
+        self.nvalid += int(bool(valid))
+        self.llr += self.valid_step if valid else self.invalid_step
+        return self.Decision()
+        
+    def Decision(self):
+        """
+        Return:
+        -1 if the rate is below the indifference zone, 1 if it is above and
+        0 if the test needs more observations. After nmax observations the
+        observed rate is compared to the threshold.
+        """
+        if self.llr <= self.reject:
+            return -1
+        if self.llr >= self.accept:
+            return 1
+        if self.nmax is not None and self.n >= self.nmax:
+            return 1 if self.Ratio() >= self.threshold else -1
+        return 0
+        
+    def Ratio(self):
+        """
+        Return:
+        Observed rate of valid samples.
+        """
+        return self.nvalid/float(max(self.n,1))
     
 # Define a statically constructed method
 SampleSize = SampleSizeCalculator()
@@ -129,6 +224,36 @@ class SampleSizeTest(unittest.TestCase):
         self.assertAlmostEqual(lower,act_lower,4)
         self.assertAlmostEqual(upper,act_upper,4)
         
+    def test_SequentialTest(self):
+        """ Method tests the early decisions of the sequential test """
+        test = SampleSize.SequentialTest(0.95,300)
+        while test.Update(False) == 0:
+            pass
+        self.assertEqual(test.Decision(),-1)
+        self.assertLess(test.n,10)
+        test = SampleSize.SequentialTest(0.95,300)
+        while test.Update(True) == 0:
+            pass
+        self.assertEqual(test.Decision(),1)
+        self.assertLess(test.n,300)
+        
+        # The test always decides within the maximum sample size
+        rng = np.random.default_rng(0)
+        test = SampleSize.SequentialTest(0.95,300)
+        while test.Update(rng.random() < 0.95) == 0:
+            pass
+        self.assertLessEqual(test.n,300)
+        self.assertNotEqual(test.Decision(),0)
+        
+        # A rate equal to the percentile passes, as with the fixed sample
+        decisions = []
+        for _ in range(200):
+            test = SampleSize.SequentialTest(0.95,300)
+            while test.Update(rng.random() < 0.95) == 0:
+                pass
+            decisions.append(test.Decision())
+        self.assertGreaterEqual(decisions.count(1),180)
+        
 # Runner for tests
 if __name__ == "__main__":
     unittest.main()
@@ -22,10 +22,7 @@ the LSTM-generator.
 TODO: Small updates.
 """
 
-import IPython
 from keras.callbacks import Callback
-import matplotlib.pyplot as plt
-from IPython.display import clear_output
 import numpy
 from datetime import datetime
 
@@ -51,7 +48,10 @@ class TrainingLossPlot(Callback):
     def Plot(self):
         """
         Method plots the current status of the loss-function.
+        matplotlib and IPython are imported on the first plot.
         """
+        import matplotlib.pyplot as plt
+        from IPython.display import clear_output
         clear_output(wait=False)
         other=self.other
         plt.figure(figsize=(12,4))